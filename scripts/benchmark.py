@@ -0,0 +1,326 @@
+"""
+Suite de benchmarks del motor de scoring a distintas escalas.
+
+Genera datasets deterministas con el mismo esquema que `dataset_final/`
+(aseguradoras, asegurados, polizas, vehiculos, siniestros) para cada escala de
+siniestros pedida, mide `parse_rules`, `load_unified`, `compute_scores` (con y
+sin watchlist), `query_name` y la exportación (Parquet único y dataset
+particionado), añade los resultados a un
+historial JSONL y marca regresiones frente a un baseline guardado.
+
+Uso:
+    python scripts/benchmark.py --scales 10k,100k,1m
+    python scripts/benchmark.py --scales 10k,100k --save-baseline
+    python scripts/benchmark.py --scales 100k --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from generate_synthetic_data import (
+    APELLIDOS,
+    CLASES_POLIZA,
+    ESTADOS_POLIZA,
+    ESTADOS_SINIESTRO,
+    LUGARES,
+    MARCAS,
+    NIF_LETTERS,
+    NOMBRES,
+    PLATE_LETTERS,
+    choice_array,
+    id_codes,
+    random_chars,
+)
+from result_export import export_result
+from risk_scoring import compute_scores, load_unified, load_watchlist, parse_rules, query_name, scored_frame
+
+DEFAULT_SCALES = "10k,100k"
+DEFAULT_SEED = 404
+DEFAULT_TOLERANCE = 0.20
+DEFAULT_MIN_DELTA = 0.05
+QUERY_NAME = "Jan Pereira"
+DATA_MARKER = "benchmark.json"
+# Versión del generador: un dataset guardado con otra versión se regenera
+DATA_VERSION = 2
+
+ASEGURADORAS = [("MAPFRE", "Mapfre Seguros"), ("ALLIANZ", "Allianz España"), ("AXA", "AXA Seguros"),
+                ("GENERALI", "Generali España"), ("ZURICH", "Zurich Seguros")]
+# Proporciones de dataset_final: 1400 siniestros por cada 1000 asegurados / pólizas / vehículos
+CLAIMS_PER_HOLDER = 1.4
+HIGH_RISK_SHARE = 0.10
+
+
+def parse_scale(text: str) -> int:
+    """'10k' -> 10000, '1m' -> 1000000."""
+    text = text.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    number = text[:-1] if factor > 1 else text
+    return int(float(number) * factor)
+
+
+def generate_dataset(output_dir: str, claims: int, seed: int = DEFAULT_SEED) -> Dict[str, int]:
+    """Genera las cinco tablas con `claims` siniestros (vectorizado y determinista por semilla y escala)."""
+    rng = np.random.default_rng([seed, claims])
+    holders = max(int(claims / CLAIMS_PER_HOLDER), 1)
+    high = max(int(holders * HIGH_RISK_SHARE), 1)
+    os.makedirs(output_dir, exist_ok=True)
+
+    ids = np.arange(1, holders + 1)
+    nombre = choice_array(rng, NOMBRES, holders)
+    apellido = choice_array(rng, APELLIDOS, holders)
+    # Perfil de alto riesgo a consultar: primeros asegurados
+    nombre[:high], apellido[:high] = "Jan", "Pereira"
+    nif_num = rng.integers(10_000_000, 100_000_000, size=holders)
+    full = pd.Series(nombre) + " " + pd.Series(apellido)
+
+    aseguradoras = pd.DataFrame({"id": np.arange(1, len(ASEGURADORAS) + 1),
+                                 "codigo": [c for c, _ in ASEGURADORAS],
+                                 "nombre": [n for _, n in ASEGURADORAS]})
+    asegurados = pd.DataFrame({
+        "id": ids,
+        "nif": np.char.add(nif_num.astype(str), NIF_LETTERS[nif_num % 23]),
+        "nombre": full.to_numpy(dtype=object),
+        "tipo_persona": choice_array(rng, ["FISICA", "JURIDICA"], holders, [0.9, 0.1]),
+        "Nombre": nombre,
+        "Apellido": apellido,
+    })
+    polizas = pd.DataFrame({
+        "id": ids,
+        "numero_poliza": id_codes("POL", ids),
+        "aseguradora_id": rng.integers(1, len(ASEGURADORAS) + 1, size=holders),
+        "clase_poliza": choice_array(rng, CLASES_POLIZA, holders),
+        "estado": choice_array(rng, ESTADOS_POLIZA, holders, [0.7, 0.2, 0.1]),
+        "Nombre": nombre,
+        "Apellido": apellido,
+    })
+    plates = np.char.add(rng.integers(1000, 10000, size=holders).astype(str), random_chars(rng, PLATE_LETTERS, holders, 3))
+    anio = rng.integers(2005, 2025, size=holders)
+    anio[:high] = rng.integers(2000, 2012, size=high)
+    vehiculos = pd.DataFrame({
+        "id": ids,
+        "matricula": plates,
+        "marca": choice_array(rng, MARCAS, holders),
+        "modelo": "Modelo",
+        "anio_small": anio,
+        "Nombre": nombre,
+        "Apellido": apellido,
+    })
+
+    # Siniestros: los asegurados de alto riesgo concentran un tercio de los siniestros
+    claim_ids = np.arange(1, claims + 1)
+    risky = rng.random(claims) < 1 / 3
+    owner = np.where(risky, rng.integers(0, high, size=claims), rng.integers(0, holders, size=claims))
+    days = rng.integers(0, (np.datetime64("2024-12-31") - np.datetime64("2020-01-01")).astype(int), size=claims)
+    importe = np.round(rng.gamma(2.0, 900.0, size=claims), 2)
+    importe[risky] = np.round(rng.uniform(3000, 9000, size=int(risky.sum())), 2)
+    siniestros = pd.DataFrame({
+        "id": claim_ids,
+        "referencia": id_codes("SIN", claim_ids),
+        "poliza_id": ids[owner],
+        "vehiculo_id": ids[owner],
+        "asegurado_id": ids[owner],
+        "fecha_siniestro": (np.datetime64("2020-01-01") + days).astype(str),
+        "lugar": choice_array(rng, LUGARES, claims),
+        "responsable": rng.random(claims) < 0.4,
+        "importe_estimada": importe,
+        "estado": choice_array(rng, ESTADOS_SINIESTRO, claims),
+        "Nombre": nombre[owner],
+        "Apellido": apellido[owner],
+    })
+    tables = {"aseguradoras": aseguradoras, "asegurados": asegurados, "polizas": polizas,
+              "vehiculos": vehiculos, "siniestros": siniestros}
+    for name, table in tables.items():
+        table.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False)
+    return {name: len(table) for name, table in tables.items()}
+
+
+def ensure_dataset(data_root: str, claims: int, seed: int) -> str:
+    """Directorio del dataset de la escala; se genera solo si no existe (o si cambió la semilla o el generador)."""
+    path = os.path.join(data_root, f"claims_{claims}_seed_{seed}")
+    marker = os.path.join(path, DATA_MARKER)
+    if os.path.isfile(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            if json.load(f).get("version") == DATA_VERSION:
+                return path
+    start = time.perf_counter()
+    sizes = generate_dataset(path, claims, seed)
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump({"claims": claims, "seed": seed, "version": DATA_VERSION, "rows": sizes}, f)
+    print(f"Dataset generado: {path} ({sum(sizes.values())} filas, {time.perf_counter() - start:.1f} s)")
+    return path
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Ejecuta `fn` `repeat` veces; devuelve el último resultado y los tiempos."""
+    times = []
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        times.append(time.perf_counter() - start)
+    return {"value": value, "min": min(times), "median": statistics.median(times)}
+
+
+def run_scale(dataset_dir: str, rules_path: str, watchlist_path: str, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Tiempos (mínimo y mediana en segundos) de cada paso sobre un dataset."""
+    out: Dict[str, Dict[str, float]] = {}
+
+    def record(step: str, timed: Dict[str, Any]) -> Any:
+        out[step] = {"min": round(timed["min"], 6), "median": round(timed["median"], 6)}
+        return timed["value"]
+
+    rules = record("parse_rules", _time(lambda: parse_rules(rules_path), repeat))
+    df = record("load_unified", _time(lambda: load_unified(dataset_dir), repeat))
+    record("compute_scores", _time(lambda: compute_scores(df, rules), repeat))
+    watchlist = load_watchlist(watchlist_path) if watchlist_path else {}
+    result = record("compute_scores_watchlist", _time(lambda: compute_scores(df, rules, watchlist), repeat))
+    record("query_name", _time(lambda: query_name(result, QUERY_NAME, watchlist), repeat))
+    export_dir = tempfile.mkdtemp(prefix="bench_export_")
+    try:
+        export_path = os.path.join(export_dir, "risk_rows.parquet")
+        record("export", _time(lambda: scored_frame(result).to_parquet(export_path, index=False), repeat))
+        record("export_dataset", _time(lambda: export_result(result, scored_frame(result),
+                                                            os.path.join(export_dir, "scoring")), repeat))
+    finally:
+        shutil.rmtree(export_dir, ignore_errors=True)
+    for step in out.values():
+        step["rows"] = len(df)
+    return out
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    if not path or not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Dict[str, Any],
+            tolerance: float, min_delta: float) -> List[Dict[str, Any]]:
+    """Filas de comparación por escala y paso; `regression` si supera la tolerancia relativa y absoluta."""
+    base_results = baseline.get("results", {})
+    rows = []
+    for scale, steps in results.items():
+        for step, timing in steps.items():
+            base = base_results.get(scale, {}).get(step)
+            current = timing["min"]
+            row = {"scale": int(scale), "step": step, "seconds": current, "rows": timing["rows"],
+                   "baseline": None, "ratio": None, "regression": False}
+            if base is not None:
+                row["baseline"] = base["min"]
+                row["ratio"] = current / base["min"] if base["min"] > 0 else None
+                row["regression"] = current > base["min"] * (1 + tolerance) and current - base["min"] > min_delta
+            rows.append(row)
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'escala':>10} {'paso':<26} {'seg':>9} {'filas/s':>12} {'baseline':>9} {'ratio':>7}"]
+    for r in rows:
+        rate = f"{r['rows'] / r['seconds']:,.0f}" if r["seconds"] > 0 and r["step"] != "parse_rules" else "-"
+        base = f"{r['baseline']:.4f}" if r["baseline"] is not None else "-"
+        ratio = f"{r['ratio']:.2f}x" if r["ratio"] is not None else "-"
+        flag = "  REGRESIÓN" if r["regression"] else ""
+        lines.append(f"{r['scale']:>10,} {r['step']:<26} {r['seconds']:>9.4f} {rate:>12} {base:>9} {ratio:>7}{flag}")
+    return "\n".join(lines)
+
+
+def append_history(path: str, entry: Dict[str, Any]) -> None:
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def save_baseline(path: str, entry: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """Guarda los resultados como baseline (las escalas no medidas conservan su valor anterior)."""
+    merged = dict(previous.get("results", {}))
+    merged.update(entry["results"])
+    baseline = {k: v for k, v in entry.items() if k != "results"}
+    baseline["results"] = merged
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmarks del motor de scoring a distintas escalas")
+    p.add_argument("--scales", default=DEFAULT_SCALES, help="Escalas en siniestros separadas por coma (10k,100k,1m,10m)")
+    p.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Semilla de generación")
+    p.add_argument("--data-dir", default=".cache/benchmark", help="Directorio de los datasets generados (se reutilizan)")
+    p.add_argument("--rules", default="rules_engine.md", help="Archivo markdown de reglas")
+    p.add_argument("--watchlist", default="watchlist.csv", help="Watchlist para compute_scores con watchlist")
+    p.add_argument("--repeat", type=int, default=3, help="Repeticiones por paso (se registra el mínimo y la mediana)")
+    p.add_argument("--history", default="reports/benchmark_history.jsonl", help="Historial JSONL de ejecuciones")
+    p.add_argument("--baseline", default="reports/benchmark_baseline.json", help="Baseline para detectar regresiones")
+    p.add_argument("--save-baseline", action="store_true", help="Guarda esta ejecución como baseline")
+    p.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Aumento relativo tolerado frente al baseline")
+    p.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA, help="Aumento mínimo en segundos para marcar regresión")
+    p.add_argument("--fail-on-regression", action="store_true", help="Código de salida 1 si hay regresiones")
+    p.add_argument("--label", default="", help="Etiqueta libre de la ejecución (p.ej. nombre de la rama)")
+    return p.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    scales = [parse_scale(s) for s in args.scales.split(",") if s.strip()]
+    watchlist = args.watchlist if args.watchlist and os.path.isfile(args.watchlist) else None
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for claims in scales:
+        dataset_dir = ensure_dataset(args.data_dir, claims, args.seed)
+        print(f"Midiendo {claims:,} siniestros ({args.repeat} repeticiones)...")
+        results[str(claims)] = run_scale(dataset_dir, args.rules, watchlist, args.repeat)
+
+    entry = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "label": args.label,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    baseline = load_baseline(args.baseline)
+    rows = compare(results, baseline, args.tolerance, args.min_delta)
+    print(format_comparison(rows))
+    append_history(args.history, entry)
+    print(f"Historial actualizado: {args.history}")
+    regressions = [r for r in rows if r["regression"]]
+    if baseline:
+        print(f"Regresiones frente al baseline ({baseline.get('commit') or '?'}): {len(regressions)}")
+    elif not args.save_baseline:
+        print("Sin baseline: usar --save-baseline para fijar uno")
+    if args.save_baseline:
+        save_baseline(args.baseline, entry, baseline)
+        print(f"Baseline guardado en {args.baseline}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,216 @@
+"""
+Representación compacta en memoria del frame unificado.
+
+La unión de CSV deja columnas de texto de baja cardinalidad como cadenas por
+fila y los IDs enteros como float64 (relleno con NaN de la concatenación).
+`compact_frame` convierte columna a columna, sin duplicar el frame completo;
+`compact_frames` aplica las mismas conversiones a cada archivo antes de la
+unión (tipos comunes entre archivos), de modo que la concatenación ya produce
+el frame compacto y el pico de memoria no incluye la versión sin compactar:
+
+- texto con pocos valores distintos -> `category`
+- float con valores enteros -> entero nullable más pequeño (`Int8` ... `Int64`)
+- enteros -> el tipo entero más pequeño que los contiene
+- float no entero -> `float32` solo si la conversión no pierde precisión
+
+Las conversiones no cambian el resultado de las reglas: `widen` devuelve la
+vista con la semántica original (float64 / texto) para comparaciones.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+CATEGORY_MAX_RATIO = 0.5
+REPORT_COLUMNS = ["column", "dtype_before", "dtype_after", "bytes_before", "bytes_after"]
+INT_TYPES = [(np.int8, "Int8"), (np.int16, "Int16"), (np.int32, "Int32"), (np.int64, "Int64")]
+
+
+def _smallest_int(lo: float, hi: float, nullable: bool) -> str:
+    for np_type, nullable_name in INT_TYPES:
+        info = np.iinfo(np_type)
+        if info.min <= lo and hi <= info.max:
+            return nullable_name if nullable else np.dtype(np_type).name
+    return "Int64" if nullable else "int64"
+
+
+def compact_series(series: pd.Series) -> pd.Series:
+    """Versión compacta de una columna (o la misma serie si no hay ganancia segura)."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+        return series
+    if pd.api.types.is_integer_dtype(dtype):
+        if len(series) == 0 or pd.api.types.is_extension_array_dtype(dtype):
+            return series
+        return series.astype(_smallest_int(series.min(), series.max(), False))
+    if pd.api.types.is_float_dtype(dtype):
+        values = series.to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return series
+        present = values[valid]
+        if np.all(np.isfinite(present)) and np.all(present == np.round(present)) \
+                and np.abs(present).max() < 2 ** 53:
+            return series.astype(_smallest_int(present.min(), present.max(), True))
+        if dtype == np.float64:
+            narrowed = values.astype(np.float32)
+            if np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+                return pd.Series(narrowed, index=series.index, name=series.name)
+        return series
+    if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+        nunique = series.nunique(dropna=True)
+        if len(series) and nunique <= len(series) * CATEGORY_MAX_RATIO:
+            return series.astype("category")
+    return series
+
+
+def _is_text(dtype) -> bool:
+    return (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)) \
+        and not isinstance(dtype, pd.CategoricalDtype)
+
+
+def _is_plain_numeric(dtype) -> bool:
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) \
+        and not pd.api.types.is_extension_array_dtype(dtype)
+
+
+def _as_category(series: pd.Series, dtype: pd.CategoricalDtype) -> pd.Series:
+    """`astype(dtype)` por factorización: se busca cada valor distinto una vez entre las categorías."""
+    codes, uniques = pd.factorize(series)
+    mapping = dtype.categories.get_indexer(uniques)
+    codes = np.where(codes >= 0, mapping[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=series.index, name=series.name)
+
+
+def _common_target(parts: List[pd.Series], total_rows: int) -> object:
+    """Tipo compacto común para una columna repartida en varios archivos (None si no conviene convertir)."""
+    dtypes = [s.dtype for s in parts]
+    if all(_is_text(d) for d in dtypes):
+        # Se conserva el tipo de texto original en las categorías (conversión sin reinterpretar valores)
+        distinct = pd.concat([pd.Series(s.dropna().unique()) for s in parts], ignore_index=True).drop_duplicates()
+        if total_rows and len(distinct) <= total_rows * CATEGORY_MAX_RATIO:
+            return distinct.astype("category").dtype
+        return None
+    if not all(_is_plain_numeric(d) for d in dtypes):
+        return None
+    padded = sum(len(s) for s in parts) < total_rows
+    values = [s.to_numpy(dtype=np.float64) for s in parts]
+    present = np.concatenate([v[~np.isnan(v)] for v in values])
+    if not len(present):
+        return None
+    if np.all(np.isfinite(present)) and np.all(present == np.round(present)) and np.abs(present).max() < 2 ** 53:
+        nullable = padded or any(np.isnan(v).any() for v in values)
+        return _smallest_int(present.min(), present.max(), nullable)
+    if all(d == np.float64 for d in dtypes) and np.array_equal(present.astype(np.float32).astype(np.float64), present):
+        return "float32"
+    return None
+
+
+def compact_frames(frames: List[pd.DataFrame]) -> Tuple[List[pd.DataFrame], Dict[str, Dict[str, object]]]:
+    """Compacta cada frame con tipos comunes por columna antes de concatenarlos.
+
+    Devuelve los frames convertidos y, por columna, tipo y bytes que tendría en la unión
+    sin compactar (entrada de `memory_report`; se materializa una columna a la vez).
+    """
+    total_rows = sum(len(f) for f in frames)
+    read_stats: Dict[str, Dict[str, object]] = {}
+    columns: Dict[str, List[int]] = {}
+    for i, frame in enumerate(frames):
+        for col in frame.columns:
+            columns.setdefault(col, []).append(i)
+    for col, owners in columns.items():
+        plain = pd.concat([f[[col]] if col in f.columns else pd.DataFrame(index=f.index) for f in frames],
+                          axis=0, ignore_index=True, sort=False)[col]
+        read_stats[col] = {"dtype": str(plain.dtype), "bytes": int(plain.memory_usage(index=False, deep=True))}
+        del plain
+        target = _common_target([frames[i][col] for i in owners], total_rows)
+        if target is None:
+            continue
+        for i in owners:
+            if isinstance(target, pd.CategoricalDtype):
+                frames[i][col] = _as_category(frames[i][col], target)
+            else:
+                frames[i][col] = frames[i][col].astype(target)
+    return frames, read_stats
+
+
+def memory_report(df: pd.DataFrame, read_stats: Dict[str, Dict[str, object]]) -> pd.DataFrame:
+    """Reporte por columna: memoria en la unión sin compactar frente a memoria en `df`."""
+    rows = []
+    for col in df.columns:
+        stat = read_stats.get(col, {"bytes": 0, "dtype": "-"})
+        rows.append({
+            "column": col,
+            "dtype_before": stat["dtype"],
+            "dtype_after": str(df[col].dtype),
+            "bytes_before": int(stat["bytes"]),
+            "bytes_after": int(df[col].memory_usage(index=False, deep=True)),
+        })
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+
+def compact_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Compacta `df` columna a columna (in situ). Devuelve (frame, reporte de memoria por columna)."""
+    rows = []
+    for col in list(df.columns):
+        before = df[col]
+        before_bytes = int(before.memory_usage(index=False, deep=True))
+        before_dtype = str(before.dtype)
+        after = compact_series(before)
+        if after is not before:
+            df[col] = after
+        del before
+        rows.append({
+            "column": col,
+            "dtype_before": before_dtype,
+            "dtype_after": str(df[col].dtype),
+            "bytes_before": before_bytes,
+            "bytes_after": int(df[col].memory_usage(index=False, deep=True)),
+        })
+    report = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+    return df, report
+
+
+def widen(series: pd.Series) -> pd.Series:
+    """Vista con la semántica de tipos original: float64 para enteros nullable y float32, texto para categorías."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = dtype.categories.dtype
+        return series.astype(categories if pd.api.types.is_string_dtype(categories) else object)
+    if pd.api.types.is_extension_array_dtype(dtype) and pd.api.types.is_integer_dtype(dtype):
+        return series.astype("float64")
+    if dtype == np.float32:
+        return series.astype("float64")
+    return series
+
+
+def text_view(series: pd.Series) -> pd.Series:
+    """`widen(series).astype(str)`; en columnas categóricas se convierten solo las categorías."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        labels = series.cat.categories.astype(str)
+        if labels.is_unique:
+            return series.cat.rename_categories(labels)
+    return widen(series).astype(str)
+
+
+def numeric_view(series: pd.Series) -> pd.Series:
+    """`pd.to_numeric(widen(series), errors="coerce")`; en columnas categóricas se convierten solo las categorías."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        values = pd.to_numeric(pd.Series(series.cat.categories, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+        codes = series.cat.codes.to_numpy()
+        out = np.where(codes >= 0, values[codes] if len(values) else np.nan, np.nan)
+        return pd.Series(out, index=series.index, name=series.name)
+    return pd.to_numeric(widen(series), errors="coerce")
+
+
+def format_memory_report(report: pd.DataFrame) -> str:
+    def mb(n: int) -> str:
+        return f"{n / 1_048_576:.2f} MB"
+
+    lines = ["Memoria por columna (antes -> después):"]
+    for r in report.sort_values("bytes_before", ascending=False).itertuples(index=False):
+        lines.append(f" - {r.column}: {r.dtype_before} {mb(r.bytes_before)} -> {r.dtype_after} {mb(r.bytes_after)}")
+    before, after = int(report["bytes_before"].sum()), int(report["bytes_after"].sum())
+    ratio = (1 - after / before) * 100 if before else 0.0
+    lines.append(f"Total: {mb(before)} -> {mb(after)} ({ratio:.0f}% menos)")
+    return "\n".join(lines)
@@ -3,12 +3,25 @@ import sys
 import csv
 import argparse
 import math
-from typing import List, Dict, Any, Tuple
+import zlib
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple
 
 import pandas as pd
 
+from dataset_cache import DatasetCache
+from parallel_io import format_timings, read_files
+from schema_registry import SCHEMA_FILE_NAME, SchemaRegistry
+from sketches import DistinctSketch, Reservoir, hash_rows, hash_values
+
 NA_VALUES = ["", "NA", "N/A", "null", "Null", "NONE", "None"]
-DEFAULT_MAX_PROFILE_ROWS = 20000
+CSV_ENCODINGS = ["utf-8", "ISO-8859-1", "latin1", "cp1252"]
+DEFAULT_PROFILE_CHUNK_ROWS = 100_000
+DEFAULT_SAMPLE_ROWS = 5
+DATE_SAMPLE_SIZE = 20
+DATE_FORMATS = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%m/%d/%Y", "%d/%m/%Y %H:%M"]
+# Hashes de fila guardados para contar duplicados exactos (8 bytes cada uno); después, HyperLogLog
+DUPLICATE_EXACT_LIMIT = 2_000_000
 
 
 def list_csv_files(dataset_dir: str) -> List[str]:
@@ -19,10 +32,9 @@ def list_csv_files(dataset_dir: str) -> List[str]:
     return sorted(files)
 
 
-def try_read_csv(path: str, nrows: int = None) -> pd.DataFrame:
-    encodings = ["utf-8", "ISO-8859-1", "latin1", "cp1252"]
+def try_read_csv(path: str, nrows: int = None, dtype: Dict[str, str] = None) -> pd.DataFrame:
     last_error = None
-    for enc in encodings:
+    for enc in CSV_ENCODINGS:
         try:
             df = pd.read_csv(
                 path,
@@ -30,6 +42,7 @@ def try_read_csv(path: str, nrows: int = None) -> pd.DataFrame:
                 na_values=NA_VALUES,
                 low_memory=True,
                 nrows=nrows,
+                dtype=dtype,
                 on_bad_lines='skip'
             )
             return df
@@ -38,6 +51,41 @@ def try_read_csv(path: str, nrows: int = None) -> pd.DataFrame:
     raise RuntimeError(f"No se pudo leer {path}: {last_error}")
 
 
+def detect_date_format(values: List[str]) -> Tuple[bool, Optional[str]]:
+    """Heurística fecha vectorizada sobre una muestra de valores de texto.
+
+    Devuelve (parece fecha, formato explícito que encaja con toda la muestra o None).
+    """
+    sample = pd.Series(values, dtype=object).astype(str).str.strip()
+    candidates = sample[(sample.str.len() >= 6) & sample.str.contains(r"[-/:]", regex=True)]
+    best_format, best = None, 0
+    for fmt in DATE_FORMATS:
+        parsed = int(pd.to_datetime(candidates, format=fmt, errors="coerce").notna().sum())
+        if parsed > best:
+            best_format, best = fmt, parsed
+    date_like = best
+    if best < len(candidates):
+        # Formatos heterogéneos: parseo por elemento (equivalente al intento valor a valor)
+        date_like = int(pd.to_datetime(candidates, format="mixed", errors="coerce").notna().sum())
+    is_date = date_like >= max(3, len(values) * 0.3)
+    return is_date, (best_format if is_date and best == len(sample) else None)
+
+
+def is_date_like(values: List[str]) -> bool:
+    return detect_date_format(values)[0]
+
+
+def categorical_or_text(nunique: int, total: int) -> str:
+    if nunique <= 50 and (total == 0 or nunique / max(1, total) < 0.2):
+        return "categorical"
+    return "text"
+
+
+def _is_text_dtype(series: pd.Series) -> bool:
+    # En pandas >= 3 el texto se lee como `str` (no `object`): ambos pasan por la heurística
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
 def simplify_dtype(series: pd.Series) -> str:
     if pd.api.types.is_integer_dtype(series):
         return "int"
@@ -47,66 +95,164 @@ def simplify_dtype(series: pd.Series) -> str:
         return "bool"
     if pd.api.types.is_datetime64_any_dtype(series):
         return "date"
-    # Heurística fecha
-    if series.dtype == object:
-        sample = series.dropna().head(20).astype(str)
-        date_like = 0
-        for v in sample:
-            v_strip = v.strip()
-            if len(v_strip) >= 6 and any(sep in v_strip for sep in ["-", "/", ":"]):
-                # Intento parseo
-                try:
-                    pd.to_datetime(v_strip, errors="raise")
-                    date_like += 1
-                except Exception:  # noqa: BLE001
-                    pass
-        if date_like >= max(3, len(sample) * 0.3):
+    if _is_text_dtype(series):
+        if is_date_like(series.dropna().head(DATE_SAMPLE_SIZE).tolist()):
             return "date"
         # Categórica vs texto libre
-        nunique = series.nunique(dropna=True)
-        total = len(series)
-        if nunique <= 50 and (total == 0 or nunique / max(1, total) < 0.2):
-            return "categorical"
-        return "text"
+        return categorical_or_text(series.nunique(dropna=True), len(series))
     return str(series.dtype)
 
 
+def is_id_column(nunique: int, rows: int) -> bool:
+    return nunique >= rows * 0.95 and nunique > 50
+
+
 def detect_id_column(series: pd.Series) -> bool:
-    if series.nunique(dropna=True) >= len(series) * 0.95 and series.nunique(dropna=True) > 50:
-        return True
-    return False
+    return is_id_column(series.nunique(dropna=True), len(series))
+
+
+def _chunk_kind(series: pd.Series) -> str:
+    if series.dtype == object:
+        return "object"
+    if pd.api.types.is_string_dtype(series.dtype):
+        return "text"
+    return simplify_dtype(series)
+
+
+class ColumnStats:
+    """Estadísticas de una columna acumuladas bloque a bloque."""
+
+    def __init__(self):
+        self.kinds = set()
+        self.nulls = 0
+        self.head: List[str] = []
+        self.distinct = DistinctSketch()
+
+    def update(self, series: pd.Series) -> None:
+        missing = series.isna()
+        nulls = int(missing.sum())
+        self.nulls += nulls
+        if nulls == len(series):
+            # Bloque sin valores: no aporta tipo (pandas lo leería como float)
+            return
+        self.kinds.add(_chunk_kind(series))
+        present = series[~missing]
+        if len(self.head) < DATE_SAMPLE_SIZE:
+            self.head += present.head(DATE_SAMPLE_SIZE - len(self.head)).astype(str).tolist()
+        self.distinct.update(hash_values(present))
+
+    def dtype(self, rows: int) -> str:
+        # Mismo resultado que `simplify_dtype` sobre la columna completa (int + float -> float, etc.)
+        kinds = self.kinds
+        if not kinds:
+            return "float"
+        if kinds == {"int"}:
+            return "float" if self.nulls else "int"
+        if kinds <= {"int", "float"}:
+            return "float"
+        if (kinds == {"bool"} and not self.nulls) or kinds == {"date"}:
+            return next(iter(kinds))
+        if is_date_like(self.head):
+            return "date"
+        return categorical_or_text(self.distinct.estimate(), rows)
+
+    def read_dtype(self) -> Optional[str]:
+        """Tipo explícito para `pd.read_csv` equivalente al que inferiría pandas (None: columna mixta)."""
+        kinds = self.kinds
+        if not kinds or (kinds <= {"int", "float"} and (self.nulls or "float" in kinds)):
+            return "float64"
+        if kinds == {"int"}:
+            return "int64"
+        if kinds == {"bool"} and not self.nulls:
+            return "bool"
+        if kinds == {"text"}:
+            return "str"
+        return None
+
+    def date_format(self) -> Optional[str]:
+        if self.kinds != {"text"}:
+            return None
+        return detect_date_format(self.head)[1]
+
+
+class StreamingProfile:
+    """Perfil de un archivo en una sola pasada por bloques y con memoria acotada.
+
+    Conteos exactos (filas, faltantes, memoria), distintos y duplicados con
+    `DistinctSketch` (exactos mientras caben, HyperLogLog después) y una muestra
+    aleatoria uniforme (`Reservoir`) además de las primeras filas.
+    """
+
+    def __init__(self, file_path: str, sample_rows: int = DEFAULT_SAMPLE_ROWS, seed: int = 0):
+        self.file_path = file_path
+        self.sample_rows = sample_rows
+        self.rows = 0
+        self.memory_bytes = 0
+        self.columns: Dict[str, ColumnStats] = {}
+        self.row_distinct = DistinctSketch(exact_limit=DUPLICATE_EXACT_LIMIT)
+        self.reservoir = Reservoir(sample_rows, zlib.crc32(os.path.basename(file_path).encode()) + seed)
+        self.head: List[Dict[str, Any]] = []
+
+    def update(self, df: pd.DataFrame) -> "StreamingProfile":
+        for col in df.columns:
+            self.columns.setdefault(col, ColumnStats()).update(df[col])
+        self.row_distinct.update(hash_rows(df))
+        self.reservoir.update(df)
+        if len(self.head) < self.sample_rows:
+            self.head += df.head(self.sample_rows - len(self.head)).to_dict(orient="records")
+        self.rows += len(df)
+        self.memory_bytes += int(df.memory_usage(deep=True).sum())
+        return self
+
+    def result(self) -> Dict[str, Any]:
+        info: Dict[str, Any] = {}
+        info["file_name"] = os.path.basename(self.file_path)
+        info["rows"] = self.rows
+        info["columns"] = len(self.columns)
+        info["memory_kb"] = math.ceil(self.memory_bytes / 1024)
+        col_details = []
+        for col, stats in self.columns.items():
+            nunique = stats.distinct.estimate()
+            dtype = stats.dtype(self.rows)
+            col_details.append({
+                "name": col,
+                "dtype": dtype,
+                "read_dtype": stats.read_dtype(),
+                "date_format": stats.date_format() if dtype == "date" else None,
+                "missing_pct": round(stats.nulls / self.rows * 100, 2) if self.rows else 0.0,
+                "nunique": nunique,
+                "nunique_exact": stats.distinct.is_exact,
+                "is_id": is_id_column(nunique, self.rows),
+            })
+        info["columns_detail"] = col_details
+        info["duplicate_rows"] = max(self.rows - self.row_distinct.estimate(), 0)
+        info["duplicate_exact"] = self.row_distinct.is_exact
+        info["sample_head"] = self.head
+        info["sample_random"] = self.reservoir.records()
+        return info
 
 
 def profile_dataframe(df: pd.DataFrame, file_path: str) -> Dict[str, Any]:
-    info: Dict[str, Any] = {}
-    info["file_name"] = os.path.basename(file_path)
-    info["rows"] = len(df)
-    info["columns"] = len(df.columns)
-    info["memory_kb"] = math.ceil(df.memory_usage(deep=True).sum() / 1024)
-    # Column details
-    col_details = []
-    for col in df.columns:
-        ser = df[col]
-        dtype_simple = simplify_dtype(ser)
-        missing_pct = round(ser.isna().mean() * 100, 2)
-        nunique = ser.nunique(dropna=True)
-        is_id = detect_id_column(ser)
-        col_details.append({
-            "name": col,
-            "dtype": dtype_simple,
-            "missing_pct": missing_pct,
-            "nunique": nunique,
-            "is_id": is_id,
-        })
-    info["columns_detail"] = col_details
-    # Duplicates
-    try:
-        info["duplicate_rows"] = int(df.duplicated().sum())
-    except Exception:  # noqa: BLE001
-        info["duplicate_rows"] = None
-    # Sample head
-    info["sample_head"] = df.head(5).to_dict(orient="records")
-    return info
+    return StreamingProfile(file_path).update(df).result()
+
+
+def profile_csv(path: str, chunk_rows: int = DEFAULT_PROFILE_CHUNK_ROWS, max_rows: int = None,
+                sample_rows: int = DEFAULT_SAMPLE_ROWS) -> Dict[str, Any]:
+    """Perfila un CSV completo (o sus primeras `max_rows` filas) leyéndolo una vez por bloques."""
+    last_error = None
+    for enc in CSV_ENCODINGS:
+        profile = StreamingProfile(path, sample_rows)
+        try:
+            reader = pd.read_csv(path, encoding=enc, na_values=NA_VALUES, low_memory=True, nrows=max_rows,
+                                 on_bad_lines='skip', chunksize=chunk_rows)
+            with reader:
+                for chunk in reader:
+                    profile.update(chunk)
+        except Exception as e:  # noqa: BLE001
+            last_error = e
+            continue
+        return profile.result()
+    raise RuntimeError(f"No se pudo leer {path}: {last_error}")
 
 
 def build_report(profiles: List[Dict[str, Any]]) -> str:
@@ -121,28 +267,54 @@ def build_report(profiles: List[Dict[str, Any]]) -> str:
         lines.append("| Columna | Tipo | % Faltantes | Únicos | ID? |")
         lines.append("|---------|------|-------------|--------|-----|")
         for c in p["columns_detail"]:
-            lines.append(f"| {c['name']} | {c['dtype']} | {c['missing_pct']} | {c['nunique']} | {('Sí' if c['is_id'] else 'No')} |")
+            nunique = c['nunique'] if c.get('nunique_exact', True) else f"≈{c['nunique']}"
+            lines.append(f"| {c['name']} | {c['dtype']} | {c['missing_pct']} | {nunique} | {('Sí' if c['is_id'] else 'No')} |")
         lines.append("")
-        lines.append(f"Duplicados: {p['duplicate_rows']}")
+        duplicates = p['duplicate_rows'] if p.get('duplicate_exact', True) else f"≈{p['duplicate_rows']}"
+        lines.append(f"Duplicados: {duplicates}")
         lines.append("")
         lines.append("### Muestra (primeras 5 filas)")
-        if p["sample_head"]:
-            header = p["sample_head"][0].keys()
-            lines.append("| " + " | ".join(header) + " |")
-            lines.append("|" + "|".join(["---" for _ in header]) + "|")
-            for row in p["sample_head"]:
-                lines.append("| " + " | ".join([str(row.get(h, "")) for h in header]) + " |")
+        lines += _sample_table(p["sample_head"])
+        lines.append("")
+        if p.get("sample_random") and p["rows"] > len(p["sample_head"]):
+            lines.append(f"### Muestra aleatoria ({len(p['sample_random'])} filas del archivo completo)")
+            lines += _sample_table(p["sample_random"])
+            lines.append("")
+    if any(not p.get("duplicate_exact", True) or not all(c.get("nunique_exact", True) for c in p["columns_detail"])
+           for p in profiles):
+        lines.append("≈: estimación HyperLogLog (error típico < 1%).")
         lines.append("")
     return "\n".join(lines)
 
 
-def unify_datasets(file_paths: List[str], chunk_size: int = None) -> pd.DataFrame:
+def _sample_table(rows: List[Dict[str, Any]]) -> List[str]:
+    if not rows:
+        return []
+    header = rows[0].keys()
+    lines = ["| " + " | ".join(header) + " |", "|" + "|".join(["---" for _ in header]) + "|"]
+    for row in rows:
+        lines.append("| " + " | ".join([str(row.get(h, "")) for h in header]) + " |")
+    return lines
+
+
+def read_typed_csv(path: str, schema: SchemaRegistry) -> pd.DataFrame:
+    return schema.read(try_read_csv, path)
+
+
+def unify_datasets(file_paths: List[str], chunk_size: int = None, cache: DatasetCache = None,
+                   workers: int = 1, use_processes: bool = False, schema: SchemaRegistry = None) -> pd.DataFrame:
+    reader = partial(read_typed_csv, schema=schema) if schema else try_read_csv
+    variant = schema.cache_variant("data_loader") if schema else "data_loader"
+    results = read_files(file_paths, reader, workers, use_processes, cache, variant=variant)
     frames = []
-    for path in file_paths:
-        df = try_read_csv(path)  # leer completo (simplificación)
-        df["__source_file"] = os.path.basename(path)
+    for res in results:
+        if res.error is not None:
+            raise RuntimeError(f"No se pudo leer {res.path}: {res.error}")
+        df = res.df
+        df["__source_file"] = os.path.basename(res.path)
         frames.append(df)
     unified = pd.concat(frames, axis=0, ignore_index=True, sort=False)
+    unified.attrs = {"load_timings": format_timings(results)}
     return unified
 
 
@@ -158,10 +330,16 @@ def save_output(df: pd.DataFrame, output_path: str, export_format: str) -> None:
 def parse_args(argv: List[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Perfil y unificación de CSVs del dataset")
     parser.add_argument("--dataset-dir", default="dataset", help="Directorio con archivos CSV")
-    parser.add_argument("--max-profile-rows", type=int, default=DEFAULT_MAX_PROFILE_ROWS, help="Máximo de filas a cargar para perfilado si el archivo es grande")
+    parser.add_argument("--max-profile-rows", type=int, default=None, help="Limita las filas perfiladas por archivo (por defecto, el archivo completo)")
+    parser.add_argument("--profile-chunk-rows", type=int, default=DEFAULT_PROFILE_CHUNK_ROWS, help="Filas por bloque al perfilar en streaming")
+    parser.add_argument("--sample-rows", type=int, default=DEFAULT_SAMPLE_ROWS, help="Filas de la muestra aleatoria (reservorio) por archivo")
     parser.add_argument("--output", default="dataset/combined_dataset.parquet", help="Ruta de salida para dataset unificado")
     parser.add_argument("--export-format", choices=["parquet", "csv"], default="parquet", help="Formato de salida unificado")
+    parser.add_argument("--cache-dir", default=None, help="Directorio de caché Parquet de los CSV (se reutiliza si los archivos no cambiaron)")
+    parser.add_argument("--workers", type=int, default=1, help="Archivos leídos en paralelo al unificar (>1 muestra tiempos por archivo)")
+    parser.add_argument("--process-pool", action="store_true", help="Usa procesos en lugar de hilos para la lectura paralela")
     parser.add_argument("--report", default="reports/dataset_profile.md", help="Ruta del reporte de perfil")
+    parser.add_argument("--schema-output", default=None, help=f"Ruta del esquema inferido (por defecto, <dataset-dir>/{SCHEMA_FILE_NAME})")
     return parser.parse_args(argv)
 
 
@@ -177,15 +355,8 @@ def main(argv: List[str]) -> int:
 
     profiles = []
     for path in csv_files:
-        # Perfilado parcial si grande
-        total_rows = sum(1 for _ in open(path, "r", encoding="utf-8", errors="ignore")) - 1  # rest header
-        if total_rows > args.max_profile_rows:
-            df_profile = try_read_csv(path, nrows=args.max_profile_rows)
-        else:
-            df_profile = try_read_csv(path)
-        profile = profile_dataframe(df_profile, path)
-        profile["rows_total_file"] = total_rows
-        profiles.append(profile)
+        # Una sola lectura por bloques del archivo completo (memoria acotada)
+        profiles.append(profile_csv(path, args.profile_chunk_rows, args.max_profile_rows, args.sample_rows))
 
     report_text = build_report(profiles)
     os.makedirs(os.path.dirname(args.report), exist_ok=True)
@@ -193,7 +364,26 @@ def main(argv: List[str]) -> int:
         f.write(report_text)
     print(f"Reporte generado: {args.report}")
 
-    unified = unify_datasets(csv_files)
+    # Tipos inferidos por tabla: los cargadores leen después con dtypes explícitos
+    schema = SchemaRegistry.for_dataset(args.dataset_dir, args.schema_output)
+    if args.max_profile_rows is None:
+        for profile in profiles:
+            schema.update(profile)
+        print(f"Esquema guardado: {schema.save()}")
+
+    cache = DatasetCache(args.cache_dir) if args.cache_dir else None
+    unified = unify_datasets(csv_files, cache=cache, workers=args.workers, use_processes=args.process_pool,
+                             schema=schema)
+    if args.workers > 1:
+        print(f"Lectura paralela ({args.workers} workers):")
+        for line in unified.attrs.get("load_timings", []):
+            print(line)
+    if cache is not None:
+        print(cache.summary())
+    if schema.stale:
+        print("Tablas que no encajan con el esquema (leídas con inferencia):")
+        for line in schema.stale_report():
+            print(line)
     os.makedirs(os.path.dirname(args.output), exist_ok=True)
     save_output(unified, args.output, args.export_format)
     print(f"Dataset unificado guardado en: {args.output} ({len(unified)} filas, {len(unified.columns)} columnas)")
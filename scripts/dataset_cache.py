@@ -0,0 +1,120 @@
+"""
+Caché columnar persistente de los CSV del dataset.
+
+Cada CSV leído se guarda como Parquet junto con sus tipos inferidos. La entrada
+del manifiesto se identifica por ruta y lector (`variant`) y guarda tamaño,
+mtime y hash de contenido: si tamaño y mtime coinciden se usa el Parquet; si
+cambió el mtime pero no el contenido se actualiza el manifiesto sin reparsear;
+en otro caso se vuelve a leer el CSV y se reconstruye solo ese archivo.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+MANIFEST_NAME = "manifest.json"
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def file_fingerprint(path: str) -> Dict[str, Any]:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def content_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DatasetCache:
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self.manifest: Dict[str, Dict[str, Any]] = self._load_manifest()
+        self.hits: List[str] = []
+        self.rebuilt: List[str] = []
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.isfile(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _key(self, path: str, variant: str) -> str:
+        return f"{variant}:{os.path.abspath(path)}"
+
+    def _cache_file(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".parquet")
+
+    def is_fresh(self, path: str, variant: str = "default") -> bool:
+        key = self._key(path, variant)
+        entry = self.manifest.get(key)
+        if not entry or not os.path.isfile(entry.get("cache_file", "")):
+            return False
+        fp = file_fingerprint(path)
+        if fp["size"] != entry["size"]:
+            return False
+        if fp["mtime_ns"] == entry["mtime_ns"]:
+            return True
+        # mtime distinto: confirmar por contenido antes de invalidar
+        if content_hash(path) == entry["sha256"]:
+            entry["mtime_ns"] = fp["mtime_ns"]
+            self._save_manifest()
+            return True
+        return False
+
+    def cached_file(self, path: str, variant: str = "default") -> str:
+        """Ruta del Parquet vigente para `path`, o None si hay que reconstruirlo."""
+        if self.is_fresh(path, variant):
+            return self.manifest[self._key(path, variant)]["cache_file"]
+        return None
+
+    def read(self, path: str, reader: Callable[[str], pd.DataFrame], variant: str = "default") -> pd.DataFrame:
+        """Devuelve el DataFrame del CSV desde caché si está vigente; si no, lo lee con `reader` y lo guarda."""
+        cache_file = self.cached_file(path, variant)
+        if cache_file is not None:
+            df = pd.read_parquet(cache_file)
+            self.hits.append(os.path.basename(path))
+            return df
+        df = reader(path)
+        self.store(path, df, variant)
+        return df
+
+    def store(self, path: str, df: pd.DataFrame, variant: str = "default") -> None:
+        key = self._key(path, variant)
+        cache_file = self._cache_file(key)
+        try:
+            df.to_parquet(cache_file, index=False)
+        except Exception:  # noqa: BLE001
+            # Columnas con tipos mixtos no serializables: se deja sin caché
+            self.manifest.pop(key, None)
+            return
+        entry = file_fingerprint(path)
+        entry.update({
+            "path": os.path.abspath(path),
+            "sha256": content_hash(path),
+            "cache_file": cache_file,
+            "rows": len(df),
+            "dtypes": {str(c): str(t) for c, t in df.dtypes.items()},
+        })
+        self.manifest[key] = entry
+        self.rebuilt.append(os.path.basename(path))
+        self._save_manifest()
+
+    def summary(self) -> str:
+        return f"Caché de datos: {len(self.hits)} archivos reutilizados, {len(self.rebuilt)} reconstruidos"
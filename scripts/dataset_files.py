@@ -0,0 +1,45 @@
+"""
+Archivos de datos de un dataset.
+
+Además de las tablas de la raíz (`<tabla>.csv` o `<tabla>.parquet`), se leen las
+tablas troceadas de `generate_synthetic_data.py --shard-rows`
+(`<tabla>/part-NNNNN.<ext>`). Cada parte se identifica con el nombre de su
+tabla (`<tabla>.<ext>`): las filas de una tabla troceada se numeran y agregan
+como si fuera un único archivo.
+"""
+import os
+from typing import Iterator, List, Tuple
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+DATA_EXTENSIONS = (".csv", ".parquet")
+PART_PREFIX = "part-"
+
+
+def is_parquet(path: str) -> bool:
+    return path.lower().endswith(".parquet")
+
+
+def list_data_files(dataset_dir: str) -> List[Tuple[str, str]]:
+    """(nombre de la fuente, ruta) de cada archivo de datos, en orden estable (tabla y número de parte)."""
+    files = []
+    for entry in sorted(os.listdir(dataset_dir)):
+        path = os.path.join(dataset_dir, entry)
+        if os.path.isdir(path):
+            parts = sorted(p for p in os.listdir(path)
+                           if p.startswith(PART_PREFIX) and p.lower().endswith(DATA_EXTENSIONS))
+            files.extend((entry + os.path.splitext(p)[1].lower(), os.path.join(path, p)) for p in parts)
+        elif entry.lower().endswith(DATA_EXTENSIONS):
+            files.append((entry, path))
+    return files
+
+
+def parquet_header(path: str) -> List[str]:
+    return [c for c in pq.read_schema(path).names if not c.startswith("__index_level_")]
+
+
+def iter_parquet_chunks(path: str, usecols: List[str], chunksize: int) -> Iterator[pd.DataFrame]:
+    """Bloques de `chunksize` filas de un Parquet sin cargarlo entero."""
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=usecols or None):
+        yield batch.to_pandas()
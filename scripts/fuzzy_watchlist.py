@@ -0,0 +1,253 @@
+"""
+Coincidencia aproximada de nombres contra la watchlist.
+
+Para cada nombre distinto del dataset (ya normalizado) se busca la mejor entrada
+de la watchlist en este orden:
+1. igualdad sin acentos (`JUAN JOSÉ` == `JUAN JOSE`), similitud 1.0;
+2. por trigramas: un índice invertido trigrama -> entradas genera candidatos
+   (filtros de prefijo, largo y conteo de trigramas compartidos, sin comparar
+   todos contra todos) que se verifican con distancia de edición acotada;
+3. clave fonética para nombres en español (`V`/`B`, `Z`/`C`/`S`, `LL`/`Y`,
+   `H` muda, ...), con similitud fija `PHONETIC_SIMILARITY`.
+El score de watchlist se pondera por la similitud obtenida.
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MIN_SIMILARITY = 0.85
+DEFAULT_BATCH_SIZE = 5000
+PHONETIC_SIMILARITY = 0.9
+PREFIX_EXTRA = 2
+MAX_PROBE_PAIRS = 2_000_000
+MAX_VERIFY_PAIRS = 200_000
+MATCH_COLUMNS = ["full_name", "watch_name", "similarity", "method", "watchlist_score", "weighted_score"]
+
+# Reglas de la clave fonética (se aplican en orden sobre texto sin acentos y en mayúsculas)
+PHONETIC_RULES = [
+    (r"[^A-Z ]", ""),
+    (r"CH", "X"),
+    (r"LL", "Y"),
+    (r"QU(?=[EI])", "K"),
+    (r"Q", "K"),
+    (r"G(?=[EI])", "J"),
+    (r"GU(?=[EI])", "G"),
+    (r"C(?=[EI])", "S"),
+    (r"Z", "S"),
+    (r"C", "K"),
+    (r"[VW]", "B"),
+    (r"H", ""),
+    (r"N(?=[BP])", "M"),
+    (r"Y(?![AEIOU])", "I"),
+    (r"([A-Z])\1+", r"\1"),
+    (r"\s+", " "),
+]
+
+
+def fold_accents(names: pd.Series) -> pd.Series:
+    """Mayúsculas, sin acentos ni diacríticos (Ñ -> N) y espacios colapsados."""
+    folded = names.astype(str).str.upper().str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    return folded.str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def phonetic_keys(folded: pd.Series) -> pd.Series:
+    """Clave fonética aproximada para nombres en español (entrada ya pasada por `fold_accents`)."""
+    # dtype object: las reglas usan lookahead y referencias, no soportados por el motor regex de Arrow
+    keys = folded.astype(object)
+    for pattern, repl in PHONETIC_RULES:
+        keys = keys.str.replace(pattern, repl, regex=True)
+    return keys.str.strip()
+
+
+def trigram_pairs(strings: np.ndarray) -> pd.DataFrame:
+    """Pares (id, trigrama) únicos de cada texto, con relleno de bordes; vectorizado sobre puntos de código."""
+    if len(strings) == 0:
+        return pd.DataFrame({"id": np.array([], dtype=np.int64), "gram": np.array([], dtype=np.int64)})
+    padded = np.char.add(np.char.add("  ", strings.astype(str)), " ")
+    width = padded.dtype.itemsize // 4
+    codes = padded.view(np.uint32).reshape(len(padded), width).astype(np.int64)
+    lengths = np.char.str_len(padded)
+    if width < 3:
+        return pd.DataFrame({"id": np.array([], dtype=np.int64), "gram": np.array([], dtype=np.int64)})
+    grams = (codes[:, :-2] << 42) | (codes[:, 1:-1] << 21) | codes[:, 2:]
+    valid = np.arange(width - 2)[None, :] + 3 <= lengths[:, None]
+    ids, cols = np.nonzero(valid)
+    out = pd.DataFrame({"id": ids.astype(np.int64), "gram": grams[ids, cols]})
+    return out.drop_duplicates(ignore_index=True)
+
+
+def _code_matrix(strings: np.ndarray) -> np.ndarray:
+    arr = np.asarray(strings.astype(str))
+    width = max(arr.dtype.itemsize // 4, 1)
+    return arr.astype(f"<U{width}").view(np.uint32).reshape(len(arr), width)
+
+
+def levenshtein_pairs(a: np.ndarray, b: np.ndarray, band: int = None) -> np.ndarray:
+    """Distancia de edición de cada par (a[i], b[i]), vectorizada sobre los pares.
+
+    Con `band` solo se calculan las celdas a esa distancia de la diagonal: el resultado es exacto
+    si la distancia es <= band y mayor que band en otro caso.
+    """
+    n = len(a)
+    if n == 0:
+        return np.array([], dtype=np.int64)
+    # Matrices (posición, par): cada paso de la programación dinámica opera sobre memoria contigua
+    ca, cb = np.ascontiguousarray(_code_matrix(a).T), np.ascontiguousarray(_code_matrix(b).T)
+    len_a = np.char.str_len(a.astype(str)).astype(np.int64)
+    len_b = np.char.str_len(b.astype(str)).astype(np.int64)
+    cols = np.arange(n)
+    width_a, width_b = ca.shape[0], cb.shape[0]
+    if band is None:
+        band = max(width_a, width_b)
+    outside = np.int16(band + 1)
+    prev = np.repeat(np.minimum(np.arange(width_b + 1), band + 1).astype(np.int16)[:, None], n, axis=1)
+    cur = np.full_like(prev, outside)
+    result = np.minimum(len_b, band + 1)
+    for i in range(1, width_a + 1):
+        lo, hi = max(1, i - band), min(width_b, i + band)
+        cur[0] = min(i, band + 1)
+        if lo > 1:
+            cur[lo - 1] = outside
+        char_a = ca[i - 1]
+        for j in range(lo, hi + 1):
+            cost = prev[j - 1] + (char_a != cb[j - 1])
+            np.minimum(np.minimum(prev[j], cur[j - 1]) + 1, cost, out=cur[j])
+        np.minimum(cur[lo:hi + 1], outside, out=cur[lo:hi + 1])
+        if hi < width_b:
+            cur[hi + 1] = outside
+        done = len_a == i
+        result[done] = cur[len_b[done], cols[done]]
+        prev, cur = cur, prev
+    # Si los largos difieren más que la banda, la celda final nunca se calculó
+    result[np.abs(len_a - len_b) > band] = band + 1
+    return result.astype(np.int64)
+
+
+class FuzzyWatchlist:
+    """Índice de la watchlist (sin acentos, trigramas y claves fonéticas) para coincidencias aproximadas."""
+
+    def __init__(self, scores: pd.Series, min_similarity: float = DEFAULT_MIN_SIMILARITY, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.min_similarity = min_similarity
+        self.batch_size = batch_size
+        # Si varias entradas colapsan en la misma forma, se conserva la de mayor score
+        entries = pd.DataFrame({"watch_name": scores.index.astype(str), "watchlist_score": scores.to_numpy()})
+        entries["folded"] = fold_accents(entries["watch_name"])
+        entries["phonetic"] = phonetic_keys(entries["folded"])
+        entries = entries.sort_values("watchlist_score", ascending=False, kind="stable").reset_index(drop=True)
+        self.entries = entries
+        self.by_folded = entries.drop_duplicates("folded").set_index("folded")
+        self.by_phonetic = entries[entries["phonetic"] != ""].drop_duplicates("phonetic").set_index("phonetic")
+        postings = trigram_pairs(entries["folded"].to_numpy())
+        self.gram_counts = postings.groupby("id").size().reindex(range(len(entries)), fill_value=0).to_numpy()
+        self.postings = postings.rename(columns={"id": "wid"})
+        self.gram_freq = postings["gram"].value_counts()
+        self.lengths = entries["folded"].str.len().to_numpy(dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _max_edits(self, lengths: np.ndarray) -> np.ndarray:
+        """Ediciones máximas para similitud >= min_similarity con un texto de largo `lengths` (el par puede ser más largo)."""
+        s = self.min_similarity
+        return np.floor((1 - s) * lengths / s + 1e-9).astype(np.int64)
+
+    def _candidates(self, pairs: pd.DataFrame, lengths: np.ndarray) -> pd.DataFrame:
+        """Pares (id, wid) que pueden quedar a distancia de edición permitida (filtro de prefijo por trigramas raros).
+
+        Cada edición elimina a lo sumo 3 trigramas distintos: a d ediciones, de cualquier subconjunto de
+        p trigramas del texto al menos p - 3d están en su par. Se buscan en el índice los 3d + 1 + PREFIX_EXTRA
+        trigramas menos frecuentes en la watchlist y se exige ese mínimo de coincidencias.
+        """
+        n = pairs.groupby("id").size()
+        ranked = pairs.assign(freq=self.gram_freq.reindex(pairs["gram"]).fillna(0).to_numpy())
+        ranked = ranked.sort_values(["id", "freq", "gram"], kind="stable")
+        ids = ranked["id"].to_numpy()
+        edits = self._max_edits(lengths)
+        probe_len = np.minimum(3 * edits + 1 + PREFIX_EXTRA, n.reindex(range(len(lengths)), fill_value=0).to_numpy())
+        probe = ranked.loc[ranked.groupby("id").cumcount().to_numpy() < probe_len[ids], ["id", "gram", "freq"]]
+        # Se procesa por tramos de nombres para acotar el tamaño de la unión con el índice
+        cost = probe.groupby("id")["freq"].sum()
+        part = pd.Series(cost.cumsum().to_numpy() // MAX_PROBE_PAIRS, index=cost.index)
+        parts = []
+        for _, chunk in probe.groupby(part.reindex(probe["id"]).to_numpy(), sort=False):
+            hits = chunk[["id", "gram"]].merge(self.postings, on="gram").groupby(["id", "wid"]).size().rename("hits").reset_index()
+            q = hits["id"].to_numpy()
+            parts.append(hits[hits["hits"].to_numpy() >= probe_len[q] - 3 * edits[q]])
+        hits = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame({"id": [], "wid": [], "hits": []}, dtype=np.int64)
+        # Filtro por largo: la diferencia de largos es una cota inferior de la distancia
+        q_len = lengths[hits["id"].to_numpy()]
+        w_len = self.lengths[hits["wid"].to_numpy()]
+        keep = np.abs(q_len - w_len) <= self._max_edits(np.minimum(q_len, w_len))
+        return hits.loc[keep, ["id", "wid"]]
+
+    def _trigram_matches(self, folded: pd.Series) -> pd.DataFrame:
+        """Mejor entrada por trigramas + distancia de edición para cada posición de `folded`."""
+        found: Dict[str, List] = {"pos": [], "wid": [], "similarity": []}
+        folded_entries = self.entries["folded"].to_numpy()
+        for start in range(0, len(folded), self.batch_size):
+            batch = folded.iloc[start:start + self.batch_size].to_numpy()
+            pairs = trigram_pairs(batch)
+            if pairs.empty:
+                continue
+            lengths = np.char.str_len(batch.astype(str)).astype(np.int64)
+            candidates = self._candidates(pairs, lengths)
+            # Verificación por distancia de edición, vectorizada por tramos de pares candidatos
+            for lo in range(0, len(candidates), MAX_VERIFY_PAIRS):
+                chunk = candidates.iloc[lo:lo + MAX_VERIFY_PAIRS]
+                qid, wid = chunk["id"].to_numpy(), chunk["wid"].to_numpy()
+                longest = np.maximum(np.maximum(lengths[qid], self.lengths[wid]), 1)
+                band = int(np.floor((1 - self.min_similarity) * longest.max() + 1e-9))
+                dist = levenshtein_pairs(batch[qid], folded_entries[wid], band)
+                similarity = 1 - dist / longest
+                keep = similarity >= self.min_similarity - 1e-9
+                found["pos"].append(start + qid[keep])
+                found["wid"].append(wid[keep])
+                found["similarity"].append(similarity[keep])
+        out = pd.DataFrame({k: np.concatenate(v) if v else np.array([]) for k, v in found.items()})
+        if out.empty:
+            return pd.DataFrame({"pos": np.array([], dtype=np.int64), "wid": np.array([], dtype=np.int64), "similarity": []})
+        out["score"] = self.entries["watchlist_score"].to_numpy()[out["wid"].to_numpy()]
+        out = out.sort_values(["pos", "similarity", "score"], ascending=[True, False, False], kind="stable")
+        return out.drop_duplicates("pos")
+
+    def match(self, names: pd.Series) -> pd.DataFrame:
+        """Mejor coincidencia aproximada de cada nombre normalizado (índice = posición en `names`)."""
+        names = pd.Series(names.to_numpy(), dtype=object)
+        result = pd.DataFrame(columns=MATCH_COLUMNS, index=pd.Index([], dtype=np.int64))
+        if names.empty or not len(self.entries):
+            return result
+        folded = fold_accents(names)
+        best: Dict[str, pd.DataFrame] = {}
+        # 1. Igualdad sin acentos
+        hit = self.by_folded.index.get_indexer(folded.to_numpy())
+        pos = np.flatnonzero(hit >= 0)
+        best["acentos"] = pd.DataFrame({"pos": pos, "watch_name": self.by_folded["watch_name"].to_numpy()[hit[pos]], "similarity": 1.0})
+        pending = np.flatnonzero(hit < 0)
+        # 2. Trigramas + distancia de edición
+        tri = self._trigram_matches(folded.iloc[pending].reset_index(drop=True))
+        tri["pos"] = pending[tri["pos"].to_numpy(dtype=np.int64)]
+        tri["watch_name"] = self.entries["watch_name"].to_numpy()[tri["wid"].to_numpy(dtype=np.int64)]
+        best["trigramas"] = tri
+        # 3. Clave fonética
+        keys = phonetic_keys(folded.iloc[pending])
+        ph = self.by_phonetic.index.get_indexer(keys.to_numpy())
+        sel = np.flatnonzero(ph >= 0)
+        best["fonetica"] = pd.DataFrame({
+            "pos": pending[sel],
+            "watch_name": self.by_phonetic["watch_name"].to_numpy()[ph[sel]],
+            "similarity": PHONETIC_SIMILARITY,
+        })
+        frames = [df.assign(method=method)[["pos", "watch_name", "similarity", "method"]] for method, df in best.items() if len(df)]
+        if not frames:
+            return result
+        matches = pd.concat(frames, ignore_index=True)
+        scores = self.entries.drop_duplicates("watch_name").set_index("watch_name")["watchlist_score"]
+        matches["watchlist_score"] = scores.reindex(matches["watch_name"]).to_numpy()
+        matches = matches.sort_values(["pos", "similarity", "watchlist_score"], ascending=[True, False, False], kind="stable")
+        matches = matches.drop_duplicates("pos").set_index("pos").sort_index()
+        matches.index.name = None
+        matches["similarity"] = matches["similarity"].astype(float).round(4)
+        matches["weighted_score"] = np.rint(matches["watchlist_score"].to_numpy(dtype=float) * matches["similarity"].to_numpy()).astype(np.int64)
+        matches.insert(0, "full_name", names.reindex(matches.index).to_numpy())
+        return matches[MATCH_COLUMNS]
@@ -1,250 +1,211 @@
 """
 Script para generar datasets con perfiles de riesgo controlados.
-Genera 3 perfiles distintos:
+Por defecto genera 3 perfiles distintos más población genérica:
 - Jan Pereira: Alto riesgo (muchos siniestros costosos, vehículos antiguos, etc.)
 - Juan José Pereira: Bajo riesgo (pocos siniestros, bajo costo, vehículos nuevos)
 - Antonio Pereira: Bajo riesgo (sin siniestros o muy pocos)
+
+Los perfiles se describen de forma declarativa (`PERFILES_POR_DEFECTO` o un JSON
+con `--profiles`): mezcla de perfiles, distribución de siniestros por asegurado
+y rangos de importe. La generación es vectorizada con NumPy, de modo que
+`--asegurados` escala la cartera a cualquier tamaño manteniendo las cohortes
+de alto y bajo riesgo; `perfiles.json` en la salida registra qué IDs pertenecen
+a cada cohorte para medir la precisión del scoring.
 """
 import os
 import sys
-import random
-from datetime import datetime, timedelta
-import pandas as pd
+import json
 import argparse
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+from generate_synthetic_data import NIF_LETTERS, PLATE_LETTERS, choice_array, id_codes, random_chars, random_dates
 
 # Configuración
 NOMBRES_GENERICOS = ["Juan", "María", "Carlos", "Ana", "Luis", "Sofía", "Miguel", "Laura"]
 APELLIDOS_GENERICOS = ["García", "González", "Rodríguez", "López", "Martínez", "Sánchez"]
+MARCAS = ["Seat", "Volkswagen", "Ford", "Toyota", "Renault"]
+ASEGURADOS_POR_DEFECTO = 1000
+
+# Cada perfil: `asegurados` (cantidad fija) o `proporcion` (parte del total de --asegurados).
+# Nombre/Apellido: texto fijo o lista (se elige al azar). Las elecciones aceptan lista
+# (equiprobable) o diccionario valor -> peso. `responsable` es la probabilidad de True.
+PERFILES_POR_DEFECTO: List[Dict[str, Any]] = [
+    {
+        "perfil": "Jan Pereira", "riesgo": "alto", "proporcion": 0.10,
+        "Nombre": "Jan", "Apellido": "Pereira", "etiqueta": "Jan Pereira (perfil alto riesgo)",
+        "anio_vehiculo": [2008, 2014],
+        "clase_poliza": ["RC"], "estado_poliza": {"VIGENTE": 1, "CANCELADA": 2},
+        "siniestros": {"probabilidad": 1.0, "por_asegurado": [5, 10], "importe": [3500, 8000],
+                       "anios": [2020, 2024], "lugares": ["Madrid", "Barcelona", "Valencia"],
+                       "responsable": 1.0, "estado": ["ABIERTA", "EN_TRAMITE"]},
+    },
+    {
+        "perfil": "Juan José Pereira", "riesgo": "bajo", "proporcion": 0.05,
+        "Nombre": "Juan José", "Apellido": "Pereira", "etiqueta": "Juan José Pereira (perfil bajo riesgo)",
+        "anio_vehiculo": [2020, 2024],
+        "clase_poliza": ["TODO_RIESGO"], "estado_poliza": ["VIGENTE"],
+        "siniestros": {"probabilidad": 0.3, "por_asegurado": [1, 1], "importe": [300, 1000],
+                       "anios": [2022, 2024], "lugares": ["Sevilla", "Málaga", "Granada"],
+                       "responsable": 0.0, "estado": ["CERRADA"]},
+    },
+    {
+        "perfil": "Antonio Pereira", "riesgo": "bajo", "proporcion": 0.05,
+        "Nombre": "Antonio", "Apellido": "Pereira", "etiqueta": "Antonio Pereira (perfil bajo riesgo)",
+        "anio_vehiculo": [2020, 2024],
+        "clase_poliza": ["TODO_RIESGO"], "estado_poliza": ["VIGENTE"],
+        "siniestros": {"probabilidad": 0.1, "por_asegurado": [1, 1], "importe": [200, 800],
+                       "anios": [2023, 2024], "lugares": ["Bilbao", "Zaragoza"],
+                       "responsable": 0.0, "estado": ["CERRADA"]},
+    },
+    {
+        "perfil": "Genéricos", "riesgo": "normal", "proporcion": 0.80,
+        "Nombre": NOMBRES_GENERICOS, "Apellido": APELLIDOS_GENERICOS,
+        "anio_vehiculo": [2015, 2023],
+        "clase_poliza": ["RC", "TODO_RIESGO", "TERCEROS_AMPLIADO"], "estado_poliza": {"VIGENTE": 2, "CANCELADA": 1},
+        "siniestros": {"probabilidad": 0.4, "por_asegurado": [1, 3], "importe": [500, 4000],
+                       "anios": [2020, 2024], "lugares": ["Madrid", "Barcelona", "Valencia", "Sevilla"],
+                       "responsable": 0.5, "estado": {"ABIERTA": 1, "EN_TRAMITE": 1, "CERRADA": 2}},
+    },
+]
+
+
+def load_profiles(path: str = None) -> List[Dict[str, Any]]:
+    """Perfiles desde un JSON (lista de perfiles o {"perfiles": [...]}) o los de por defecto."""
+    if not path:
+        return PERFILES_POR_DEFECTO
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    profiles = spec["perfiles"] if isinstance(spec, dict) else spec
+    for p in profiles:
+        if "asegurados" not in p and "proporcion" not in p:
+            raise ValueError(f"El perfil '{p.get('perfil')}' necesita 'asegurados' o 'proporcion'")
+    return profiles
+
+
+def cohort_sizes(profiles: List[Dict[str, Any]], total: int) -> List[int]:
+    """Asegurados por perfil: cantidades fijas y el resto repartido por proporción (mayor resto)."""
+    fixed = sum(int(p["asegurados"]) for p in profiles if "asegurados" in p)
+    shares = np.array([float(p.get("proporcion", 0)) if "asegurados" not in p else 0.0 for p in profiles])
+    remaining = max(total - fixed, 0)
+    sizes = np.zeros(len(profiles), dtype=np.int64)
+    if shares.sum() > 0:
+        exact = shares / shares.sum() * remaining
+        sizes = np.floor(exact).astype(np.int64)
+        order = np.argsort(-(exact - sizes), kind="stable")
+        sizes[order[:remaining - sizes.sum()]] += 1
+    return [int(p["asegurados"]) if "asegurados" in p else int(s) for p, s in zip(profiles, sizes)]
+
+
+def _weighted(rng: np.random.Generator, options: Any, n: int) -> np.ndarray:
+    """Elección vectorizada desde un valor fijo, una lista equiprobable o un dict valor -> peso."""
+    if isinstance(options, dict):
+        values = list(options)
+        weights = np.array(list(options.values()), dtype=np.float64)
+        return np.array(values, dtype=object)[rng.choice(len(values), size=n, p=weights / weights.sum())]
+    if isinstance(options, (list, tuple)):
+        return choice_array(rng, list(options), n)
+    return np.full(n, options, dtype=object)
 
-def random_date(start_year=2020, end_year=2024):
-    start = datetime(start_year, 1, 1)
-    end = datetime(end_year, 12, 31)
-    delta = end - start
-    return (start + timedelta(days=random.randint(0, delta.days))).strftime("%Y-%m-%d")
 
-def generate_nif():
-    num = random.randint(10000000, 99999999)
-    letters = "TRWAGMYFPDXBNJZSQVHLCKE"
-    return f"{num}{letters[num % 23]}"
+def generate_cohort(rng: np.random.Generator, profile: Dict[str, Any], ids: np.ndarray,
+                    first_claim_id: int) -> Tuple[Dict[str, pd.DataFrame], int]:
+    """Tablas de un perfil para los asegurados `ids`; los siniestros se numeran desde `first_claim_id`."""
+    n = len(ids)
+    nombre = _weighted(rng, profile["Nombre"], n)
+    apellido = _weighted(rng, profile["Apellido"], n)
+    etiqueta = np.full(n, profile["etiqueta"], dtype=object) if profile.get("etiqueta") \
+        else (pd.Series(nombre, dtype=object) + " " + pd.Series(apellido, dtype=object)).to_numpy()
+    nif_num = rng.integers(10_000_000, 100_000_000, size=n)
+    asegurados = pd.DataFrame({
+        "id": ids,
+        "nif": np.char.add(nif_num.astype(str), NIF_LETTERS[nif_num % 23]),
+        "nombre": etiqueta,
+        "tipo_persona": "FISICA",
+        "Nombre": nombre,
+        "Apellido": apellido,
+    })
+    lo, hi = profile["anio_vehiculo"]
+    vehiculos = pd.DataFrame({
+        "id": ids,
+        "matricula": np.char.add(rng.integers(1000, 10000, size=n).astype(str), random_chars(rng, PLATE_LETTERS, n, 3)),
+        "marca": choice_array(rng, MARCAS, n),
+        "modelo": "Modelo",
+        "anio_small": rng.integers(lo, hi + 1, size=n),
+        "Nombre": nombre,
+        "Apellido": apellido,
+    })
+    polizas = pd.DataFrame({
+        "id": ids,
+        "numero_poliza": id_codes("POL", ids),
+        "aseguradora_id": rng.integers(1, 3, size=n),
+        "clase_poliza": _weighted(rng, profile["clase_poliza"], n),
+        "estado": _weighted(rng, profile["estado_poliza"], n),
+        "Nombre": nombre,
+        "Apellido": apellido,
+    })
+
+    # Siniestros: cantidad por asegurado (0 si no tiene) y una fila por siniestro con np.repeat
+    spec = profile["siniestros"]
+    low, high = spec["por_asegurado"]
+    has_claims = rng.random(n) < float(spec["probabilidad"])
+    counts = np.where(has_claims, rng.integers(low, high + 1, size=n), 0)
+    owner = np.repeat(np.arange(n), counts)
+    m = len(owner)
+    claim_ids = np.arange(first_claim_id, first_claim_id + m)
+    owner_ids = ids[owner]
+    imp_lo, imp_hi = spec["importe"]
+    siniestros = pd.DataFrame({
+        "id": claim_ids,
+        "referencia": id_codes("SIN", claim_ids),
+        "poliza_id": owner_ids,
+        "vehiculo_id": owner_ids,
+        "asegurado_id": owner_ids,
+        "fecha_siniestro": random_dates(rng, m, *spec["anios"]),
+        "lugar": _weighted(rng, spec["lugares"], m),
+        "responsable": rng.random(m) < float(spec["responsable"]),
+        "importe_estimada": np.round(rng.uniform(imp_lo, imp_hi, size=m), 2),
+        "estado": _weighted(rng, spec["estado"], m),
+        "Nombre": nombre[owner],
+        "Apellido": apellido[owner],
+    })
+    tables = {"asegurados": asegurados, "vehiculos": vehiculos, "polizas": polizas, "siniestros": siniestros}
+    return tables, first_claim_id + m
 
-def generate_matricula():
-    return f"{random.randint(1000, 9999)}{''.join(random.choices('BCDFGHJKLMNPRSTVWXYZ', k=3))}"
 
 def main(args):
     os.makedirs(args.output, exist_ok=True)
-    
-    # === ASEGURADOS ===
-    asegurados = []
-    id_counter = 1
-    
-    # Jan Pereira - Alto riesgo (100 personas)
-    for i in range(100):
-        asegurados.append({
-            "id": id_counter,
-            "nif": generate_nif(),
-            "nombre": "Jan Pereira (perfil alto riesgo)",
-            "tipo_persona": "FISICA",
-            "Nombre": "Jan",
-            "Apellido": "Pereira"
-        })
-        id_counter += 1
-    
-    # Juan José Pereira - Bajo riesgo (50 personas)
-    for i in range(50):
-        asegurados.append({
-            "id": id_counter,
-            "nif": generate_nif(),
-            "nombre": "Juan José Pereira (perfil bajo riesgo)",
-            "tipo_persona": "FISICA",
-            "Nombre": "Juan José",
-            "Apellido": "Pereira"
-        })
-        id_counter += 1
-    
-    # Antonio Pereira - Bajo riesgo (50 personas)
-    for i in range(50):
-        asegurados.append({
-            "id": id_counter,
-            "nif": generate_nif(),
-            "nombre": "Antonio Pereira (perfil bajo riesgo)",
-            "tipo_persona": "FISICA",
-            "Nombre": "Antonio",
-            "Apellido": "Pereira"
-        })
-        id_counter += 1
-    
-    # Resto genéricos (800 personas)
-    for i in range(800):
-        nombre = random.choice(NOMBRES_GENERICOS)
-        apellido = random.choice(APELLIDOS_GENERICOS)
-        asegurados.append({
-            "id": id_counter,
-            "nif": generate_nif(),
-            "nombre": f"{nombre} {apellido}",
-            "tipo_persona": "FISICA",
-            "Nombre": nombre,
-            "Apellido": apellido
-        })
-        id_counter += 1
-    
-    df_aseg = pd.DataFrame(asegurados)
-    df_aseg.to_csv(os.path.join(args.output, "asegurados.csv"), index=False)
-    print(f"✓ asegurados.csv: {len(df_aseg)} registros")
-    
-    # === VEHÍCULOS ===
-    vehiculos = []
-    for aseg in asegurados:
-        id_aseg = aseg["id"]
-        nombre = aseg["Nombre"]
-        apellido = aseg["Apellido"]
-        
-        # Jan Pereira: vehículos antiguos
-        if nombre == "Jan" and apellido == "Pereira":
-            anio = random.randint(2008, 2014)
-        # Juan José y Antonio: vehículos nuevos
-        elif (nombre in ["Juan José", "Antonio"]) and apellido == "Pereira":
-            anio = random.randint(2020, 2024)
-        else:
-            anio = random.randint(2015, 2023)
-        
-        vehiculos.append({
-            "id": id_aseg,
-            "matricula": generate_matricula(),
-            "marca": random.choice(["Seat", "Volkswagen", "Ford", "Toyota", "Renault"]),
-            "modelo": "Modelo",
-            "anio_small": anio,
-            "Nombre": nombre,
-            "Apellido": apellido
-        })
-    
-    df_veh = pd.DataFrame(vehiculos)
-    df_veh.to_csv(os.path.join(args.output, "vehiculos.csv"), index=False)
-    print(f"✓ vehiculos.csv: {len(df_veh)} registros")
-    
-    # === PÓLIZAS ===
-    polizas = []
-    for aseg in asegurados:
-        id_aseg = aseg["id"]
-        nombre = aseg["Nombre"]
-        apellido = aseg["Apellido"]
-        
-        # Jan Pereira: más pólizas RC y canceladas
-        if nombre == "Jan" and apellido == "Pereira":
-            clase = "RC"
-            estado = random.choice(["VIGENTE", "CANCELADA", "CANCELADA"])
-        # Juan José y Antonio: TODO_RIESGO vigentes
-        elif (nombre in ["Juan José", "Antonio"]) and apellido == "Pereira":
-            clase = "TODO_RIESGO"
-            estado = "VIGENTE"
-        else:
-            clase = random.choice(["RC", "TODO_RIESGO", "TERCEROS_AMPLIADO"])
-            estado = random.choice(["VIGENTE", "VIGENTE", "CANCELADA"])
-        
-        polizas.append({
-            "id": id_aseg,
-            "numero_poliza": f"POL{str(id_aseg).zfill(6)}",
-            "aseguradora_id": random.randint(1, 2),
-            "clase_poliza": clase,
-            "estado": estado,
-            "Nombre": nombre,
-            "Apellido": apellido
+    profiles = load_profiles(args.profiles)
+    sizes = cohort_sizes(profiles, args.asegurados)
+    rng = np.random.default_rng(args.seed)
+
+    parts: Dict[str, List[pd.DataFrame]] = {"asegurados": [], "vehiculos": [], "polizas": [], "siniestros": []}
+    cohorts = []
+    next_id, next_claim = 1, 1
+    for profile, size in zip(profiles, sizes):
+        ids = np.arange(next_id, next_id + size)
+        tables, claim_end = generate_cohort(rng, profile, ids, next_claim)
+        for name, table in tables.items():
+            parts[name].append(table)
+        cohorts.append({
+            "perfil": profile["perfil"],
+            "riesgo": profile.get("riesgo", "normal"),
+            "Nombre": profile["Nombre"],
+            "Apellido": profile["Apellido"],
+            "id_inicio": int(next_id),
+            "id_fin": int(next_id + size - 1),
+            "asegurados": int(size),
+            "siniestros": int(claim_end - next_claim),
         })
-    
-    df_pol = pd.DataFrame(polizas)
-    df_pol.to_csv(os.path.join(args.output, "polizas.csv"), index=False)
-    print(f"✓ polizas.csv: {len(df_pol)} registros")
-    
-    # === SINIESTROS ===
-    siniestros = []
-    sin_id = 1
-    
-    for aseg in asegurados:
-        id_aseg = aseg["id"]
-        nombre = aseg["Nombre"]
-        apellido = aseg["Apellido"]
-        
-        # Jan Pereira: muchos siniestros costosos
-        if nombre == "Jan" and apellido == "Pereira":
-            num_siniestros = random.randint(5, 10)
-            for _ in range(num_siniestros):
-                siniestros.append({
-                    "id": sin_id,
-                    "referencia": f"SIN{str(sin_id).zfill(6)}",
-                    "poliza_id": id_aseg,
-                    "vehiculo_id": id_aseg,
-                    "asegurado_id": id_aseg,
-                    "fecha_siniestro": random_date(2020, 2024),
-                    "lugar": random.choice(["Madrid", "Barcelona", "Valencia"]),
-                    "responsable": True,
-                    "importe_estimada": round(random.uniform(3500, 8000), 2),
-                    "estado": random.choice(["ABIERTA", "EN_TRAMITE"]),
-                    "Nombre": nombre,
-                    "Apellido": apellido
-                })
-                sin_id += 1
-        
-        # Juan José Pereira: pocos siniestros de bajo costo
-        elif nombre == "Juan José" and apellido == "Pereira":
-            if random.random() < 0.3:  # Solo 30% tienen siniestros
-                siniestros.append({
-                    "id": sin_id,
-                    "referencia": f"SIN{str(sin_id).zfill(6)}",
-                    "poliza_id": id_aseg,
-                    "vehiculo_id": id_aseg,
-                    "asegurado_id": id_aseg,
-                    "fecha_siniestro": random_date(2022, 2024),
-                    "lugar": random.choice(["Sevilla", "Málaga", "Granada"]),
-                    "responsable": False,
-                    "importe_estimada": round(random.uniform(300, 1000), 2),
-                    "estado": "CERRADA",
-                    "Nombre": nombre,
-                    "Apellido": apellido
-                })
-                sin_id += 1
-        
-        # Antonio Pereira: casi sin siniestros
-        elif nombre == "Antonio" and apellido == "Pereira":
-            if random.random() < 0.1:  # Solo 10% tienen siniestros
-                siniestros.append({
-                    "id": sin_id,
-                    "referencia": f"SIN{str(sin_id).zfill(6)}",
-                    "poliza_id": id_aseg,
-                    "vehiculo_id": id_aseg,
-                    "asegurado_id": id_aseg,
-                    "fecha_siniestro": random_date(2023, 2024),
-                    "lugar": random.choice(["Bilbao", "Zaragoza"]),
-                    "responsable": False,
-                    "importe_estimada": round(random.uniform(200, 800), 2),
-                    "estado": "CERRADA",
-                    "Nombre": nombre,
-                    "Apellido": apellido
-                })
-                sin_id += 1
-        
-        # Genéricos: distribución normal
-        else:
-            if random.random() < 0.4:  # 40% tienen siniestros
-                for _ in range(random.randint(1, 3)):
-                    siniestros.append({
-                        "id": sin_id,
-                        "referencia": f"SIN{str(sin_id).zfill(6)}",
-                        "poliza_id": id_aseg,
-                        "vehiculo_id": id_aseg,
-                        "asegurado_id": id_aseg,
-                        "fecha_siniestro": random_date(2020, 2024),
-                        "lugar": random.choice(["Madrid", "Barcelona", "Valencia", "Sevilla"]),
-                        "responsable": random.choice([True, False]),
-                        "importe_estimada": round(random.uniform(500, 4000), 2),
-                        "estado": random.choice(["ABIERTA", "EN_TRAMITE", "CERRADA", "CERRADA"]),
-                        "Nombre": nombre,
-                        "Apellido": apellido
-                    })
-                    sin_id += 1
-    
-    df_sin = pd.DataFrame(siniestros)
-    df_sin.to_csv(os.path.join(args.output, "siniestros.csv"), index=False)
-    print(f"✓ siniestros.csv: {len(df_sin)} registros")
-    
+        next_id += size
+        next_claim = claim_end
+
+    for name in ["asegurados", "vehiculos", "polizas", "siniestros"]:
+        df = pd.concat(parts[name], ignore_index=True)
+        df.to_csv(os.path.join(args.output, f"{name}.csv"), index=False)
+        print(f"✓ {name}.csv: {len(df)} registros")
+
     # === OTROS DATASETS ===
     df_aseguradoras = pd.DataFrame([
         {"id": 1, "codigo": "MAPFRE", "nombre": "Mapfre Seguros"},
@@ -252,20 +213,27 @@ def main(args):
     ])
     df_aseguradoras.to_csv(os.path.join(args.output, "aseguradoras.csv"), index=False)
     print(f"✓ aseguradoras.csv: 2 registros")
-    
+
+    # Verdad de referencia de las cohortes (JSON: el scoring solo lee CSV)
+    with open(os.path.join(args.output, "perfiles.json"), "w", encoding="utf-8") as f:
+        json.dump({"seed": args.seed, "asegurados": int(next_id - 1), "perfiles": cohorts}, f,
+                  ensure_ascii=False, indent=2)
+
     print(f"\n=== RESUMEN ===")
-    print(f"Total asegurados: {len(asegurados)}")
-    print(f"  - Jan Pereira (alto riesgo): 100")
-    print(f"  - Juan José Pereira (bajo riesgo): 50")
-    print(f"  - Antonio Pereira (bajo riesgo): 50")
-    print(f"  - Genéricos: 800")
-    print(f"Total siniestros: {len(siniestros)}")
-    print(f"  - Jan Pereira: {len([s for s in siniestros if s['Nombre'] == 'Jan'])}")
-    print(f"  - Juan José Pereira: {len([s for s in siniestros if s['Nombre'] == 'Juan José'])}")
-    print(f"  - Antonio Pereira: {len([s for s in siniestros if s['Nombre'] == 'Antonio' and s['Apellido'] == 'Pereira'])}")
+    print(f"Total asegurados: {next_id - 1}")
+    for c in cohorts:
+        print(f"  - {c['perfil']} ({c['riesgo']} riesgo): {c['asegurados']}")
+    print(f"Total siniestros: {next_claim - 1}")
+    for c in cohorts:
+        print(f"  - {c['perfil']}: {c['siniestros']}")
+    print(f"Cohortes guardadas en {os.path.join(args.output, 'perfiles.json')}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--output", default="dataset_final", help="Directorio de salida")
+    parser.add_argument("--profiles", help="JSON con la especificación de perfiles (por defecto, los 4 perfiles incluidos)")
+    parser.add_argument("--asegurados", type=int, default=ASEGURADOS_POR_DEFECTO,
+                        help="Total de asegurados; los perfiles con 'proporcion' escalan con este valor")
+    parser.add_argument("--seed", type=int, help="Semilla para resultados reproducibles")
     args = parser.parse_args()
     main(args)
@@ -1,9 +1,12 @@
 import os
 import sys
+import time
 import random
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import List
+from typing import Any, Dict, List, Tuple
+import numpy as np
 import pandas as pd
 
 # Configuración para generar datos sintéticos
@@ -161,11 +164,226 @@ def generate_base_carvertical(n: int = 300) -> pd.DataFrame:
     return pd.DataFrame(data)
 
 
+# --- Generación vectorizada por shards ---
+# Cada tabla se genera columna a columna con NumPy en bloques de ids contiguos (shards). La semilla de
+# cada shard se deriva de (semilla, tabla, shard): el resultado no depende del número de workers.
+# Asegurados, vehículos, pólizas y contratos comparten id (contrato i = póliza i, asegurado i,
+# vehículo i); cada siniestro elige un contrato, por lo que sus tres claves siempre existen y son coherentes.
+
+VECTOR_TABLES = ["asegurados", "vehiculos", "polizas", "contrato_poliza", "siniestros", "base_carvertical_ficticia"]
+DEFAULT_SHARD_ROWS = 1_000_000
+DEFAULT_CSV_CHUNK_ROWS = 200_000
+DEFAULT_SEED = 42
+NIF_LETTERS = np.array(list("TRWAGMYFPDXBNJZSQVHLCKE"))
+PLATE_LETTERS = np.array(list("BCDFGHJKLMNPRSTVWXYZ"))
+VIN_CHARS = np.array(list("ABCDEFGHJKLMNPRSTUVWXYZ0123456789"))
+TIPOS_INCIDENTE = ["Impacto frontal", "Daño menor", "Accidente grave", "Daño por granizo", None]
+GRAVEDADES = ["Leve", "Media", "Grave", None]
+PARTES = ["Capó", "Puertas", "Laterales", "Motor", "Parachoques", None]
+PAISES = ["España", "Alemania", "Francia", "Japón", "Italia"]
+COLORES = ["Blanco", "Negro", "Gris", "Azul", "Rojo"]
+OBSERVACIONES = ["Sin defectos", "Fugas leves de aceite", "Frenos OK", "Luces dañadas"]
+
+
+def choice_array(rng: np.random.Generator, values: List[Any], n: int, p: List[float] = None) -> np.ndarray:
+    """`n` valores de `values`, uniformes o con probabilidades `p`."""
+    idx = rng.integers(0, len(values), size=n) if p is None else rng.choice(len(values), size=n, p=p)
+    return np.array(values, dtype=object)[idx]
+
+
+def random_chars(rng: np.random.Generator, alphabet: np.ndarray, n: int, k: int) -> np.ndarray:
+    """`n` cadenas de `k` caracteres de `alphabet` (una sola vista sobre una matriz de caracteres)."""
+    chars = alphabet[rng.integers(0, len(alphabet), size=(n, k))].astype("U1")
+    return chars.view(f"U{k}").ravel()
+
+
+def id_codes(prefix: str, ids: np.ndarray, width: int = 6) -> np.ndarray:
+    return np.char.add(prefix, np.char.zfill(ids.astype(str), width))
+
+
+def random_dates(rng: np.random.Generator, n: int, start_year: int, end_year: int) -> np.ndarray:
+    start = np.datetime64(f"{start_year}-01-01")
+    days = (np.datetime64(f"{end_year}-12-31") - start).astype(int)
+    return (start + rng.integers(0, days + 1, size=n)).astype(str)
+
+
+def vector_asegurados(rng: np.random.Generator, ids: np.ndarray) -> pd.DataFrame:
+    n = len(ids)
+    nif_num = rng.integers(10_000_000, 100_000_000, size=n)
+    nombre = (pd.Series(choice_array(rng, NOMBRES, n)) + " " + pd.Series(choice_array(rng, APELLIDOS, n))
+              + " " + pd.Series(choice_array(rng, APELLIDOS, n)))
+    return pd.DataFrame({
+        "id": ids,
+        "nif": np.char.add(nif_num.astype(str), NIF_LETTERS[nif_num % 23]),
+        "nombre": nombre.to_numpy(dtype=object),
+        "tipo_persona": "FISICA",
+    })
+
+
+def vector_vehiculos(rng: np.random.Generator, ids: np.ndarray) -> pd.DataFrame:
+    n = len(ids)
+    marca_idx = rng.integers(0, len(MARCAS), size=n)
+    # Modelo condicionado a la marca: matriz marca x modelo rellenada con el último modelo válido
+    options = [MODELOS.get(m, ["Modelo"]) for m in MARCAS]
+    width = max(len(o) for o in options)
+    table = np.array([o + [o[-1]] * (width - len(o)) for o in options], dtype=object)
+    counts = np.array([len(o) for o in options])
+    modelo_idx = (rng.random(n) * counts[marca_idx]).astype(np.int64)
+    return pd.DataFrame({
+        "id": ids,
+        "matricula": np.char.add(rng.integers(1000, 10000, size=n).astype(str), random_chars(rng, PLATE_LETTERS, n, 3)),
+        "marca": np.array(MARCAS, dtype=object)[marca_idx],
+        "modelo": table[marca_idx, modelo_idx],
+        "anio_small": rng.integers(2010, 2025, size=n),
+    })
+
+
+def vector_polizas(rng: np.random.Generator, ids: np.ndarray) -> pd.DataFrame:
+    n = len(ids)
+    return pd.DataFrame({
+        "id": ids,
+        "numero_poliza": id_codes("POL", ids),
+        "aseguradora_id": rng.integers(1, 3, size=n),
+        "clase_poliza": choice_array(rng, CLASES_POLIZA, n),
+        "estado": choice_array(rng, ESTADOS_POLIZA, n),
+    })
+
+
+def vector_contrato_poliza(rng: np.random.Generator, ids: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({"id": ids, "poliza_id": ids, "asegurado_id": ids, "vehiculo_id": ids, "rol": "TITULAR"})
+
+
+def vector_siniestros(rng: np.random.Generator, ids: np.ndarray, contratos: int) -> pd.DataFrame:
+    n = len(ids)
+    contrato = rng.integers(1, contratos + 1, size=n)
+    return pd.DataFrame({
+        "id": ids,
+        "referencia": id_codes("SIN", ids),
+        "poliza_id": contrato,
+        "vehiculo_id": contrato,
+        "asegurado_id": contrato,
+        "fecha_siniestro": random_dates(rng, n, 2020, 2024),
+        "lugar": choice_array(rng, LUGARES, n),
+        "responsable": rng.random(n) < 0.5,
+        "importe_estimada": np.round(rng.uniform(300, 5000, size=n), 2),
+        "estado": choice_array(rng, ESTADOS_SINIESTRO, n),
+    })
+
+
+def vector_carvertical(rng: np.random.Generator, ids: np.ndarray) -> pd.DataFrame:
+    n = len(ids)
+    dano = rng.random(n) < 0.6
+
+    def when_damaged(values: np.ndarray) -> np.ndarray:
+        values = values.astype(object)
+        values[~dano] = None
+        return values
+
+    return pd.DataFrame({
+        "vin": random_chars(rng, VIN_CHARS, n, 17),
+        "marca": choice_array(rng, MARCAS, n),
+        "modelo": choice_array(rng, ["Modelo1", "Modelo2", "Modelo3"], n),
+        "año": rng.integers(2010, 2025, size=n),
+        "país_origen": choice_array(rng, PAISES, n),
+        "color": choice_array(rng, COLORES, n),
+        "fecha_ultimo_dano": when_damaged(random_dates(rng, n, 2015, 2024)),
+        "tipo_incidente": when_damaged(choice_array(rng, TIPOS_INCIDENTE, n)),
+        "coste_estimado": np.where(dano, np.round(rng.uniform(500, 15000, size=n), 2), np.nan),
+        "gravedad": when_damaged(choice_array(rng, GRAVEDADES, n)),
+        "partes_afectadas": when_damaged(choice_array(rng, PARTES, n)),
+        "lectura_km": rng.integers(5000, 200001, size=n),
+        "fecha_ultimo_itv": random_dates(rng, n, 2020, 2024),
+        "resultado_itv": choice_array(rng, ["Favorable", "Desfavorable"], n),
+        "observaciones": choice_array(rng, OBSERVACIONES, n),
+    })
+
+
+def generate_shard(task: Dict[str, Any]) -> Tuple[str, int, int, float]:
+    """Genera y escribe un shard; devuelve (tabla, shard, filas, segundos)."""
+    start = time.perf_counter()
+    table, shard = task["table"], task["shard"]
+    rng = np.random.default_rng([task["seed"], VECTOR_TABLES.index(table), shard])
+    ids = np.arange(task["start"], task["end"], dtype=np.int64)
+    if table == "siniestros":
+        df = vector_siniestros(rng, ids, task["contratos"])
+    else:
+        df = {
+            "asegurados": vector_asegurados,
+            "vehiculos": vector_vehiculos,
+            "polizas": vector_polizas,
+            "contrato_poliza": vector_contrato_poliza,
+            "base_carvertical_ficticia": vector_carvertical,
+        }[table](rng, ids)
+    path = task["path"]
+    if task["format"] == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, chunksize=task["csv_chunk_rows"])
+    return table, shard, len(df), time.perf_counter() - start
+
+
+def shard_tasks(output_dir: str, counts: Dict[str, int], shard_rows: int, fmt: str, seed: int,
+                csv_chunk_rows: int = DEFAULT_CSV_CHUNK_ROWS) -> List[Dict[str, Any]]:
+    """Tareas por tabla y rango de ids. Una tabla de un solo shard se escribe como `<tabla>.<ext>`;
+    con varios shards, como `<tabla>/part-00000.<ext>`."""
+    tasks = []
+    for table in VECTOR_TABLES:
+        total = counts[table]
+        n_shards = max((total + shard_rows - 1) // shard_rows, 1)
+        if n_shards > 1:
+            os.makedirs(os.path.join(output_dir, table), exist_ok=True)
+        for shard in range(n_shards):
+            start = shard * shard_rows + 1
+            end = min(start + shard_rows, total + 1)
+            if n_shards > 1:
+                path = os.path.join(output_dir, table, f"part-{shard:05d}.{fmt}")
+            else:
+                path = os.path.join(output_dir, f"{table}.{fmt}")
+            tasks.append({"table": table, "shard": shard, "start": start, "end": end, "path": path,
+                          "format": fmt, "seed": seed, "contratos": counts["contrato_poliza"],
+                          "csv_chunk_rows": csv_chunk_rows})
+    return tasks
+
+
+def generate_vectorized(output_dir: str, asegurados: int, siniestros: int, carvertical: int = 300,
+                        shard_rows: int = DEFAULT_SHARD_ROWS, fmt: str = "csv", workers: int = 1,
+                        seed: int = DEFAULT_SEED) -> Dict[str, int]:
+    """Genera todas las tablas por shards (en paralelo con `workers` procesos). Devuelve filas por tabla."""
+    os.makedirs(output_dir, exist_ok=True)
+    df_aseg = pd.DataFrame([
+        {"id": 1, "codigo": "MAPFRE", "nombre": "Mapfre Seguros"},
+        {"id": 2, "codigo": "ALLIANZ", "nombre": "Allianz España"}
+    ])
+    if fmt == "parquet":
+        df_aseg.to_parquet(os.path.join(output_dir, "aseguradoras.parquet"), index=False)
+    else:
+        df_aseg.to_csv(os.path.join(output_dir, "aseguradoras.csv"), index=False)
+    counts = {"asegurados": asegurados, "vehiculos": asegurados, "polizas": asegurados,
+              "contrato_poliza": asegurados, "siniestros": siniestros, "base_carvertical_ficticia": carvertical}
+    tasks = shard_tasks(output_dir, counts, shard_rows, fmt, seed)
+    rows = {"aseguradoras": len(df_aseg)}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(generate_shard, tasks))
+    else:
+        done = [generate_shard(t) for t in tasks]
+    for table, shard, n, seconds in done:
+        rows[table] = rows.get(table, 0) + n
+        print(f"✓ {table} shard {shard}: {n} filas ({seconds:.2f} s)")
+    return rows
+
+
 def parse_args(argv: List[str]) -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Genera datasets sintéticos para pruebas")
     p.add_argument("--output-dir", default="dataset_synthetic", help="Directorio de salida")
     p.add_argument("--asegurados", type=int, default=500, help="Número de asegurados")
     p.add_argument("--siniestros", type=int, default=800, help="Número de siniestros")
+    p.add_argument("--vectorized", action="store_true", help="Generación vectorizada por shards (alto volumen)")
+    p.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Formato de salida del modo vectorizado")
+    p.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS, help="Filas por shard en el modo vectorizado")
+    p.add_argument("--workers", type=int, default=1, help="Procesos que generan shards en paralelo")
+    p.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Semilla del modo vectorizado")
+    p.add_argument("--carvertical", type=int, default=300, help="Filas de base_carvertical_ficticia")
     return p.parse_args(argv)
 
 
@@ -173,7 +391,16 @@ def main(argv: List[str]) -> int:
     args = parse_args(argv)
     
     os.makedirs(args.output_dir, exist_ok=True)
-    
+
+    if args.vectorized:
+        print(f"Generando datasets sintéticos (vectorizado, {args.workers} workers)...")
+        start = time.perf_counter()
+        rows = generate_vectorized(args.output_dir, args.asegurados, args.siniestros, args.carvertical,
+                                   args.shard_rows, args.format, args.workers, args.seed)
+        print(f"\nDatasets sintéticos generados en: {args.output_dir} ({sum(rows.values())} filas, "
+              f"{time.perf_counter() - start:.1f} s)")
+        return 0
+
     print("Generando datasets sintéticos...")
     
     # Aseguradoras (fijo pequeño)
@@ -210,7 +437,7 @@ def main(argv: List[str]) -> int:
     print(f"✓ siniestros.csv: {len(df_sin)} filas")
     
     # Base carvertical
-    df_car = generate_base_carvertical(300)
+    df_car = generate_base_carvertical(args.carvertical)
     df_car.to_csv(os.path.join(args.output_dir, "base_carvertical_ficticia.csv"), index=False)
     print(f"✓ base_carvertical_ficticia.csv: {len(df_car)} filas")
     
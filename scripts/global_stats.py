@@ -0,0 +1,110 @@
+"""
+Estado global de las reglas de conjunto (`duplicate`, `high_cardinality`).
+
+Conteos exactos por valor de cada columna usada por esas funciones. Permite
+evaluarlas sobre un subconjunto de filas (bloques, shards, filas nuevas) con el
+resultado que tendrían sobre el dataset completo, y combinar conteos parciales.
+
+`windows` guarda, si se calcularon sobre el frame completo, los valores por
+fila de las reglas de ventana (`window_count`/`window_sum`) para evaluarlas
+por shards; los conteos por valor no bastan para ellas.
+"""
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from rule_compiler import Duplicate, HighCardinality, Node
+
+NULL_KEY = "\x00null"
+
+
+def key_strings(series: pd.Series) -> pd.Series:
+    """Clave textual estable por valor (numéricos como float para que 5 y 5.0 coincidan)."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        out = pd.to_numeric(series, errors="coerce").astype("float64").astype(str)
+    elif series.dtype == object:
+        # Columnas mixtas: los números también como float (5 y 5.0 son la misma clave, como en `duplicated`)
+        out = series.map(lambda v: str(float(v)) if isinstance(v, (int, float, np.number)) else str(v))
+    else:
+        out = series.astype(str)
+    out = out.astype(object)
+    out[series.isna().to_numpy()] = NULL_KEY
+    return out
+
+
+def global_columns(rules: List[Dict[str, Any]]) -> Tuple[Set[str], Set[str]]:
+    """Columnas de `duplicate()` y `high_cardinality()` usadas por las reglas."""
+    dup: Set[str] = set()
+    hc: Set[str] = set()
+
+    def walk(node: Node) -> None:
+        if isinstance(node, Duplicate):
+            dup.add(node.column)
+        elif isinstance(node, HighCardinality):
+            hc.add(node.column)
+        for child in getattr(node, "children", ()):
+            walk(child)
+
+    for rule in rules:
+        if rule.get("plan") is not None:
+            walk(rule["plan"])
+    return dup, hc
+
+
+class GlobalStats:
+    """Conteos exactos por valor para las columnas con reglas globales."""
+
+    def __init__(self, counts: Dict[str, Dict[str, int]], total_rows: int, windows: Dict[str, Any] = None):
+        self.counts = counts
+        self.total_rows = total_rows
+        # Valores por fila de cada ventana (clave `Window.window_key()`), alineados con el frame completo
+        self.windows = windows or {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns: Set[str]) -> "GlobalStats":
+        counts = {}
+        for col in columns:
+            counts[col] = key_strings(df[col]).value_counts().to_dict() if col in df.columns else {}
+        return cls(counts, len(df))
+
+    def duplicate_mask(self, col: str, series: pd.Series) -> pd.Series:
+        if col not in self.counts:
+            return series.duplicated(keep=False)
+        return key_strings(series).map(self.counts[col]).fillna(0).astype(int) >= 2
+
+    def high_cardinality(self, col: str) -> bool:
+        counts = self.counts.get(col, {})
+        nunique = len(counts) - (1 if NULL_KEY in counts else 0)
+        total = self.total_rows
+        if total == 0:
+            return False
+        return (nunique / total) > 0.95 and total > 100
+
+    @classmethod
+    def merge(cls, parts: Iterable["GlobalStats"]) -> "GlobalStats":
+        """Reducción de conteos parciales (p.ej. calculados por shard)."""
+        parts = list(parts)
+        counts: Dict[str, Dict[str, int]] = {}
+        for col in set().union(*(p.counts for p in parts)) if parts else ():
+            series = [pd.Series(p.counts[col], dtype="int64") for p in parts if p.counts.get(col)]
+            counts[col] = pd.concat(series).groupby(level=0).sum().to_dict() if series else {}
+        return cls(counts, sum(p.total_rows for p in parts))
+
+    def update(self, col: str, removed: pd.Series, added: pd.Series) -> Set[str]:
+        """Aplica altas/bajas de claves y devuelve las claves cuyo estado de duplicado cambió."""
+        counts = self.counts.setdefault(col, {})
+        before = {}
+        for key, n in removed.value_counts().items():
+            before.setdefault(key, counts.get(key, 0))
+            counts[key] = counts.get(key, 0) - int(n)
+        for key, n in added.value_counts().items():
+            before.setdefault(key, counts.get(key, 0))
+            counts[key] = counts.get(key, 0) + int(n)
+        flipped = set()
+        for key, prev in before.items():
+            if (prev >= 2) != (counts[key] >= 2):
+                flipped.add(key)
+            if counts[key] <= 0:
+                del counts[key]
+        return flipped
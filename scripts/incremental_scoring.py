@@ -0,0 +1,442 @@
+"""
+Re-scoring incremental: solo se leen y vuelven a puntuar las filas nuevas o modificadas.
+
+Entre ejecuciones se persiste en `--state-dir`:
+- `rows.parquet`: por fila (ruta del archivo + posición) su hash sobre las columnas
+  que usan las reglas, score, nombre normalizado, activación de cada regla y las
+  claves de las columnas globales.
+- `names.parquet`: score agregado por nombre.
+- `state.json`: huella de reglas+watchlist, conteos de activación, conteos de
+  valores por clave para `duplicate(col)` / `high_cardinality(col)` y, por
+  archivo, tamaño, mtime, sha256 y número de filas.
+
+Lectura (`scan_dataset`): un archivo con el mismo tamaño y mtime (o el mismo
+sha256) no se lee; un CSV que solo creció y cuyos bytes anteriores coinciden con
+el sha256 guardado se lee desde donde terminaba, es decir, solo las filas
+añadidas; el resto se lee entero y sus filas se comparan por hash con las
+guardadas.
+
+Después se actualizan los conteos globales y se re-puntúan las filas
+nuevas/modificadas más las existentes cuya condición de duplicado cambió (si su
+archivo no se había leído, se lee entonces). Si cambian las reglas o la
+watchlist se recalcula todo.
+
+Las filas se identifican por (archivo, posición dentro del archivo), no por un
+id: el modo está pensado para archivos a los que se añaden filas al final.
+Insertar o borrar una fila en medio de un archivo desplaza las posiciones
+siguientes, y todas esas filas cuentan como modificadas y se re-puntúan (el
+resultado sigue siendo correcto, solo se pierde el ahorro).
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+from functools import partial
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import HASH_CHUNK_BYTES, DatasetCache, file_fingerprint
+from dataset_files import is_parquet, list_data_files
+from risk_scoring import (
+    NAME_COLUMNS_CANDIDATES,
+    bucket_score,
+    compute_scores,
+    is_name_column,
+    load_watchlist,
+    name_totals,
+    normalize_name,
+    parse_rules,
+    project_columns,
+    read_csv_header,
+    read_projected_csv,
+    read_source_csv,
+    read_typed_csv,
+    rule_columns,
+)
+from global_stats import NULL_KEY, GlobalStats, global_columns, key_strings
+from schema_registry import SchemaRegistry
+
+STATE_FILE = "state.json"
+ROWS_FILE = "rows.parquet"
+NAMES_FILE = "names.parquet"
+STATE_VERSION = 2
+IDENTITY_COLUMNS = ["__source_file", "__path", "__row"]
+
+
+def rules_fingerprint(rules: List[Dict[str, Any]], watchlist: Dict[str, Any]) -> str:
+    payload = json.dumps({
+        "version": STATE_VERSION,
+        "rules": [[r["expr"], r["score"]] for r in rules],
+        "watchlist": sorted((k, v.get("score", 0) if isinstance(v, dict) else v) for k, v in watchlist.items()),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def tracked_columns(rules: List[Dict[str, Any]]) -> List[str]:
+    """Columnas del hash de fila: las de las reglas y las de nombre."""
+    names = {c for pair in NAME_COLUMNS_CANDIDATES for c in pair}
+    return sorted(rule_columns(rules) | names)
+
+
+def row_identity(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """Identidad (archivo, ruta, posición) y hash de contenido de cada fila.
+
+    Una columna ausente del frame cuenta como nula: el hash de una fila no depende
+    de qué otros archivos se hayan leído en la misma ejecución.
+    """
+    ident = df[IDENTITY_COLUMNS].reset_index(drop=True)
+    null = np.full(len(df), NULL_KEY, dtype=object)
+    keyed = pd.DataFrame({c: key_strings(df[c]).to_numpy() if c in df.columns else null for c in columns})
+    ident["__hash"] = pd.util.hash_pandas_object(keyed, index=False).to_numpy() if columns else np.uint64(0)
+    return ident
+
+
+def with_identity(df: pd.DataFrame, source: str, path: str, start: int = 0) -> pd.DataFrame:
+    """Añade archivo fuente, ruta relativa y posición (desde `start`) a las filas leídas de un archivo."""
+    df["__source_file"] = source
+    df["__path"] = path
+    df["__row"] = np.arange(start, start + len(df), dtype=np.int64)
+    return df
+
+
+def file_digest(path: str, prefix_size: int = None) -> Tuple[str, str]:
+    """sha256 del archivo y, en la misma pasada, de sus primeros `prefix_size` bytes.
+
+    El del prefijo es None si no termina en salto de línea (no es un corte entre filas).
+    """
+    h = hashlib.sha256()
+    prefix = None
+    remaining = prefix_size or 0
+    last = b""
+    with open(path, "rb") as f:
+        while remaining > 0:
+            chunk = f.read(min(HASH_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            h.update(chunk)
+            remaining -= len(chunk)
+            last = chunk[-1:]
+        if prefix_size and remaining == 0 and last == b"\n":
+            prefix = h.hexdigest()
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            h.update(chunk)
+    return h.hexdigest(), prefix
+
+
+def read_csv_tail(path: str, offset: int, usecols: List[str] = None, dtype: Dict[str, str] = None) -> pd.DataFrame:
+    """Filas de un CSV a partir del byte `offset` (inicio de una fila), con la cabecera del archivo."""
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(offset)
+        data = header + f.read()
+    try:
+        return pd.read_csv(io.BytesIO(data), encoding="utf-8", low_memory=True, on_bad_lines='skip', usecols=usecols, dtype=dtype)
+    except Exception:
+        return pd.read_csv(io.BytesIO(data), encoding="ISO-8859-1", low_memory=True, on_bad_lines='skip', usecols=usecols, dtype=dtype)
+
+
+def read_data_file(path: str, columns: Set[str], cache: DatasetCache = None,
+                   schema: SchemaRegistry = None) -> pd.DataFrame:
+    """Archivo completo con las columnas de `columns` y las de nombre, como en `load_unified`."""
+    if cache is not None:
+        reader = partial(read_typed_csv, schema=schema) if schema else read_source_csv
+        df = cache.read(path, reader, variant=schema.cache_variant("risk_scoring"))
+    else:
+        df = read_projected_csv(path, frozenset(columns), schema)
+    return df[[c for c in df.columns if c in columns or is_name_column(c)]]
+
+
+def scan_dataset(dataset_dir: str, columns: Set[str], previous: Dict[str, Dict[str, Any]],
+                 cache: DatasetCache = None, schema: SchemaRegistry = None) -> Dict[str, Any]:
+    """Lee del dataset solo lo que cambió respecto a `previous` (ruta relativa -> huella de la ejecución anterior).
+
+    Devuelve `rows` (filas leídas, con `__source_file`, `__path` y `__row`), `rescanned` (rutas cuyas filas
+    guardadas se comparan con las leídas: releídas enteras o desaparecidas), `files` (huellas nuevas) y
+    `sources` (ruta relativa -> (nombre de la fuente, ruta)).
+    """
+    listed = list_data_files(dataset_dir)
+    if not listed:
+        raise SystemExit("No se encontraron CSVs válidos en dataset.")
+    sources = {os.path.relpath(path, dataset_dir): (name, path) for name, path in listed}
+    rescanned = set(previous) - set(sources)
+    frames = []
+    files: Dict[str, Dict[str, Any]] = {}
+    for rel, (name, path) in sources.items():
+        fp = file_fingerprint(path)
+        prev = previous.get(rel)
+        if prev is not None and fp["size"] == prev["size"] and fp["mtime_ns"] == prev["mtime_ns"]:
+            files[rel] = prev
+            continue
+        appended = prev is not None and not is_parquet(path) and fp["size"] > prev["size"]
+        sha256, prefix = file_digest(path, prev["size"] if appended else None)
+        if prev is not None and sha256 == prev["sha256"]:
+            files[rel] = dict(prev, **fp)
+            continue
+        try:
+            if appended and prefix == prev["sha256"]:
+                usecols = project_columns(read_csv_header(path), columns)
+                read = partial(read_csv_tail, offset=prev["size"])
+                df = schema.read(read, path, usecols=usecols) if schema else read(path, usecols=usecols)
+                start = prev["rows"]
+            else:
+                df = read_data_file(path, columns, cache, schema)
+                start = 0
+                rescanned.add(rel)
+        except Exception as e:
+            # Sin huella: se vuelve a leer entero en la próxima ejecución
+            print(f"Advertencia: no se pudo leer {rel}: {e}")
+            rescanned.add(rel)
+            continue
+        frames.append(with_identity(df, name, rel, start))
+        files[rel] = dict(fp, sha256=sha256, rows=start + len(df))
+    if frames:
+        rows = pd.concat(frames, ignore_index=True, sort=False)
+    else:
+        rows = pd.DataFrame({"__source_file": pd.Series(dtype=object), "__path": pd.Series(dtype=object),
+                             "__row": pd.Series(dtype=np.int64)})
+    return {"rows": rows, "rescanned": rescanned, "files": files, "sources": sources}
+
+
+def read_state(state_dir: str) -> Dict[str, Any]:
+    state_path = os.path.join(state_dir, STATE_FILE)
+    if not os.path.isfile(state_path):
+        return None
+    with open(state_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_state(state_dir: str) -> Tuple[Dict[str, Any], pd.DataFrame, pd.DataFrame]:
+    state = read_state(state_dir)
+    if state is None:
+        return None, None, None
+    rows = pd.read_parquet(os.path.join(state_dir, ROWS_FILE))
+    names = pd.read_parquet(os.path.join(state_dir, NAMES_FILE))
+    return state, rows, names
+
+
+def save_state(state_dir: str, state: Dict[str, Any], rows: pd.DataFrame, names: pd.DataFrame) -> None:
+    os.makedirs(state_dir, exist_ok=True)
+    rows.to_parquet(os.path.join(state_dir, ROWS_FILE), index=False)
+    names.to_parquet(os.path.join(state_dir, NAMES_FILE), index=False)
+    tmp_path = os.path.join(state_dir, STATE_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, os.path.join(state_dir, STATE_FILE))
+
+
+def _score_rows(df: pd.DataFrame, rules: List[Dict[str, Any]], watchlist: Dict[str, Any],
+                stats: GlobalStats, global_cols: Set[str]) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """Puntúa `df` con el estado global dado; devuelve las columnas persistidas por fila y las reglas ignoradas.
+
+    Las reglas ignoradas (p.ej. ventanas temporales, que necesitan el dataset completo) quedan sin activar.
+    """
+    res = compute_scores(df, rules, watchlist, global_stats=stats, return_masks=True, explain=False)
+    row_scores = res["row_scores"]
+    out = pd.DataFrame(index=df.index)
+    out["__risk_score"] = row_scores["__risk_score"].astype("int64")
+    out["__full_name"] = row_scores["__full_name"] if "__full_name" in row_scores.columns else ""
+    out["__watchlist"] = res["watchlist_scores"].astype("int64")
+    for i, mask in enumerate(res["rule_masks"]):
+        out[f"__r{i}"] = mask.fillna(False).astype(bool) if mask is not None else False
+    for col in sorted(global_cols):
+        out[f"__k_{col}"] = key_strings(df[col]) if col in df.columns else NULL_KEY
+    return out, res["ignored"]
+
+
+def _rule_counts(rows: pd.DataFrame, n_rules: int) -> List[int]:
+    return [int(rows[f"__r{i}"].sum()) for i in range(n_rules)]
+
+
+def incremental_scores(df: pd.DataFrame, rules: List[Dict[str, Any]], watchlist: Dict[str, Any],
+                       state_dir: str, force_full: bool = False) -> Dict[str, Any]:
+    """Re-scoring incremental de un frame ya cargado con todas las filas del dataset (`load_unified`)."""
+    df = df.reset_index(drop=True)
+    df = df.assign(**{"__path": df["__source_file"], "__row": df.groupby("__source_file", sort=False).cumcount()})
+    return _apply_changes(df, rules, watchlist, state_dir, force_full)
+
+
+def incremental_dataset(dataset_dir: str, rules: List[Dict[str, Any]], watchlist: Dict[str, Any], state_dir: str,
+                        force_full: bool = False, cache: DatasetCache = None,
+                        schema: SchemaRegistry = None) -> Dict[str, Any]:
+    """Re-scoring incremental leyendo del dataset solo lo que cambió desde la ejecución anterior (`scan_dataset`)."""
+    if schema is None:
+        schema = SchemaRegistry.for_dataset(dataset_dir)
+    columns = rule_columns(rules)
+    state = read_state(state_dir)
+    full = force_full or state is None or state.get("fingerprint") != rules_fingerprint(rules, watchlist)
+    scan = scan_dataset(dataset_dir, columns, {} if full else state.get("files", {}), cache, schema)
+
+    def load_path(rel: str) -> pd.DataFrame:
+        name, path = scan["sources"][rel]
+        return with_identity(read_data_file(path, columns, cache, schema), name, rel)
+
+    return _apply_changes(scan["rows"], rules, watchlist, state_dir, full, scan["rescanned"], load_path, scan["files"])
+
+
+def _apply_changes(read: pd.DataFrame, rules: List[Dict[str, Any]], watchlist: Dict[str, Any], state_dir: str,
+                   force_full: bool, rescanned: Set[str] = None, load_path: Callable[[str], pd.DataFrame] = None,
+                   files: Dict[str, Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Aplica al estado guardado las filas leídas (`read`).
+
+    Las filas guardadas de las rutas de `rescanned` (todas si es None) se comparan con las leídas; las de
+    otras rutas siguen sin cambios y `read` solo trae filas añadidas al final. `load_path(ruta)` lee un
+    archivo completo cuando hay que re-puntuar filas suyas que no se leyeron.
+    """
+    read = read.reset_index(drop=True)
+    dup_cols, hc_cols = global_columns(rules)
+    global_cols = dup_cols | hc_cols
+    columns = tracked_columns(rules)
+    ident = row_identity(read, columns)
+    fingerprint = rules_fingerprint(rules, watchlist)
+    state, old_rows, names = load_state(state_dir)
+
+    if force_full or state is None or state.get("fingerprint") != fingerprint:
+        stats = GlobalStats.from_frame(read, global_cols)
+        scored, ignored = _score_rows(read, rules, watchlist, stats, global_cols)
+        rows = pd.concat([ident, scored], axis=1)
+        names = name_totals(rows)
+        summary = {"mode": "full", "read": len(read), "new": len(rows), "modified": 0, "deleted": 0, "rescored": len(rows)}
+        rule_counts = _rule_counts(rows, len(rules))
+        watchlist_count = int((rows["__watchlist"] > 0).sum())
+    else:
+        stats = GlobalStats(state["counts"], state["total_rows"])
+        in_scope = old_rows["__path"].isin(rescanned).to_numpy() if rescanned is not None else np.ones(len(old_rows), dtype=bool)
+        merged = ident.reset_index().merge(
+            old_rows[in_scope].reset_index()[["index", "__path", "__row", "__hash"]],
+            on=["__path", "__row"], how="outer", suffixes=("", "_old"), indicator=True,
+        )
+        is_new = merged["_merge"] == "left_only"
+        is_deleted = merged["_merge"] == "right_only"
+        is_modified = (merged["_merge"] == "both") & (merged["__hash"] != merged["__hash_old"])
+        new_pos = merged.loc[is_new, "index"].astype(int).to_numpy()
+        mod_pos = merged.loc[is_modified, "index"].astype(int).to_numpy()
+        mod_old = merged.loc[is_modified, "index_old"].astype(int).to_numpy()
+        del_old = merged.loc[is_deleted, "index_old"].astype(int).to_numpy()
+        # Filas sin cambios: las comparadas con el mismo hash y las guardadas de archivos no releídos (sin posición leída)
+        unchanged = pd.concat([
+            merged.loc[(merged["_merge"] == "both") & ~is_modified, ["index", "index_old"]].astype(int),
+            pd.DataFrame({"index": -1, "index_old": np.flatnonzero(~in_scope)}),
+        ], ignore_index=True)
+
+        # Actualizar conteos globales con las bajas (modificadas + eliminadas) y altas (nuevas + modificadas)
+        stats.total_rows = int(state["total_rows"]) - len(del_old) + len(new_pos)
+        removed_old = np.concatenate([mod_old, del_old])
+        changed_pos = np.concatenate([new_pos, mod_pos])
+        affected = np.zeros(len(unchanged), dtype=bool)
+        hc_before = {c: state["high_cardinality"].get(c, False) for c in hc_cols}
+        for col in dup_cols | hc_cols:
+            removed = old_rows[f"__k_{col}"].iloc[removed_old]
+            added = key_strings(read[col].iloc[changed_pos]) if col in read.columns else pd.Series([NULL_KEY] * len(changed_pos))
+            flipped = stats.update(col, removed, added)
+            if flipped and col in dup_cols and len(unchanged):
+                keys_unchanged = old_rows[f"__k_{col}"].iloc[unchanged["index_old"].to_numpy()]
+                affected |= keys_unchanged.isin(flipped).to_numpy()
+        # Un cambio en high_cardinality afecta a todas las filas
+        if any(stats.high_cardinality(c) != hc_before[c] for c in hc_cols):
+            affected[:] = True
+
+        kept_rows = old_rows.iloc[unchanged.loc[~affected, "index_old"].to_numpy()]
+        redo = unchanged[affected]
+        # A re-puntuar: nuevas, modificadas y afectadas; las afectadas que no se leyeron se leen ahora
+        read_pos = np.concatenate([changed_pos, redo.loc[redo["index"] >= 0, "index"].to_numpy()])
+        parts, idents = [read.iloc[read_pos]], [ident.iloc[read_pos]]
+        unread = old_rows.iloc[redo.loc[redo["index"] < 0, "index_old"].to_numpy()]
+        for rel, group in unread.groupby("__path", sort=True):
+            loaded = load_path(rel).iloc[group["__row"].to_numpy()]
+            parts.append(loaded)
+            idents.append(row_identity(loaded, columns))
+        to_score = pd.concat(parts, ignore_index=True, sort=False)
+        if len(to_score):
+            scored, ignored = _score_rows(to_score, rules, watchlist, stats, global_cols)
+            scored = pd.concat([pd.concat(idents, ignore_index=True), scored], axis=1)
+        else:
+            # Sin filas que puntuar: las reglas ignoradas son las de la ejecución anterior
+            scored, ignored = old_rows.iloc[0:0], state.get("ignored", [])
+        previous = old_rows.iloc[np.concatenate([removed_old, redo["index_old"].to_numpy()])]
+        rows = pd.concat([kept_rows, scored], ignore_index=True)
+
+        # Deltas por nombre y por regla: se resta lo anterior y se suma lo re-puntuado
+        delta = pd.concat([
+            previous.groupby("__full_name")["__risk_score"].sum() * -1,
+            scored.groupby("__full_name")["__risk_score"].sum(),
+        ]).groupby(level=0).sum()
+        delta = delta[delta.index != ""]
+        totals = names.set_index("full_name")["risk_score"].add(delta, fill_value=0)
+        names = totals[totals.index.isin(set(rows["__full_name"]))].astype("int64").rename("risk_score").rename_axis("full_name").reset_index()
+        rule_counts = [
+            int(state["rule_counts"][i]) - int(previous[f"__r{i}"].sum()) + int(scored[f"__r{i}"].sum())
+            for i in range(len(rules))
+        ]
+        watchlist_count = int(state["watchlist_count"]) - int((previous["__watchlist"] > 0).sum()) + int((scored["__watchlist"] > 0).sum())
+        summary = {"mode": "incremental", "read": len(read), "new": len(new_pos), "modified": len(mod_pos),
+                   "deleted": len(del_old), "rescored": len(to_score)}
+
+    rows = rows.sort_values(["__path", "__row"], kind="stable").reset_index(drop=True)
+    names["risk_level"] = names["risk_score"].apply(bucket_score)
+    new_state = {
+        "fingerprint": fingerprint,
+        "total_rows": len(rows),
+        "counts": stats.counts,
+        "high_cardinality": {c: stats.high_cardinality(c) for c in hc_cols},
+        "rule_counts": rule_counts,
+        "watchlist_count": watchlist_count,
+        "ignored": ignored,
+        "files": files or {},
+    }
+    save_state(state_dir, new_state, rows, names[["full_name", "risk_score"]])
+    activations = [
+        {"expr": r["expr"], "score": r["score"], "count": n}
+        for r, n in zip(rules, rule_counts) if n > 0
+    ]
+    if watchlist_count > 0:
+        activations.append({"expr": "watchlist_match", "score": "variable", "count": watchlist_count})
+    return {"rows": rows, "name_scores": names, "activations": activations, "ignored": ignored, "summary": summary}
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Scoring incremental: re-puntúa solo filas nuevas o modificadas")
+    p.add_argument("--dataset-dir", default="dataset", help="Directorio de CSVs")
+    p.add_argument("--rules", default="rules_engine.md", help="Archivo markdown de reglas")
+    p.add_argument("--watchlist", default=None, help="Archivo CSV watchlist (full_name, watchlist_score, reason)")
+    p.add_argument("--state-dir", default=".cache/incremental", help="Directorio del estado persistido entre ejecuciones")
+    p.add_argument("--cache-dir", default=None, help="Directorio de caché Parquet de los CSV")
+    p.add_argument("--full", action="store_true", help="Fuerza un recálculo completo")
+    p.add_argument("--query-name", default=None, help="Nombre completo a consultar (opcional)")
+    return p.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    rules = parse_rules(args.rules)
+    for r in rules:
+        if r.get("error"):
+            print(f"[ERROR DE SINTAXIS] {r['expr']} -> {r['error']}")
+    watchlist = load_watchlist(args.watchlist) if args.watchlist else {}
+    cache = DatasetCache(args.cache_dir) if args.cache_dir else None
+    result = incremental_dataset(args.dataset_dir, rules, watchlist, args.state_dir, args.full, cache)
+
+    s = result["summary"]
+    print(f"Modo: {s['mode']} | filas leídas: {s['read']} | nuevas: {s['new']} | modificadas: {s['modified']} | eliminadas: {s['deleted']} | re-puntuadas: {s['rescored']}")
+    for ir in result["ignored"]:
+        print(f"[IGNORADA] {ir['expr']} -> {ir['error']}")
+    print("Activaciones:")
+    for act in result["activations"]:
+        print(f" - {act['expr']} (+{act['score']}) count={act['count']}")
+    if args.query_name:
+        names = result["name_scores"]
+        match = names[names["full_name"] == normalize_name(args.query_name)]
+        if match.empty:
+            print("No")
+        else:
+            print(f"Nombre: {args.query_name}")
+            print(f"Score Total: {int(match.iloc[0]['risk_score']):,}")
+            print(f"Nivel de Riesgo: {match.iloc[0]['risk_level']}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,132 @@
+"""
+Índice persistente de nombres para consultas sin reescanear el dataset.
+
+Por cada nombre normalizado guarda su score agregado, nivel, registros con
+score > 0, desglose por archivo de origen y las posiciones de sus filas en el
+frame puntuado. Las posiciones se almacenan concatenadas y ordenadas por
+nombre (desplazamiento + longitud por nombre), de modo que una consulta es un
+acceso a diccionario más un corte del arreglo. Con el almacén de activaciones
+(`activation_store.py`) esas posiciones dan las reglas activadas por nombre.
+
+En disco el índice es un directorio con `names.parquet`, `positions.npy`,
+`activations.npz` (si hay almacén) y `meta.json`; este último incluye la huella de reglas, watchlist y CSV con la
+que se construyó para detectar si quedó desactualizado.
+"""
+import json
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from activation_store import ActivationStore
+
+NAMES_FILE = "names.parquet"
+POSITIONS_FILE = "positions.npy"
+META_FILE = "meta.json"
+SOURCE_PREFIX = "src::"
+
+
+class NameIndex:
+    def __init__(self, names: pd.DataFrame, positions: np.ndarray, activations: List[Dict[str, Any]],
+                 fingerprint: str = None, store: ActivationStore = None):
+        self.names = names.reset_index(drop=True)
+        self.positions = positions
+        self.activations = activations
+        self.store = store
+        self.fingerprint = fingerprint
+        self.sources = [c[len(SOURCE_PREFIX):] for c in self.names.columns if c.startswith(SOURCE_PREFIX)]
+        self._slot = dict(zip(self.names["full_name"].tolist(), range(len(self.names))))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def lookup(self, norm_name: str) -> Dict[str, Any]:
+        """Entrada del índice para un nombre ya normalizado, o None si no existe."""
+        slot = self._slot.get(norm_name)
+        if slot is None:
+            return None
+        row = self.names.iloc[slot]
+        start, length = int(row["offset"]), int(row["length"])
+        counts = [(src, int(row[SOURCE_PREFIX + src])) for src in self.sources]
+        # Mismo orden que value_counts(): por conteo descendente, empates en orden de aparición
+        counts = sorted((c for c in counts if c[1] > 0), key=lambda c: -c[1])
+        return {
+            "full_name": norm_name,
+            "risk_score": int(row["risk_score"]),
+            "risk_level": row["risk_level"],
+            "records_count": int(row["records_count"]),
+            "records_breakdown": dict(counts),
+            "positions": self.positions[start:start + length],
+        }
+
+    def save(self, index_dir: str) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+        self.names.to_parquet(os.path.join(index_dir, NAMES_FILE), index=False)
+        np.save(os.path.join(index_dir, POSITIONS_FILE), self.positions)
+        if self.store is not None:
+            self.store.save(index_dir)
+        meta = {"fingerprint": self.fingerprint, "activations": self.activations, "names": len(self.names)}
+        tmp_path = os.path.join(index_dir, META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+        # meta.json se escribe al final: sin él el índice se considera inexistente
+        os.replace(tmp_path, os.path.join(index_dir, META_FILE))
+
+    @classmethod
+    def load(cls, index_dir: str, fingerprint: str = None) -> "NameIndex":
+        """Carga el índice; devuelve None si no existe o si su huella no coincide con `fingerprint`."""
+        meta_path = os.path.join(index_dir, META_FILE)
+        if not os.path.isfile(meta_path):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+                return None
+            names = pd.read_parquet(os.path.join(index_dir, NAMES_FILE))
+            positions = np.load(os.path.join(index_dir, POSITIONS_FILE))
+            store = ActivationStore.load(index_dir)
+        except (OSError, ValueError):
+            return None
+        return cls(names, positions, meta.get("activations", []), meta.get("fingerprint"), store)
+
+
+def build_name_index(result: Dict[str, Any], fingerprint: str = None) -> NameIndex:
+    """Construye el índice a partir del resultado de `compute_scores` (sin recorrer filas en Python)."""
+    row_scores = result["row_scores"]
+    activations = [{"expr": a["expr"], "score": a["score"]} for a in result["activations"]]
+    if "__full_name" not in row_scores.columns:
+        names = result["name_scores"][["full_name", "risk_score", "risk_level"]].copy()
+        names["records_count"] = 0
+        names["offset"] = 0
+        names["length"] = 0
+        return NameIndex(names, np.array([], dtype=np.int64), activations, fingerprint, result.get("activation_store"))
+
+    full_names = row_scores["__full_name"].to_numpy()
+    codes, uniques = pd.factorize(full_names, sort=True)
+    n = len(uniques)
+    scores = row_scores["__risk_score"].to_numpy()
+    # Posiciones agrupadas por nombre: orden estable por código => filas en orden original dentro de cada nombre
+    order = np.argsort(codes, kind="stable").astype(np.int64)
+    lengths = np.bincount(codes, minlength=n)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    names = pd.DataFrame({
+        "full_name": uniques,
+        "offset": offsets.astype(np.int64),
+        "length": lengths.astype(np.int64),
+        "records_count": np.bincount(codes, weights=(scores > 0), minlength=n).astype(np.int64),
+    })
+    if "__source_file" in row_scores.columns:
+        src_codes, src_uniques = pd.factorize(row_scores["__source_file"].to_numpy())
+        valid = src_codes >= 0
+        matrix = np.bincount(codes[valid] * len(src_uniques) + src_codes[valid],
+                             minlength=n * len(src_uniques)).reshape(n, len(src_uniques))
+        for j, src in enumerate(src_uniques):
+            names[SOURCE_PREFIX + str(src)] = matrix[:, j].astype(np.int64)
+    # Score y nivel agregados: los mismos de name_scores (nombres vacíos no figuran allí)
+    agg = result["name_scores"].set_index("full_name")
+    names = names[names["full_name"].isin(agg.index)].reset_index(drop=True)
+    names.insert(1, "risk_score", agg.loc[names["full_name"], "risk_score"].astype(np.int64).to_numpy())
+    names.insert(2, "risk_level", agg.loc[names["full_name"], "risk_level"].to_numpy())
+    return NameIndex(names, order, activations, fingerprint, result.get("activation_store"))
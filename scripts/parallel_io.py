@@ -0,0 +1,67 @@
+"""
+Lectura paralela de múltiples CSV.
+
+Cada archivo se lee (y decodifica) en un pool de hilos o de procesos. El
+resultado conserva el orden de entrada, de modo que `__source_file` queda en
+orden estable, e incluye el tiempo de lectura por archivo. La caché de datos,
+si se usa, se consulta y actualiza en el proceso principal; los workers solo
+leen Parquet vigente o parsean el CSV.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Optional
+
+import pandas as pd
+
+from dataset_cache import DatasetCache
+
+
+class FileResult(NamedTuple):
+    path: str
+    df: Optional[pd.DataFrame]
+    seconds: float
+    error: Optional[str]
+    from_cache: bool
+
+
+def _timed_read(reader: Callable[[str], pd.DataFrame], path: str):
+    start = time.perf_counter()
+    try:
+        df = reader(path)
+        return df, time.perf_counter() - start, None
+    except Exception as e:  # noqa: BLE001
+        return None, time.perf_counter() - start, str(e)
+
+
+def read_files(paths: List[str], reader: Callable[[str], pd.DataFrame], workers: int = 1,
+               use_processes: bool = False, cache: DatasetCache = None, variant: str = "default") -> List[FileResult]:
+    """Lee `paths` con `reader` (función de nivel de módulo si se usan procesos)."""
+    cached = {p: cache.cached_file(p, variant) for p in paths} if cache is not None else {}
+    tasks = [(pd.read_parquet, cached[p]) if cached.get(p) else (reader, p) for p in paths]
+    if workers <= 1 or len(paths) <= 1:
+        outcomes = [_timed_read(fn, arg) for fn, arg in tasks]
+    else:
+        pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with pool_cls(max_workers=min(workers, len(paths))) as pool:
+            futures = [pool.submit(_timed_read, fn, arg) for fn, arg in tasks]
+            outcomes = [f.result() for f in futures]
+    results = []
+    for path, (df, seconds, error) in zip(paths, outcomes):
+        from_cache = bool(cached.get(path))
+        if cache is not None and error is None:
+            if from_cache:
+                cache.hits.append(os.path.basename(path))
+            else:
+                cache.store(path, df, variant)
+        results.append(FileResult(path, df, seconds, error, from_cache))
+    return results
+
+
+def format_timings(results: List[FileResult]) -> List[str]:
+    lines = []
+    for r in results:
+        origin = "caché" if r.from_cache else "csv"
+        status = f"error: {r.error}" if r.error else f"{len(r.df)} filas"
+        lines.append(f"  - {os.path.basename(r.path)}: {r.seconds * 1000:.1f} ms ({origin}, {status})")
+    return lines
@@ -0,0 +1,202 @@
+"""
+Ranking Top-K de nombres y registros por score, con filtros y paginación.
+
+Orden: score descendente y, en empates, nombre ascendente (nombres) o
+posición en el frame (registros). La selección es parcial: `np.partition`
+halla el umbral del k-ésimo score en O(n) y solo se ordenan los k elegidos
+(más los empatados en el umbral), sin ordenar millones de filas.
+
+El cursor de página es el último elemento devuelto (score y nombre o
+posición) codificado en base64: la página siguiente empieza justo después de
+él, así que no se repiten ni se saltan elementos aunque haya empates.
+
+Filtros: nivel de riesgo, archivo de origen y aseguradora (`aseguradora_id`).
+En el ranking de nombres, origen y aseguradora seleccionan los nombres con al
+menos un registro que cumpla el filtro; el score sigue siendo el total del
+nombre.
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from name_index import SOURCE_PREFIX
+
+DEFAULT_TOP_K = 100
+INSURER_COLUMN = "aseguradora_id"
+
+
+def encode_cursor(by: str, score: int, key: Any, rank: int) -> str:
+    payload = json.dumps({"by": by, "score": int(score), "key": key, "rank": int(rank)}, ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, by: str) -> Dict[str, Any]:
+    """Cursor de `encode_cursor`; ValueError si está mal formado o es de otro tipo de ranking."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        data["score"], data["rank"] = int(data["score"]), int(data["rank"])
+    except (ValueError, TypeError, KeyError, UnicodeError) as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+    if data.get("by") != by:
+        raise ValueError(f"El cursor es de un ranking de {data.get('by')}, no de {by}")
+    return data
+
+
+def _keys(tie_keys: Any, idx: np.ndarray) -> np.ndarray:
+    """Claves de desempate de `idx`; una Series de texto solo se convierte en ese subconjunto."""
+    if isinstance(tie_keys, pd.Series):
+        return tie_keys.take(idx).to_numpy(dtype=object)
+    return tie_keys[idx]
+
+
+def top_k_positions(scores: np.ndarray, tie_keys: Any, k: int, eligible: np.ndarray = None,
+                    after: Tuple[int, Any] = None) -> Tuple[np.ndarray, int]:
+    """Posiciones de los k mayores scores (empates por `tie_keys` ascendente) y cuántos elegibles quedan.
+
+    `tie_keys` es un arreglo o Series alineado con `scores` (posiciones, nombres).
+    `after=(score, clave)` descarta lo que va antes de ese punto del orden (incluido él mismo).
+    """
+    mask = np.ones(len(scores), dtype=bool) if eligible is None else eligible.copy()
+    if after is not None:
+        score, key = after
+        later = scores < score
+        same = np.flatnonzero(scores == score)
+        later[same[_keys(tie_keys, same) > key]] = True
+        mask &= later
+    idx = np.flatnonzero(mask)
+    remaining = len(idx)
+    if remaining > k:
+        s = scores[idx]
+        threshold = np.partition(s, remaining - k)[remaining - k]
+        above = idx[s > threshold]
+        ties = idx[s == threshold]
+        ties = ties[np.argsort(_keys(tie_keys, ties), kind="stable")][:k - len(above)]
+        idx = np.concatenate([above, ties])
+    # Orden final solo de los k elegidos: clave ascendente y luego score descendente (ambos estables)
+    idx = idx[np.argsort(_keys(tie_keys, idx), kind="stable")]
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    return idx, remaining
+
+
+def _level_mask(levels: pd.Series, wanted: List[str]) -> np.ndarray:
+    wanted = {str(w).strip().casefold() for w in wanted}
+    return levels.astype(str).str.casefold().isin(wanted).to_numpy()
+
+
+def _insurer_mask(values: pd.Series, wanted: List[str]) -> np.ndarray:
+    """Coincidencia por valor numérico (1 == 1.0) y, si no es numérico, por texto."""
+    numeric = pd.to_numeric(pd.Series(list(wanted)), errors="coerce")
+    mask = values.astype(str).isin([str(w) for w in wanted]).to_numpy()
+    if numeric.notna().any():
+        mask = mask | pd.to_numeric(values, errors="coerce").isin(numeric.dropna()).to_numpy()
+    return mask
+
+
+def row_filter(result: Dict[str, Any], levels: List[str] = None, sources: List[str] = None,
+               insurers: List[str] = None, insurer_column: str = INSURER_COLUMN) -> Optional[np.ndarray]:
+    """Máscara de filas de `result["row_scores"]` que cumplen los filtros (None si no hay filtros)."""
+    rows = result["row_scores"]
+    mask = None
+    if levels:
+        mask = _level_mask(rows["__risk_level"], levels)
+    if sources:
+        if "__source_file" not in rows.columns:
+            raise ValueError("El resultado no tiene archivo de origen por fila")
+        m = rows["__source_file"].isin(sources).to_numpy()
+        mask = m if mask is None else mask & m
+    if insurers:
+        frame = result.get("frame")
+        if frame is None or insurer_column not in frame.columns:
+            raise ValueError(f"El dataset cargado no tiene la columna {insurer_column}")
+        m = _insurer_mask(frame[insurer_column], insurers)
+        mask = m if mask is None else mask & m
+    return mask
+
+
+def _page(by: str, remaining: int, first_rank: int, items: List[Dict[str, Any]], last_key: Any) -> Dict[str, Any]:
+    """Página de resultados; `remaining` son los elegibles desde el cursor (incluida esta página)."""
+    next_cursor = None
+    if remaining > len(items) and items:
+        next_cursor = encode_cursor(by, items[-1]["risk_score"], last_key, first_rank + len(items) - 1)
+    return {"by": by, "items": items, "remaining": int(remaining), "next_cursor": next_cursor}
+
+
+def _items(frame: pd.DataFrame, positions: np.ndarray, first_rank: int, columns: Dict[str, str],
+           with_pos: bool = False) -> List[Dict[str, Any]]:
+    """Elementos de la página (campo de salida <- columna de `frame`, si existe), con su rango."""
+    fields = {"rank": range(first_rank, first_rank + len(positions))}
+    if with_pos:
+        fields["pos"] = positions.tolist()
+    for field, col in columns.items():
+        if col in frame.columns:
+            fields[field] = frame[col].take(positions).tolist()
+    return [dict(zip(fields, values)) for values in zip(*fields.values())]
+
+
+def _name_frame(result: Dict[str, Any] = None, index: Any = None) -> pd.DataFrame:
+    if index is not None:
+        return index.names
+    return result["name_scores"]
+
+
+def top_names(result: Dict[str, Any] = None, k: int = DEFAULT_TOP_K, levels: List[str] = None,
+              sources: List[str] = None, insurers: List[str] = None, cursor: str = None,
+              index: Any = None, insurer_column: str = INSURER_COLUMN) -> Dict[str, Any]:
+    """Top-K de nombres por score total, desde el resultado de `compute_scores` o un `NameIndex`.
+
+    Con índice (sin `result`) se filtra por nivel y por origen; el filtro por aseguradora necesita las filas.
+    """
+    names = _name_frame(result, index)
+    scores = names["risk_score"].to_numpy(dtype=np.int64)
+    eligible = _level_mask(names["risk_level"], levels) if levels else None
+    if sources or insurers:
+        if result is None:
+            if insurers:
+                raise ValueError("El filtro por aseguradora necesita puntuar el dataset (no basta el índice)")
+            cols = [SOURCE_PREFIX + s for s in sources if SOURCE_PREFIX + s in names.columns]
+            m = (names[cols].to_numpy() > 0).any(axis=1) if cols else np.zeros(len(names), dtype=bool)
+        else:
+            row_scores = result["row_scores"]
+            rows = row_filter(result, sources=sources, insurers=insurers, insurer_column=insurer_column)
+            matched = row_scores["__full_name"][rows].unique() if "__full_name" in row_scores.columns else []
+            m = names["full_name"].isin(matched).to_numpy()
+        eligible = m if eligible is None else eligible & m
+
+    after, first_rank = None, 1
+    if cursor:
+        c = decode_cursor(cursor, "names")
+        after, first_rank = (c["score"], str(c["key"])), c["rank"] + 1
+    positions, remaining = top_k_positions(scores, names["full_name"], k, eligible, after)
+    columns = {"full_name": "full_name", "risk_score": "risk_score", "risk_level": "risk_level",
+               "records_count": "records_count"}
+    items = _items(names, positions, first_rank, columns)
+    return _page("names", remaining, first_rank, items, items[-1]["full_name"] if items else None)
+
+
+def top_rows(result: Dict[str, Any], k: int = DEFAULT_TOP_K, levels: List[str] = None, sources: List[str] = None,
+             insurers: List[str] = None, cursor: str = None, insurer_column: str = INSURER_COLUMN) -> Dict[str, Any]:
+    """Top-K de registros por score (posición en el frame puntuado para desempatar y paginar).
+
+    Cada elemento trae `pos` (posición en el frame unificado) y, si hay archivo de origen, `row`
+    (fila dentro de ese archivo, desde 0, como `/record?source=&row=` del servicio).
+    """
+    rows = result["row_scores"]
+    scores = rows["__risk_score"].to_numpy(dtype=np.int64)
+    tie_keys = np.arange(len(rows))
+    eligible = row_filter(result, levels, sources, insurers, insurer_column)
+    after, first_rank = None, 1
+    if cursor:
+        c = decode_cursor(cursor, "rows")
+        after, first_rank = (c["score"], int(c["key"])), c["rank"] + 1
+    positions, remaining = top_k_positions(scores, tie_keys, k, eligible, after)
+    columns = {"risk_score": "__risk_score", "risk_level": "__risk_level", "source_file": "__source_file",
+               "full_name": "__full_name"}
+    items = _items(rows, positions, first_rank, columns, with_pos=True)
+    if "__source_file" in rows.columns and items:
+        in_file = rows.groupby("__source_file", sort=False, observed=True).cumcount().to_numpy()[positions]
+        for item, row in zip(items, in_file.tolist()):
+            item["row"] = row
+    return _page("rows", remaining, first_rank, items, items[-1]["pos"] if items else None)
@@ -0,0 +1,131 @@
+"""
+Modelo relacional del dataset para scoring sin unión dispersa de todos los CSV.
+
+Cada tabla se carga por separado y las relaciones entre entidades se resuelven
+con índices de unión: para cada fila de la tabla base se guarda la posición de
+la fila relacionada en la tabla destino (-1 si no existe). Los índices se
+componen a lo largo del camino de claves foráneas y solo se materializan las
+columnas que referencian las reglas.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BASE_TABLE = "siniestros"
+
+# (tabla_origen, columna_origen, tabla_destino, columna_destino)
+RELATIONS: List[Tuple[str, str, str, str]] = [
+    ("siniestros", "poliza_id", "polizas", "id"),
+    ("siniestros", "vehiculo_id", "vehiculos", "id"),
+    ("siniestros", "asegurado_id", "asegurados", "id"),
+    ("siniestros", "poliza_id", "contrato_poliza", "poliza_id"),
+    ("contrato_poliza", "poliza_id", "polizas", "id"),
+    ("contrato_poliza", "vehiculo_id", "vehiculos", "id"),
+    ("contrato_poliza", "asegurado_id", "asegurados", "id"),
+    ("polizas", "aseguradora_id", "aseguradoras", "id"),
+]
+
+Edge = Tuple[str, str, str, str]
+
+
+def build_join_index(source_keys: pd.Series, target_keys: pd.Series) -> np.ndarray:
+    """Posición en destino de cada clave de origen (primera coincidencia, -1 si no hay)."""
+    if pd.api.types.is_numeric_dtype(source_keys) or pd.api.types.is_numeric_dtype(target_keys):
+        source_keys = pd.to_numeric(source_keys, errors="coerce")
+        target_keys = pd.to_numeric(target_keys, errors="coerce")
+    valid = (target_keys.notna() & ~target_keys.duplicated(keep="first")).to_numpy()
+    positions = np.flatnonzero(valid)
+    if len(positions) == 0:
+        return np.full(len(source_keys), -1, dtype=np.int64)
+    found = pd.Index(target_keys.to_numpy()[valid]).get_indexer(source_keys.to_numpy())
+    return np.where(found >= 0, positions[np.maximum(found, 0)], -1)
+
+
+class RelationalDataset:
+    def __init__(self, tables: Dict[str, pd.DataFrame], base: str = DEFAULT_BASE_TABLE, relations: List[Edge] = None):
+        if base not in tables:
+            raise ValueError(f"Tabla base no encontrada: {base}")
+        self.tables = tables
+        self.base = base
+        self.relations = [r for r in (relations or RELATIONS) if r[0] in tables and r[2] in tables]
+        self._edge_index: Dict[Edge, np.ndarray] = {}
+        self._paths = self._shortest_paths()
+        self._positions: Dict[str, np.ndarray] = {}
+
+    def _shortest_paths(self) -> Dict[str, List[Edge]]:
+        paths: Dict[str, List[Edge]] = {self.base: []}
+        queue = deque([self.base])
+        while queue:
+            table = queue.popleft()
+            for edge in self.relations:
+                if edge[0] == table and edge[2] not in paths:
+                    paths[edge[2]] = paths[table] + [edge]
+                    queue.append(edge[2])
+        return paths
+
+    def reachable_tables(self) -> List[str]:
+        return list(self._paths)
+
+    def join_index(self, edge: Edge) -> np.ndarray:
+        if edge not in self._edge_index:
+            src, src_col, dst, dst_col = edge
+            src_df, dst_df = self.tables[src], self.tables[dst]
+            if src_col not in src_df.columns or dst_col not in dst_df.columns:
+                self._edge_index[edge] = np.full(len(src_df), -1, dtype=np.int64)
+            else:
+                self._edge_index[edge] = build_join_index(src_df[src_col], dst_df[dst_col])
+        return self._edge_index[edge]
+
+    def positions(self, table: str) -> np.ndarray:
+        """Posición en `table` de la fila relacionada con cada fila de la tabla base."""
+        if table not in self._positions:
+            pos = np.arange(len(self.tables[self.base]), dtype=np.int64)
+            for edge in self._paths[table]:
+                step = self.join_index(edge)
+                pos = np.where(pos >= 0, step[np.maximum(pos, 0)], -1) if len(step) else np.full(len(pos), -1)
+            self._positions[table] = pos
+        return self._positions[table]
+
+    def resolve(self, column: str) -> Tuple[str, str]:
+        """Tabla y columna de una referencia `tabla.columna` o de una columna sin calificar."""
+        if "." in column:
+            table, col = column.split(".", 1)
+            if table in self._paths and col in self.tables[table].columns:
+                return table, col
+            return None, None
+        # Sin calificar: tabla base primero, luego la tabla alcanzable más cercana que la tenga
+        for table in self._paths:
+            if column in self.tables[table].columns:
+                return table, column
+        return None, None
+
+    def column(self, table: str, col: str) -> pd.Series:
+        values = self.tables[table][col]
+        if table == self.base:
+            return values.reset_index(drop=True)
+        pos = self.positions(table)
+        missing = pos < 0
+        if len(values) == 0:
+            return pd.Series([np.nan] * len(pos))
+        out = values.iloc[np.maximum(pos, 0)].reset_index(drop=True)
+        if missing.any():
+            out = out.where(~pd.Series(missing))
+        return out
+
+    def build_frame(self, columns: Iterable[str], extra_columns: Iterable[str] = ()) -> pd.DataFrame:
+        """Frame de la tabla base con las columnas pedidas resueltas a través de las uniones."""
+        data: Dict[str, pd.Series] = {}
+        for name in list(columns) + list(extra_columns):
+            if name in data:
+                continue
+            table, col = self.resolve(name)
+            if table is not None:
+                data[name] = self.column(table, col)
+        frame = pd.DataFrame(data, index=pd.RangeIndex(len(self.tables[self.base])))
+        frame["__source_file"] = f"{self.base}.csv"
+        return frame
+
+    def unresolved(self, columns: Set[str]) -> List[str]:
+        return sorted(c for c in columns if self.resolve(c)[0] is None)
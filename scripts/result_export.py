@@ -0,0 +1,161 @@
+"""
+Exportación del resultado del scoring como dataset Parquet particionado.
+
+Estructura de salida (particiones estilo Hive, `columna=valor/`):
+- `rows/`: registros puntuados con todas sus columnas, particionados por nivel
+  de riesgo, archivo de origen y/o año del siniestro (`claim_year`)
+- `names/`: score por nombre (particionado por nivel si las filas lo están)
+- `activations/`: activaciones por regla y nivel de riesgo
+
+Cada partición es un archivo escrito grupo a grupo de filas. El frame ya está
+en memoria; lo que se evita es una segunda copia completa como tabla Arrow (solo
+se convierte el grupo en curso). Cada archivo usa codificación por diccionario y
+estadísticas min/max por grupo de filas, de modo que un lector que filtra por
+nivel o score solo abre las particiones y grupos que necesita.
+
+Las columnas auxiliares se exportan sin prefijo: `risk_score`, `risk_level`,
+`full_name`, `source_file`.
+"""
+import os
+import shutil
+from typing import Any, Dict, List, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROWS_DIR = "rows"
+NAMES_DIR = "names"
+ACTIVATIONS_DIR = "activations"
+PARTITION_CHOICES = ["risk_level", "source_file", "claim_year"]
+DEFAULT_PARTITION_BY = ["risk_level"]
+DEFAULT_ROW_GROUP_ROWS = 128_000
+CLAIM_DATE_COLUMN = "fecha_siniestro"
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+EXPORT_NAMES = {
+    "__risk_score": "risk_score",
+    "__risk_level": "risk_level",
+    "__full_name": "full_name",
+    "__source_file": "source_file",
+}
+
+
+def with_claim_year(df: pd.DataFrame, date_column: str = CLAIM_DATE_COLUMN) -> pd.DataFrame:
+    """Añade `claim_year` (vacío en filas sin fecha de siniestro)."""
+    if date_column not in df.columns:
+        raise ValueError(f"No se puede particionar por año: falta la columna {date_column}")
+    years = pd.to_datetime(df[date_column], errors="coerce", format="mixed").dt.year
+    return df.assign(claim_year=years.astype("Int16"))
+
+
+def arrow_schema(df: pd.DataFrame) -> pa.Schema:
+    """Esquema Arrow común a todos los lotes (las columnas object se infieren sobre la columna completa)."""
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    for i, col in enumerate(df.columns):
+        if df[col].dtype != object:
+            continue
+        try:
+            typ = pa.infer_type(df[col].dropna().to_numpy())
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            typ = pa.string()
+        schema = schema.set(i, pa.field(str(col), pa.string() if pa.types.is_null(typ) else typ))
+    return schema
+
+
+def _arrow_chunk(chunk: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    for field in schema:
+        # Columnas mixtas (p.ej. números y texto) se exportan como texto
+        if pa.types.is_string(field.type) and chunk[field.name].dtype == object:
+            chunk = chunk.assign(**{field.name: chunk[field.name].map(lambda v: v if pd.isna(v) else str(v))})
+    return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def _partition_dir(columns: List[str], key: Tuple[Any, ...]) -> str:
+    parts = []
+    for col, value in zip(columns, key):
+        text = HIVE_NULL if pd.isna(value) else quote(str(value), safe="")
+        parts.append(f"{col}={text}")
+    return os.path.join(*parts)
+
+
+def _open_writer(path: str, schema: pa.Schema) -> pq.ParquetWriter:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return pq.ParquetWriter(path, schema, compression="zstd", use_dictionary=True, write_statistics=True)
+
+
+def write_frame(df: pd.DataFrame, output_dir: str, partition_by: List[str] = None,
+                row_group_rows: int = DEFAULT_ROW_GROUP_ROWS, schema: pa.Schema = None) -> int:
+    """Escribe `df` en `output_dir` (reemplazándolo) particionado por `partition_by`; devuelve los archivos escritos.
+
+    Cada partición es un archivo escrito grupo a grupo (`row_group_rows` filas, en el orden del frame) y
+    solo el grupo en curso se convierte a Arrow. Sin `schema`, `arrow_schema` recorre antes las columnas
+    object completas de `df` para inferir sus tipos.
+    """
+    partition_by = list(partition_by or [])
+    schema = schema or arrow_schema(df)
+    # Las columnas de partición van en la ruta, no en el archivo
+    file_schema = pa.schema([f for f in schema if f.name not in partition_by])
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+    if partition_by:
+        groups = df.groupby(partition_by, dropna=False, observed=True, sort=True).indices
+        partitions = [(key if isinstance(key, tuple) else (key,), idx) for key, idx in groups.items()]
+    else:
+        partitions = [((), np.arange(len(df)))]
+    files = 0
+    for key, idx in partitions:
+        if not len(idx):
+            continue
+        directory = os.path.join(output_dir, _partition_dir(partition_by, key)) if key else output_dir
+        with _open_writer(os.path.join(directory, "part-0.parquet"), file_schema) as writer:
+            for start in range(0, len(idx), row_group_rows):
+                chunk = df.take(idx[start:start + row_group_rows]).drop(columns=partition_by)
+                writer.write_table(_arrow_chunk(chunk, file_schema), row_group_size=row_group_rows)
+        files += 1
+    return files
+
+
+def activation_summary(result: Dict[str, Any]) -> pd.DataFrame:
+    """Activaciones por regla y nivel de riesgo (desde el almacén de activaciones; si no hay, solo totales)."""
+    store = result.get("activation_store")
+    columns = ["expr", "score", "risk_level", "count"]
+    if store is None:
+        rows = [{"expr": a["expr"], "score": str(a["score"]), "risk_level": None, "count": a["count"]}
+                for a in result["activations"]]
+        return pd.DataFrame(rows, columns=columns)
+    codes, levels = pd.factorize(result["row_scores"]["__risk_level"])
+    rows = []
+    for j, level in enumerate(levels):
+        positions = np.flatnonzero(codes == j)
+        for entry, count in zip(store.entries, store.counts(positions)):
+            if count:
+                rows.append({"expr": entry["expr"], "score": str(entry["score"]), "risk_level": level,
+                             "count": int(count)})
+    return pd.DataFrame(rows, columns=columns)
+
+
+def export_result(result: Dict[str, Any], frame: pd.DataFrame, output_dir: str,
+                  partition_by: List[str] = None, row_group_rows: int = DEFAULT_ROW_GROUP_ROWS) -> Dict[str, Any]:
+    """Exporta filas (`frame` = `scored_frame(result)`), nombres y activaciones bajo `output_dir`."""
+    partition_by = list(DEFAULT_PARTITION_BY if partition_by is None else partition_by)
+    rows = frame.rename(columns=EXPORT_NAMES)
+    if "claim_year" in partition_by:
+        rows = with_claim_year(rows)
+    missing = [c for c in partition_by if c not in rows.columns]
+    if missing:
+        raise ValueError(f"No se puede particionar por {', '.join(missing)}: columna ausente")
+    files = write_frame(rows, os.path.join(output_dir, ROWS_DIR), partition_by, row_group_rows)
+
+    names = result["name_scores"]
+    name_parts = ["risk_level"] if "risk_level" in partition_by else []
+    write_frame(names, os.path.join(output_dir, NAMES_DIR), name_parts, row_group_rows)
+
+    activations = activation_summary(result)
+    acts_schema = pa.schema([("expr", pa.string()), ("score", pa.string()), ("risk_level", pa.string()),
+                             ("count", pa.int64())])
+    write_frame(activations, os.path.join(output_dir, ACTIVATIONS_DIR), schema=acts_schema)
+    return {"rows": len(rows), "files": files, "names": len(names), "activations": len(activations),
+            "partition_by": partition_by}
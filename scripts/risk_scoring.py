@@ -1,10 +1,58 @@
+import hashlib
+import json
 import os
 import re
 import sys
 import argparse
-from typing import List, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Any, Set, Tuple
+import numpy as np
 import pandas as pd
 
+from activation_store import ActivationStore
+from compact_frame import (
+    compact_frame,
+    compact_frames,
+    format_memory_report,
+    memory_report,
+    numeric_view,
+    text_view,
+    widen,
+)
+from dataset_cache import DatasetCache, content_hash, file_fingerprint
+from dataset_files import is_parquet, list_data_files, parquet_header
+from fuzzy_watchlist import DEFAULT_MIN_SIMILARITY, FuzzyWatchlist
+from fuzzy_watchlist import MATCH_COLUMNS as FUZZY_MATCH_COLUMNS
+from global_stats import GlobalStats, global_columns
+from name_index import NameIndex, build_name_index
+from parallel_io import format_timings, read_files
+from ranking import DEFAULT_TOP_K, INSURER_COLUMN, top_names, top_rows
+from relational import DEFAULT_BASE_TABLE, RelationalDataset
+from rule_backends import BACKENDS, DEFAULT_BACKEND, BackendUnavailable, get_backend
+from result_export import DEFAULT_PARTITION_BY, DEFAULT_ROW_GROUP_ROWS, PARTITION_CHOICES, export_result
+from schema_registry import SchemaRegistry
+from scoring_profile import ScoringProfiler, measure, measure_rule, save_profile
+from rule_compiler import (
+    FULL_NAME_COLUMN,
+    And,
+    Compare,
+    Duplicate,
+    FullNameIn,
+    HighCardinality,
+    InList,
+    Node,
+    NotNull,
+    Or,
+    RuleSyntaxError,
+    Window,
+    compile_expr,
+)
+from window_rules import frame_window_values, window_mask, window_plans
+
+FUZZY_REPORT_LIMIT = 10
+PROFILE_REPORT_LIMIT = 5
+SCORE_COLUMNS = ["__risk_score", "__risk_level", "__full_name"]
 RULE_TABLE_PATTERN = re.compile(r"^\|.*\|$")
 
 SCORE_BUCKETS = [
@@ -21,31 +69,180 @@ NAME_COLUMNS_CANDIDATES = [
 ]
 
 
-def load_unified(dataset_dir: str) -> pd.DataFrame:
-    files = [os.path.join(dataset_dir, f) for f in os.listdir(dataset_dir) if f.lower().endswith(".csv")]
+def is_name_column(col: str) -> bool:
+    if any(col in pair for pair in NAME_COLUMNS_CANDIDATES):
+        return True
+    return col.lower() in ("full_name", "nombre_apellido", "name")
+
+
+def read_csv_header(path: str) -> List[str]:
+    if is_parquet(path):
+        return parquet_header(path)
+    try:
+        return list(pd.read_csv(path, encoding="utf-8", nrows=0).columns)
+    except Exception:
+        return list(pd.read_csv(path, encoding="ISO-8859-1", nrows=0).columns)
+
+
+def rule_columns(rules: List[Dict[str, Any]]) -> Set[str]:
+    """Columnas referenciadas por las reglas compiladas."""
+    cols: Set[str] = set()
+    for rule in rules:
+        if rule.get("plan") is not None:
+            cols |= rule["plan"].columns()
+    return cols
+
+
+def project_columns(header: List[str], columns: Set[str]) -> List[str]:
+    usecols = [c for c in header if c in columns or is_name_column(c)]
+    if not usecols and header:
+        # Se conserva una columna para mantener el número de filas del archivo
+        usecols = [header[0]]
+    return usecols
+
+
+def qualified_columns_by_rule(rules: List[Dict[str, Any]], columns: Set[str]) -> Dict[str, List[str]]:
+    """Reglas con columnas `tabla.columna` que no existen en el frame: solo se resuelven con `--relational`."""
+    out: Dict[str, List[str]] = {}
+    for rule in rules:
+        if rule.get("plan") is None:
+            continue
+        qualified = sorted(c for c in rule["plan"].columns() if "." in c and c not in columns)
+        if qualified:
+            out[rule["expr"]] = qualified
+    return out
+
+
+def rules_unavailable_by_file(rules: List[Dict[str, Any]], source_columns: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Para cada archivo fuente, reglas que no pueden activarse por faltar columnas.
+
+    Las que usan `tabla.columna` inexistentes se reportan aparte (`qualified_columns_by_rule`).
+    """
+    out: Dict[str, List[str]] = {}
+    all_columns = set().union(*source_columns.values()) if source_columns else set()
+    relational_only = qualified_columns_by_rule(rules, all_columns)
+    for source, header in source_columns.items():
+        available = set(header)
+        if any(is_name_column(c) for c in header):
+            available.add(FULL_NAME_COLUMN)
+        available = frozenset(available)
+        out[source] = [r["expr"] for r in rules if r.get("plan") is not None and r["expr"] not in relational_only
+                       and not r["plan"].can_fire(available)]
+    return out
+
+
+def read_source_csv(path: str, usecols: List[str] = None, dtype: Dict[str, str] = None) -> pd.DataFrame:
+    if is_parquet(path):
+        # Parquet ya trae sus tipos: `dtype` (del esquema de CSV) no aplica
+        return pd.read_parquet(path, columns=usecols)
+    try:
+        return pd.read_csv(path, encoding="utf-8", low_memory=True, on_bad_lines='skip', usecols=usecols, dtype=dtype)
+    except Exception:
+        return pd.read_csv(path, encoding="ISO-8859-1", low_memory=True, on_bad_lines='skip', usecols=usecols, dtype=dtype)
+
+
+def read_typed_csv(path: str, schema: SchemaRegistry, usecols: List[str] = None) -> pd.DataFrame:
+    """`read_source_csv` con los tipos del esquema (inferencia si la tabla no está o no encaja)."""
+    return schema.read(read_source_csv, path, usecols=usecols)
+
+
+def read_projected_csv(path: str, columns: Set[str], schema: SchemaRegistry = None) -> pd.DataFrame:
+    header = read_csv_header(path)
+    usecols = project_columns(header, columns)
+    df = read_typed_csv(path, schema, usecols) if schema else read_source_csv(path, usecols)
+    df.attrs["source_header"] = header
+    return df
+
+
+def load_unified(dataset_dir: str, columns: Set[str] = None, cache: DatasetCache = None,
+                 workers: int = 1, use_processes: bool = False, compact: bool = False,
+                 schema: SchemaRegistry = None) -> pd.DataFrame:
+    """Une los archivos del dataset (`dataset_files.list_data_files`). `schema` por defecto es `schema.json`
+    del dataset (si existe); `SchemaRegistry()` vacío fuerza la inferencia de tipos de pandas."""
+    if schema is None:
+        schema = SchemaRegistry.for_dataset(dataset_dir)
+    # Orden estable de archivos: el resultado no depende del orden de os.listdir ni del pool
+    sources = {path: name for name, path in list_data_files(dataset_dir)}
+    files = list(sources)
+    if cache is not None or columns is None:
+        # La caché guarda el archivo completo; la proyección se aplica después de leer
+        reader = partial(read_typed_csv, schema=schema) if schema else read_source_csv
+    else:
+        reader = partial(read_projected_csv, columns=frozenset(columns), schema=schema if schema else None)
+    results = read_files(files, reader, workers, use_processes, cache, variant=schema.cache_variant("risk_scoring"))
     frames = []
     errors = []
-    for path in files:
-        try:
-            df = pd.read_csv(path, encoding="utf-8", low_memory=True, on_bad_lines='skip')
-        except Exception as e1:
-            try:
-                df = pd.read_csv(path, encoding="ISO-8859-1", low_memory=True, on_bad_lines='skip')
-            except Exception as e2:
-                errors.append(f"{os.path.basename(path)}: {e2}")
-                continue
+    source_columns: Dict[str, List[str]] = {}
+    for res in results:
+        name = sources[res.path]
+        if res.error is not None:
+            errors.append(f"{name}: {res.error}")
+            continue
+        df = res.df
         if df.empty:
-            errors.append(f"{os.path.basename(path)}: archivo vacío")
+            errors.append(f"{name}: archivo vacío")
             continue
-        df["__source_file"] = os.path.basename(path)
+        if columns is not None:
+            source_columns[name] = df.attrs.get("source_header", list(df.columns))
+            df = df[[c for c in df.columns if c in columns or is_name_column(c)]]
+        df["__source_file"] = name
         frames.append(df)
     if errors:
         print(f"Advertencias al cargar archivos ({len(errors)}):")
         for err in errors:
             print(f"  - {err}")
+    if schema.stale:
+        print("Tablas que no encajan con el esquema (leídas con inferencia):")
+        for line in schema.stale_report():
+            print(line)
     if not frames:
         raise SystemExit("No se encontraron CSVs válidos en dataset.")
-    return pd.concat(frames, axis=0, ignore_index=True, sort=False)
+    read_stats = None
+    if compact:
+        # Tipos compactos comunes por archivo: la concatenación ya sale compacta
+        frames, read_stats = compact_frames(frames)
+    unified = pd.concat(frames, axis=0, ignore_index=True, sort=False)
+    del frames
+    if compact:
+        # Columnas que solo quedan compactables tras la unión (p.ej. tipos mixtos entre archivos)
+        unified, _ = compact_frame(unified)
+    unified.attrs = {"load_timings": format_timings(results)}
+    if read_stats is not None:
+        unified.attrs["read_memory"] = read_stats
+    if columns is not None:
+        unified.attrs["source_columns"] = source_columns
+    return unified
+
+
+def load_relational(dataset_dir: str, base: str = DEFAULT_BASE_TABLE, cache: DatasetCache = None,
+                    schema: SchemaRegistry = None) -> RelationalDataset:
+    """Carga cada tabla como independiente (nombre de archivo sin extensión; las partes se concatenan)."""
+    if schema is None:
+        schema = SchemaRegistry.for_dataset(dataset_dir)
+    reader = partial(read_typed_csv, schema=schema) if schema else read_source_csv
+    parts: Dict[str, List[pd.DataFrame]] = {}
+    for name, path in list_data_files(dataset_dir):
+        try:
+            if cache is not None:
+                df = cache.read(path, reader, variant=schema.cache_variant("risk_scoring"))
+            else:
+                df = reader(path)
+        except Exception as e:
+            print(f"Advertencia: no se pudo leer {os.path.relpath(path, dataset_dir)}: {e}")
+            continue
+        parts.setdefault(os.path.splitext(name)[0], []).append(df)
+    tables = {t: dfs[0] if len(dfs) == 1 else pd.concat(dfs, ignore_index=True) for t, dfs in parts.items()}
+    if base not in tables:
+        raise SystemExit(f"No se encontró la tabla base '{base}' en {dataset_dir}.")
+    return RelationalDataset(tables, base)
+
+
+class Watchlist(dict):
+    """Nombre normalizado -> {score, reason}, con la tabla compacta de scores (`scores`) para el cruce vectorizado."""
+
+    def __init__(self, entries: Any = (), scores: pd.Series = None):
+        super().__init__(entries)
+        self.scores = scores
 
 
 def load_watchlist(watchlist_path: str) -> Dict[str, Any]:
@@ -57,16 +254,62 @@ def load_watchlist(watchlist_path: str) -> Dict[str, Any]:
         df = pd.read_csv(watchlist_path, encoding="ISO-8859-1")
     if "full_name" not in df.columns or "watchlist_score" not in df.columns:
         return {}
-    result: Dict[str, Any] = {}
-    for _, row in df.iterrows():
-        name_norm = normalize_name(str(row["full_name"]))
+    names = normalize_names(df["full_name"].astype(str))
+    scores = pd.to_numeric(df["watchlist_score"], errors="coerce").fillna(0).astype("int64")
+    if "reason" in df.columns:
+        reasons = df["reason"].astype(object).where(df["reason"].notna(), "").astype(str)
+    else:
+        reasons = pd.Series("", index=df.index)
+    # Ante nombres repetidos prevalece la última fila
+    last = ~names.duplicated(keep="last")
+    names, scores, reasons = names[last], scores[last], reasons[last]
+    table = pd.Series(scores.to_numpy(), index=pd.Index(names.to_numpy(), name="full_name"), name="watchlist_score")
+    entries = zip(names.tolist(), ({"score": sc, "reason": r} for sc, r in zip(scores.tolist(), reasons.tolist())))
+    return Watchlist(entries, table)
+
+
+def watchlist_score_table(watchlist: Dict[str, Any]) -> pd.Series:
+    """Score por nombre normalizado (índice único); reutiliza la tabla de `load_watchlist` si existe."""
+    table = getattr(watchlist, "scores", None)
+    if table is not None:
+        return table
+    values = []
+    for val in watchlist.values():
+        raw = val.get("score", 0) if isinstance(val, dict) else val
         try:
-            score = int(row["watchlist_score"]) if pd.notnull(row["watchlist_score"]) else 0
+            values.append(int(raw))
         except Exception:
-            score = 0
-        reason = str(row["reason"]) if "reason" in df.columns and pd.notnull(row.get("reason")) else ""
-        result[name_norm] = {"score": score, "reason": reason}
-    return result
+            values.append(0)
+    table = pd.Series(values, index=pd.Index(list(watchlist.keys()), name="full_name"), dtype="int64")
+    return table[~table.index.duplicated(keep="last")]
+
+
+def split_table_row(line: str) -> List[str]:
+    """Separa las celdas de una fila markdown respetando `||` y valores entre comillas."""
+    cells: List[str] = []
+    current: List[str] = []
+    quote = None
+    i = 0
+    while i < len(line):
+        ch = line[i]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch == "|":
+            if line[i + 1:i + 2] == "|":
+                current.append("||")
+                i += 2
+                continue
+            cells.append("".join(current).strip())
+            current = []
+            i += 1
+            continue
+        current.append(ch)
+        i += 1
+    cells.append("".join(current).strip())
+    return cells[1:-1]  # remove outer empties
 
 
 def parse_rules(rules_path: str) -> List[Dict[str, Any]]:
@@ -81,7 +324,7 @@ def parse_rules(rules_path: str) -> List[Dict[str, Any]]:
         line_strip = line.strip()
         if not line_strip.startswith("|"):
             continue
-        cells = [c.strip() for c in line_strip.split("|")[1:-1]]  # remove outer empties
+        cells = split_table_row(line_strip)
         if not header_found:
             header_found = True
             continue  # skip header
@@ -94,7 +337,13 @@ def parse_rules(rules_path: str) -> List[Dict[str, Any]]:
             score = int(score_raw)
         except ValueError:
             continue
-        rules.append({"expr": regla, "score": score, "desc": descripcion})
+        rule = {"expr": regla, "score": score, "desc": descripcion, "plan": None}
+        # Compilar una sola vez al cargar; los errores se reportan aquí y no a mitad del scoring
+        try:
+            rule["plan"] = compile_expr(regla)
+        except RuleSyntaxError as e:
+            rule["error"] = str(e)
+        rules.append(rule)
     return rules
 
 
@@ -102,6 +351,14 @@ def normalize_name(value: str) -> str:
     return re.sub(r"\s+", " ", value.strip().upper())
 
 
+def normalize_names(values: pd.Series) -> pd.Series:
+    """`normalize_name` vectorizado: se normaliza una vez cada nombre distinto y se expande por código."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    distinct = pd.Series(uniques, dtype=object).astype(str)
+    normalized = distinct.str.strip().str.upper().str.replace(r"\s+", " ", regex=True).to_numpy(dtype=object)
+    return pd.Series(normalized[codes], index=values.index)
+
+
 def find_name_columns(df: pd.DataFrame) -> Tuple[str, str]:
     for a, b in NAME_COLUMNS_CANDIDATES:
         if a in df.columns and b in df.columns:
@@ -119,11 +376,19 @@ def bucket_score(score: int) -> str:
             return label
     return "Bajo"
 
+
+def bucket_scores(scores: pd.Series) -> pd.Series:
+    """`bucket_score` vectorizado; devuelve una columna categórica."""
+    thresholds = np.array([t for t, _ in reversed(SCORE_BUCKETS)])
+    labels = [label for _, label in reversed(SCORE_BUCKETS)]
+    codes = np.maximum(np.searchsorted(thresholds, scores.to_numpy(), side="right") - 1, 0)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=labels), index=scores.index)
+
 # --- Rule evaluation helpers ---
 
 def eval_duplicate(df: pd.DataFrame, col: str) -> pd.Series:
     if col not in df.columns:
-        return pd.Series([False] * len(df))
+        return _false_series(df)
     return df[col].duplicated(keep=False)
 
 
@@ -137,162 +402,485 @@ def eval_high_cardinality(df: pd.DataFrame, col: str) -> bool:
     return (nunique / total) > 0.95 and total > 100
 
 
+def _categorical_full_names(first: pd.Series, second: pd.Series = None) -> pd.Series:
+    """Nombre completo a partir de columnas categóricas: se concatena una vez por combinación distinta."""
+    def labels(s: pd.Series) -> np.ndarray:
+        # Código -1 (nulo) -> posición 0 = ""
+        return np.concatenate([[""], s.cat.categories.astype(str).to_numpy(dtype=object)])
+
+    a = first.cat.codes.to_numpy(dtype=np.int64) + 1
+    if second is None:
+        return pd.Series(labels(first)[a], index=first.index, dtype=object)
+    b = second.cat.codes.to_numpy(dtype=np.int64) + 1
+    combo, pairs = pd.factorize(a * (len(second.cat.categories) + 1) + b)
+    pairs_a, pairs_b = np.divmod(pairs, len(second.cat.categories) + 1)
+    joined = np.array([x + " " + y for x, y in zip(labels(first)[pairs_a], labels(second)[pairs_b])], dtype=object)
+    return pd.Series(joined[combo], index=first.index, dtype=object)
+
+
 def build_full_name_series(df: pd.DataFrame, name_cols: Tuple[str, str]) -> pd.Series:
     a, b = name_cols
     if a and b:
-        return (df[a].fillna("") + " " + df[b].fillna(""))
+        if isinstance(df[a].dtype, pd.CategoricalDtype) and isinstance(df[b].dtype, pd.CategoricalDtype):
+            return _categorical_full_names(df[a], df[b])
+        return (widen(df[a]).fillna("") + " " + widen(df[b]).fillna(""))
     if a and not b:
+        if isinstance(df[a].dtype, pd.CategoricalDtype):
+            return _categorical_full_names(df[a])
         return df[a].fillna("")
     return pd.Series(["" for _ in range(len(df))])
 
 
-def apply_rule(df: pd.DataFrame, rule: Dict[str, Any], full_name_series: pd.Series) -> pd.Series:
-    expr = rule["expr"]
-    # duplicate(col)
-    m = re.match(r"duplicate\(([^)]+)\)", expr)
-    if m:
-        col = m.group(1).strip()
-        return eval_duplicate(df, col)
-    # high_cardinality(col)
-    m = re.match(r"high_cardinality\(([^)]+)\)", expr)
-    if m:
-        col = m.group(1).strip()
-        val = eval_high_cardinality(df, col)
-        return pd.Series([val] * len(df))
-    # full_name in [...]
-    m = re.match(r"full_name in \[(.*)\]", expr)
-    if m:
-        raw_list = m.group(1)
-        # split by comma not inside quotes
-        names = [normalize_name(n.strip().strip('"').strip("'")) for n in raw_list.split(",")]
-        return full_name_series.apply(lambda x: normalize_name(x) in names)
-    # Presence check: col is not null
-    m = re.match(r"([A-Za-z0-9_]+) is not null", expr)
-    if m:
-        col = m.group(1)
-        if col not in df.columns:
-            return pd.Series([False] * len(df))
-        return df[col].notna()
-    # Binary logical with AND
-    if " AND " in expr:
-        parts = expr.split(" AND ")
-        series_list = [apply_rule(df, {"expr": p, "score": rule["score"], "desc": rule.get("desc", "")}, full_name_series) for p in parts]
-        out = series_list[0]
-        for s in series_list[1:]:
-            out = out & s
+def _false_series(df: pd.DataFrame) -> pd.Series:
+    return pd.Series(False, index=df.index)
+
+
+def compile_rule(rule: Dict[str, Any]) -> Node:
+    plan = rule.get("plan")
+    if plan is None:
+        plan = compile_expr(rule["expr"])
+    return plan
+
+
+class EvalCache:
+    """Caché por ejecución de scoring: vistas de columnas coaccionadas y máscaras por expresión canónica."""
+
+    def __init__(self, df: pd.DataFrame, full_name_series: pd.Series, global_stats: Any = None, offset: int = 0):
+        self.df = df
+        self.full_name_series = full_name_series
+        # Estado global externo (p.ej. conteos persistidos del modo incremental) para duplicate/high_cardinality
+        self.global_stats = global_stats
+        # Posición de `df` en el frame completo (shards), para leer las ventanas globales
+        self.offset = offset
+        self._views: Dict[Tuple[str, str], pd.Series] = {}
+        self._masks: Dict[str, pd.Series] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _view(self, kind: str, key: str, build) -> pd.Series:
+        cache_key = (kind, key)
+        if cache_key in self._views:
+            self.hits += 1
+            return self._views[cache_key]
+        self.misses += 1
+        view = build()
+        self._views[cache_key] = view
+        return view
+
+    def numeric(self, col: str) -> pd.Series:
+        return self._view("numeric", col, lambda: numeric_view(self.df[col]))
+
+    def as_str(self, col: str) -> pd.Series:
+        return self._view("str", col, lambda: text_view(self.df[col]))
+
+    def normalized_full_names(self) -> pd.Series:
+        return self._view("full_name", "", lambda: normalize_names(self.full_name_series))
+
+    def window(self, node: Window) -> np.ndarray:
+        """Valores por fila de la ventana de `node` (None si falta alguna columna); reglas con distinto umbral la comparten."""
+        return self._view("window", node.window_key(), lambda: self._window_values(node))
+
+    def _window_values(self, node: Window) -> np.ndarray:
+        if self.global_stats is None:
+            return frame_window_values(self.df, node)
+        if node.window_key() not in self.global_stats.windows:
+            raise ValueError(f"{node.func} necesita el dataset completo (no disponible por bloques ni en modo incremental)")
+        values = self.global_stats.windows[node.window_key()]
+        return None if values is None else values[self.offset:self.offset + len(self.df)]
+
+    def mask(self, node: Node) -> pd.Series:
+        key = node.canonical()
+        if key in self._masks:
+            self.hits += 1
+            return self._masks[key]
+        self.misses += 1
+        mask = _evaluate_node(self, node)
+        self._masks[key] = mask
+        return mask
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "views": len(self._views), "masks": len(self._masks)}
+
+
+def _evaluate_node(cache: EvalCache, node: Node) -> pd.Series:
+    df = cache.df
+    if isinstance(node, And):
+        out = cache.mask(node.children[0])
+        for child in node.children[1:]:
+            out = out & cache.mask(child)
         return out
-    # OR logical with ||
-    if "||" in expr:
-        parts = [p.strip() for p in expr.split("||")] 
-        series_list = [apply_rule(df, {"expr": p, "score": rule["score"], "desc": rule.get("desc", "")}, full_name_series) for p in parts]
-        out = series_list[0]
-        for s in series_list[1:]:
-            out = out | s
+    if isinstance(node, Or):
+        out = cache.mask(node.children[0])
+        for child in node.children[1:]:
+            out = out | cache.mask(child)
         return out
-    # column in [..]
-    m = re.match(r"([A-Za-z0-9_]+) in \[(.*)\]", expr)
-    if m:
-        col = m.group(1)
-        if col not in df.columns:
-            return pd.Series([False] * len(df))
-        raw_list = m.group(2)
-        values = [v.strip().strip('"').strip("'") for v in raw_list.split(",")]
-        return df[col].astype(str).isin(values)
-    # Comparisons: col > value, >=, <, <=, ==
-    m = re.match(r"([A-Za-z0-9_]+)\s*(==|>=|<=|>|<)\s*(.+)", expr)
-    if m:
-        col, op, val_raw = m.groups()
-        if col not in df.columns:
-            return pd.Series([False] * len(df))
-        val_raw = val_raw.strip().strip('"').strip("'")
-        series = df[col]
-        # try numeric
+    if isinstance(node, Duplicate):
+        if cache.global_stats is not None and node.column in df.columns:
+            return cache.global_stats.duplicate_mask(node.column, df[node.column])
+        return eval_duplicate(df, node.column)
+    if isinstance(node, HighCardinality):
+        if cache.global_stats is not None and node.column in df.columns:
+            return pd.Series(cache.global_stats.high_cardinality(node.column), index=df.index)
+        return pd.Series(eval_high_cardinality(df, node.column), index=df.index)
+    if isinstance(node, FullNameIn):
+        names = [normalize_name(n) for n in node.names]
+        return cache.normalized_full_names().isin(names)
+    if isinstance(node, Window):
+        mask = window_mask(cache.window(node), node)
+        return _false_series(df) if mask is None else pd.Series(mask, index=df.index)
+    if node.column not in df.columns:
+        return _false_series(df)
+    if isinstance(node, NotNull):
+        return df[node.column].notna()
+    if isinstance(node, InList):
+        return cache.as_str(node.column).isin(list(node.values))
+    if isinstance(node, Compare):
         try:
-            val_num = float(val_raw)
-            series_num = pd.to_numeric(series, errors="coerce")
-            if op == ">":
-                return series_num > val_num
-            if op == ">=":
-                return series_num >= val_num
-            if op == "<":
-                return series_num < val_num
-            if op == "<=":
-                return series_num <= val_num
-            if op == "==":
-                return series_num == val_num
+            val_num = float(node.value)
         except ValueError:
-            # treat as string
-            ser_str = series.astype(str)
-            if op == "==":
-                return ser_str == val_raw
-            # other ops on string not supported
-            return pd.Series([False] * len(df))
-    # Fallback no match
-    return pd.Series([False] * len(df))
+            # Comparación textual: solo igualdad soportada
+            if node.op == "==":
+                return cache.as_str(node.column) == node.value
+            return _false_series(df)
+        series_num = cache.numeric(node.column)
+        if node.op == ">":
+            return series_num > val_num
+        if node.op == ">=":
+            return series_num >= val_num
+        if node.op == "<":
+            return series_num < val_num
+        if node.op == "<=":
+            return series_num <= val_num
+        return series_num == val_num
+    raise TypeError(f"Nodo de plan no soportado: {type(node).__name__}")
+
+
+def evaluate_plan(df: pd.DataFrame, node: Node, full_name_series: pd.Series, cache: EvalCache = None) -> pd.Series:
+    if cache is None:
+        cache = EvalCache(df, full_name_series)
+    return cache.mask(node)
+
+
+def apply_rule(df: pd.DataFrame, rule: Dict[str, Any], full_name_series: pd.Series) -> pd.Series:
+    return evaluate_plan(df, compile_rule(rule), full_name_series)
+
+
+def evaluate_rules(df: pd.DataFrame, rules: List[Dict[str, Any]], full_name_series: pd.Series,
+                   total: np.ndarray, global_stats: Any = None, keep_masks: bool = False,
+                   profiler: ScoringProfiler = None, exclusive: bool = True,
+                   store: ActivationStore = None, offset: int = 0) -> Dict[str, Any]:
+    """Evalúa las reglas sobre `df` y suma los scores en `total` (in situ, mismo largo que `df`).
 
+    Con `profiler` se mide cada regla (tiempo, filas, activaciones y, si `exclusive`, memoria).
+    Con `store` se registran las filas activadas de cada regla (posición `offset` + fila en `df`).
+    """
+    cache = EvalCache(df, full_name_series, global_stats, offset)
+    counts: List[int] = []
+    masks: List[pd.Series] = []
+    ignored: List[Dict[str, Any]] = []
+    for i, rule in enumerate(rules):
+        if rule.get("error"):
+            ignored.append({"expr": rule["expr"], "error": rule["error"]})
+            counts.append(0)
+            masks.append(None)
+            continue
+        with measure_rule(profiler, rule["expr"], len(df), exclusive) as sample:
+            try:
+                mask = evaluate_plan(df, compile_rule(rule), full_name_series, cache)
+            except Exception as e:  # noqa: BLE001
+                ignored.append({"expr": rule["expr"], "error": str(e)})
+                counts.append(0)
+                masks.append(None)
+                continue
+            values = mask.to_numpy(dtype=bool, na_value=False)
+            count = int(values.sum())
+            if count:
+                total += values * rule["score"]
+                if store is not None:
+                    store.add(i, values, offset, count)
+            sample["count"] = count
+        counts.append(count)
+        masks.append(mask if keep_masks else None)
+    return {"counts": counts, "masks": masks, "ignored": ignored, "cache_stats": cache.stats()}
+
+
+def evaluate_rules_backend(df: pd.DataFrame, rules: List[Dict[str, Any]], full_name_series: pd.Series,
+                           total: np.ndarray, backend: Any, keep_masks: bool = False,
+                           store: ActivationStore = None) -> Dict[str, Any]:
+    """Como `evaluate_rules`, pero todas las reglas en una sola consulta de `backend` (sin métricas por regla)."""
+    counts = [0] * len(rules)
+    masks: List[pd.Series] = [None] * len(rules)
+    ignored: Dict[int, Dict[str, Any]] = {}
+    plans, planned = [], []
+    for i, rule in enumerate(rules):
+        if rule.get("error"):
+            ignored[i] = {"expr": rule["expr"], "error": rule["error"]}
+            continue
+        try:
+            plans.append(compile_rule(rule))
+            planned.append(i)
+        except Exception as e:  # noqa: BLE001
+            ignored[i] = {"expr": rule["expr"], "error": str(e)}
+    for i, values in zip(planned, backend.evaluate(df, plans, lambda: normalize_names(full_name_series))):
+        if isinstance(values, Exception):
+            ignored[i] = {"expr": rules[i]["expr"], "error": str(values)}
+            continue
+        count = int(values.sum())
+        if count:
+            total += values * rules[i]["score"]
+            if store is not None:
+                store.add(i, values, 0, count)
+        counts[i] = count
+        masks[i] = pd.Series(values, index=df.index) if keep_masks else None
+    distinct = len({p.canonical() for p in plans})
+    cache_stats = {"hits": len(plans) - distinct, "misses": distinct, "views": 0, "masks": distinct}
+    return {"counts": counts, "masks": masks, "ignored": [ignored[i] for i in sorted(ignored)], "cache_stats": cache_stats}
+
+
+def evaluate_rules_parallel(df: pd.DataFrame, rules: List[Dict[str, Any]], full_name_series: pd.Series,
+                            total: np.ndarray, workers: int, global_stats: Any = None,
+                            keep_masks: bool = False, profiler: ScoringProfiler = None,
+                            store: ActivationStore = None) -> Dict[str, Any]:
+    """Evalúa las reglas por shards de filas en un pool de hilos.
+
+    Cada shard escribe en su porción del buffer `total` (vista NumPy, sin copias).
+    Las reglas globales usan conteos reducidos a partir de conteos parciales por shard; las de ventana
+    temporal se calculan antes sobre el frame completo y cada shard lee su tramo.
+    """
+    bounds = np.linspace(0, len(df), workers + 1, dtype=int)
+    shards = [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if global_stats is None:
+            dup_cols, hc_cols = global_columns(rules)
+            cols = dup_cols | hc_cols
+            partial_stats = pool.map(lambda ab: GlobalStats.from_frame(df.iloc[ab[0]:ab[1]], cols), shards)
+            global_stats = GlobalStats.merge(partial_stats)
+            global_stats.windows = {w.window_key(): frame_window_values(df, w) for w in window_plans(rules)}
+        parts = list(pool.map(
+            lambda ab: evaluate_rules(df.iloc[ab[0]:ab[1]], rules, full_name_series.iloc[ab[0]:ab[1]],
+                                      total[ab[0]:ab[1]], global_stats, keep_masks, profiler, exclusive=False,
+                                      store=store, offset=ab[0]),
+            shards,
+        ))
+    ignored: Dict[str, Dict[str, Any]] = {}
+    for part in parts:
+        for ir in part["ignored"]:
+            ignored.setdefault(ir["expr"], ir)
+    masks = [None] * len(rules)
+    if keep_masks:
+        masks = [pd.concat([p["masks"][i] for p in parts]) if all(p["masks"][i] is not None for p in parts) else None
+                 for i in range(len(rules))]
+    cache_stats = {k: sum(p["cache_stats"][k] for p in parts) for k in parts[0]["cache_stats"]} if parts else {}
+    return {
+        "counts": [sum(p["counts"][i] for p in parts) for i in range(len(rules))],
+        "masks": masks,
+        "ignored": list(ignored.values()),
+        "cache_stats": cache_stats,
+    }
 
-def compute_scores(df: pd.DataFrame, rules: List[Dict[str, Any]], watchlist: Dict[str, Any] = None) -> Dict[str, Any]:
+
+def score_watchlist(full_name_series: pd.Series, watchlist: Dict[str, Any], fuzzy: FuzzyWatchlist = None) -> pd.Series:
+    """Score de watchlist por fila: cruce por hash de los nombres distintos contra la tabla de la watchlist.
+
+    Con `fuzzy`, los nombres sin coincidencia exacta se buscan de forma aproximada y reciben el score
+    ponderado por similitud; las coincidencias quedan en `attrs["fuzzy_matches"]` de la serie devuelta.
+    """
+    codes, uniques = pd.factorize(full_name_series, use_na_sentinel=False)
+    table = watchlist_score_table(watchlist)
+    distinct = normalize_names(pd.Series(uniques, dtype=object))
+    found = table.index.get_indexer(distinct.to_numpy())
+    per_name = np.where(found >= 0, table.to_numpy()[np.maximum(found, 0)], 0) if len(table) else np.zeros(len(uniques), dtype=np.int64)
+    matches = None
+    if fuzzy is not None:
+        pending = np.flatnonzero((found < 0) & (distinct != "").to_numpy())
+        matches = fuzzy.match(distinct.iloc[pending])
+        if len(matches):
+            per_name = per_name.astype(np.int64, copy=True)
+            per_name[pending[matches.index.to_numpy(dtype=np.int64)]] = matches["weighted_score"].to_numpy(dtype=np.int64)
+        matches = matches.reset_index(drop=True)
+    out = pd.Series(per_name[codes].astype(np.int64), index=full_name_series.index)
+    if matches is not None:
+        out.attrs["fuzzy_matches"] = matches
+    return out
+
+
+def compute_scores(df: pd.DataFrame, rules: List[Dict[str, Any]], watchlist: Dict[str, Any] = None,
+                   global_stats: Any = None, return_masks: bool = False, workers: int = 1,
+                   fuzzy: FuzzyWatchlist = None, profiler: ScoringProfiler = None,
+                   explain: bool = True, backend: str = DEFAULT_BACKEND) -> Dict[str, Any]:
+    """Score por fila y por nombre. Con `profiler`, `result["profile"]` trae las métricas por fase y regla.
+
+    `backend` elige el motor de reglas (`rule_backends.BACKENDS`); con `global_stats` se usa siempre pandas.
+
+    Con `explain`, `result["activation_store"]` guarda las filas activadas por cada regla (y por la
+    watchlist) para explicar filas y nombres sin volver a evaluar.
+    """
     if watchlist is None:
         watchlist = {}
     name_cols = find_name_columns(df)
-    full_name_series = build_full_name_series(df, name_cols).fillna("")
+    with measure(profiler, "full_names", len(df)):
+        full_name_series = build_full_name_series(df, name_cols).fillna("")
+        full_name_series.index = df.index
     activated_records: Dict[str, List[Dict[str, Any]]] = {}
-    rule_activations = []
-    total_score_series = pd.Series([0] * len(df), dtype=int)
-    ignored_rules = []
+    total = np.zeros(len(df), dtype=np.int64)
+    store = ActivationStore(len(df), rules) if explain else None
+    engine = get_backend(backend) if global_stats is None else None
+    with measure(profiler, "rules", len(df)):
+        if engine is not None:
+            evaluated = evaluate_rules_backend(df, rules, full_name_series, total, engine, return_masks, store)
+        elif workers > 1 and len(df) >= workers:
+            evaluated = evaluate_rules_parallel(df, rules, full_name_series, total, workers, global_stats, return_masks,
+                                                profiler, store)
+        else:
+            evaluated = evaluate_rules(df, rules, full_name_series, total, global_stats, return_masks, profiler,
+                                       store=store)
+    rule_activations = [
+        {"expr": rule["expr"], "score": rule["score"], "count": count}
+        for rule, count in zip(rules, evaluated["counts"]) if count > 0
+    ]
+    ignored_rules = evaluated["ignored"]
+    rule_masks = evaluated["masks"]
+    total_score_series = pd.Series(total, index=df.index)
+    watchlist_scores = pd.Series(0, index=df.index, dtype=int)
 
-    for rule in rules:
-        try:
-            mask = apply_rule(df, rule, full_name_series)
-        except Exception as e:  # noqa: BLE001
-            ignored_rules.append({"expr": rule["expr"], "error": str(e)})
-            continue
-        if mask.any():
-            total_score_series = total_score_series + (mask.astype(int) * rule["score"])
-            rule_activations.append({"expr": rule["expr"], "score": rule["score"], "count": int(mask.sum())})
-    
     # Apply watchlist scores
     if watchlist and name_cols[0]:
-        def _wl_score(x: str) -> int:
-            val = watchlist.get(normalize_name(x), 0)
-            if isinstance(val, dict):
-                try:
-                    return int(val.get("score", 0))
-                except Exception:
-                    return 0
-            try:
-                return int(val)
-            except Exception:
-                return 0
-        watchlist_scores = full_name_series.apply(_wl_score)
+        with measure(profiler, "watchlist", len(df)):
+            watchlist_scores = score_watchlist(full_name_series, watchlist, fuzzy)
         watchlist_match_count = (watchlist_scores > 0).sum()
         if watchlist_match_count > 0:
             total_score_series = total_score_series + watchlist_scores
             rule_activations.append({"expr": "watchlist_match", "score": "variable", "count": int(watchlist_match_count)})
+            if store is not None:
+                store.add(store.add_entry("watchlist_match", "variable"), (watchlist_scores > 0).to_numpy(),
+                          count=int(watchlist_match_count))
+    if store is not None:
+        store.freeze()
     
-    df_result = df.copy()
-    df_result["__risk_score"] = total_score_series
-    df_result["__risk_level"] = total_score_series.apply(bucket_score)
+    # Resultado por fila como columnas laterales (sin copiar `df`); `scored_frame` las une para exportar
+    with measure(profiler, "bucketing", len(df)):
+        df_result = pd.DataFrame({"__risk_score": total_score_series, "__risk_level": bucket_scores(total_score_series)},
+                                 index=df.index)
+    if "__source_file" in df.columns:
+        df_result["__source_file"] = df["__source_file"]
 
     # Aggregate per full name if name columns exist
     if name_cols[0]:
-        norm_names = full_name_series.apply(normalize_name)
-        df_result["__full_name"] = norm_names
-        agg = df_result.groupby("__full_name")["__risk_score"].sum().reset_index().rename(columns={"__risk_score": "risk_score", "__full_name": "full_name"})
-        agg["risk_level"] = agg["risk_score"].apply(bucket_score)
+        with measure(profiler, "groupby", len(df)):
+            norm_names = normalize_names(full_name_series)
+            df_result["__full_name"] = norm_names
+            agg = name_totals(df_result)
+            agg["risk_level"] = agg["risk_score"].apply(bucket_score)
     else:
         agg = pd.DataFrame(columns=["full_name", "risk_score", "risk_level"])  # empty
 
-    return {
+    result = {
         "row_scores": df_result,
+        "frame": df,
         "name_scores": agg,
         "activations": rule_activations,
         "ignored": ignored_rules,
         "name_columns": name_cols,
+        "cache_stats": evaluated["cache_stats"],
     }
+    if store is not None:
+        result["activation_store"] = store
+    if profiler is not None:
+        result["profile"] = profiler.metrics()
+    if fuzzy is not None:
+        result["fuzzy_matches"] = watchlist_scores.attrs.get("fuzzy_matches", pd.DataFrame(columns=FUZZY_MATCH_COLUMNS))
+    if return_masks:
+        # Máscara por regla (alineada con `rules`, None si se ignoró) y score de watchlist por fila
+        result["rule_masks"] = rule_masks
+        result["watchlist_scores"] = watchlist_scores
+    return result
+
+
+def compare_backends(df: pd.DataFrame, rules: List[Dict[str, Any]], watchlist: Dict[str, Any] = None,
+                     backend: str = "polars") -> Dict[str, Any]:
+    """Paridad de `backend` con la referencia pandas: filas distintas por regla y en el score final."""
+    reference = compute_scores(df, rules, watchlist, return_masks=True, explain=False)
+    other = compute_scores(df, rules, watchlist, return_masks=True, explain=False, backend=backend)
+    rule_diffs = []
+    for rule, a, b in zip(rules, reference["rule_masks"], other["rule_masks"]):
+        if a is None and b is None:
+            continue
+        if a is None or b is None:
+            rule_diffs.append({"expr": rule["expr"], "rows": None, "pandas": None if a is None else int(a.sum()),
+                               backend: None if b is None else int(b.sum())})
+            continue
+        rows = int((a.to_numpy() != b.to_numpy()).sum())
+        if rows:
+            rule_diffs.append({"expr": rule["expr"], "rows": rows, "pandas": int(a.sum()), backend: int(b.sum())})
+    score_rows = int((reference["row_scores"]["__risk_score"].to_numpy()
+                      != other["row_scores"]["__risk_score"].to_numpy()).sum())
+    return {"backend": backend, "rules": rule_diffs, "score_rows": score_rows,
+            "ok": not rule_diffs and not score_rows}
+
+
+def name_totals(rows: pd.DataFrame) -> pd.DataFrame:
+    """Score total por nombre (`full_name`, `risk_score`); las filas sin nombre ("") no forman un nombre.
+
+    Misma agregación en el scoring completo, el incremental y el de bloques.
+    """
+    named = rows[rows["__full_name"] != ""]
+    totals = named.groupby("__full_name")["__risk_score"].sum()
+    return totals.rename("risk_score").rename_axis("full_name").reset_index()
+
 
+def scored_frame(result: Dict[str, Any]) -> pd.DataFrame:
+    """Frame de entrada con las columnas de score (`__risk_score`, `__risk_level`, `__full_name`) al final."""
+    side = result["row_scores"]
+    return result["frame"].assign(**{c: side[c] for c in SCORE_COLUMNS if c in side.columns})
 
-def query_name(result: Dict[str, Any], name: str, watchlist: Dict[str, Any] = None) -> Dict[str, Any]:
+
+def _watchlist_info(out: Dict[str, Any], norm_query: str, watchlist: Dict[str, Any], fuzzy: FuzzyWatchlist = None) -> None:
+    if not watchlist:
+        return
+    wl_val = watchlist.get(norm_query)
+    if isinstance(wl_val, dict):
+        out["watchlist"] = {"matched": wl_val.get("score", 0) > 0, "score": wl_val.get("score", 0), "reason": wl_val.get("reason", "")}
+    else:
+        out["watchlist"] = {"matched": bool(wl_val), "score": int(wl_val or 0), "reason": ""}
+    if wl_val is None and fuzzy is not None:
+        m = fuzzy.match(pd.Series([norm_query]))
+        if len(m):
+            best = m.iloc[0]
+            entry = watchlist.get(best["watch_name"], {})
+            out["watchlist"] = {
+                "matched": int(best["weighted_score"]) > 0,
+                "score": int(best["weighted_score"]),
+                "reason": entry.get("reason", "") if isinstance(entry, dict) else "",
+                "matched_name": best["watch_name"],
+                "similarity": float(best["similarity"]),
+                "method": best["method"],
+            }
+    out["watchlist_count"] = len(watchlist)
+
+
+def _query_index(index: NameIndex, name: str, watchlist: Dict[str, Any] = None,
+                 fuzzy: FuzzyWatchlist = None) -> Dict[str, Any]:
+    norm_query = normalize_name(name)
+    entry = index.lookup(norm_query)
+    if entry is None:
+        return {"error": "No"}
+    out = {
+        "full_name": name,
+        "risk_score": entry["risk_score"],
+        "risk_level": entry["risk_level"],
+        "rules": (index.store.explain(entry["positions"]) if index.store is not None
+                  else [dict(a) for a in index.activations]),
+        "records_count": entry["records_count"],
+        "records_breakdown": entry["records_breakdown"],
+    }
+    _watchlist_info(out, norm_query, watchlist, fuzzy)
+    return out
+
+
+def query_name(result: Dict[str, Any], name: str, watchlist: Dict[str, Any] = None,
+               index: NameIndex = None, fuzzy: FuzzyWatchlist = None) -> Dict[str, Any]:
+    if index is not None:
+        return _query_index(index, name, watchlist, fuzzy)
     norm_query = normalize_name(name)
     name_scores = result["name_scores"]
     if name_scores.empty:
@@ -304,40 +892,71 @@ def query_name(result: Dict[str, Any], name: str, watchlist: Dict[str, Any] = No
     row_scores = result["row_scores"]
     if "__full_name" not in row_scores.columns:
         out = {"full_name": name, "risk_score": int(match_row.iloc[0]["risk_score"]), "risk_level": match_row.iloc[0]["risk_level"], "rules": [], "records_count": 0}
-        if watchlist:
-            wl_val = watchlist.get(norm_query)
-            if isinstance(wl_val, dict):
-                out["watchlist"] = {"matched": wl_val.get("score", 0) > 0, "score": wl_val.get("score", 0), "reason": wl_val.get("reason", "")}
-            else:
-                out["watchlist"] = {"matched": bool(wl_val), "score": int(wl_val or 0), "reason": ""}
-            out["watchlist_count"] = len(watchlist)
+        _watchlist_info(out, norm_query, watchlist, fuzzy)
         return out
     # Rows for this name (all) and triggered (score > 0)
-    rows_name = row_scores[row_scores["__full_name"] == norm_query]
+    in_name = (row_scores["__full_name"] == norm_query).to_numpy()
+    rows_name = row_scores[in_name]
     triggered_rows = rows_name[rows_name["__risk_score"] > 0]
-    active_rules = []
-    for act in result["activations"]:
-        expr = act["expr"]
-        score = act["score"]
-        active_rules.append({"expr": expr, "score": score})
+    store = result.get("activation_store")
+    if store is not None:
+        # Reglas que se activaron en las filas de este nombre (y en cuántas)
+        active_rules = store.explain(np.flatnonzero(in_name))
+    else:
+        active_rules = [{"expr": act["expr"], "score": act["score"]} for act in result["activations"]]
     out = {
         "full_name": name,
         "risk_score": int(match_row.iloc[0]["risk_score"]),
         "risk_level": match_row.iloc[0]["risk_level"],
         "rules": active_rules,
         "records_count": len(triggered_rows),
-        "records_breakdown": rows_name["__source_file"].value_counts().to_dict() if "__source_file" in rows_name.columns else {}
+        "records_breakdown": rows_name["__source_file"].value_counts().loc[lambda c: c > 0].to_dict() if "__source_file" in rows_name.columns else {}
     }
-    if watchlist:
-        wl_val = watchlist.get(norm_query)
-        if isinstance(wl_val, dict):
-            out["watchlist"] = {"matched": wl_val.get("score", 0) > 0, "score": wl_val.get("score", 0), "reason": wl_val.get("reason", "")}
-        else:
-            out["watchlist"] = {"matched": bool(wl_val), "score": int(wl_val or 0), "reason": ""}
-        out["watchlist_count"] = len(watchlist)
+    _watchlist_info(out, norm_query, watchlist, fuzzy)
     return out
 
 
+def query_names(index: NameIndex, names: List[str], watchlist: Dict[str, Any] = None,
+                fuzzy: FuzzyWatchlist = None) -> List[Dict[str, Any]]:
+    """Consulta por lotes sobre el índice de nombres; cada resultado incluye el nombre consultado en `query`."""
+    results = []
+    for name in names:
+        out = {"query": name}
+        out.update(_query_index(index, name, watchlist, fuzzy))
+        results.append(out)
+    return results
+
+
+def read_query_file(path: str) -> List[str]:
+    """Nombres a consultar: uno por línea (se ignoran líneas vacías y las que empiezan con #)."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def write_jsonl(path: str, records: List[Dict[str, Any]]) -> None:
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+
+
+def index_fingerprint(args: argparse.Namespace, rules: List[Dict[str, Any]]) -> str:
+    """Huella de las entradas del scoring: reglas efectivas, watchlist, archivos del dataset y modo de carga."""
+    h = hashlib.sha256()
+    h.update(json.dumps([[r["expr"], r["score"]] for r in rules], ensure_ascii=False).encode("utf-8"))
+    if args.watchlist:
+        h.update(content_hash(args.watchlist).encode("utf-8"))
+    for _, path in list_data_files(args.dataset_dir):
+        fp = file_fingerprint(path)
+        h.update(f"{os.path.relpath(path, args.dataset_dir)}:{fp['size']}:{fp['mtime_ns']}".encode("utf-8"))
+    h.update(f"relational={args.relational}:{args.base_table}".encode("utf-8"))
+    if args.fuzzy_watchlist:
+        h.update(f"fuzzy={args.fuzzy_min_similarity}".encode("utf-8"))
+    return h.hexdigest()
+
+
 def parse_args(argv: List[str]) -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Motor de scoring de riesgo por reglas")
     p.add_argument("--dataset-dir", default="dataset", help="Directorio de CSVs")
@@ -346,25 +965,119 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
     p.add_argument("--query-name", default=None, help="Nombre completo a consultar (opcional)")
     p.add_argument("--export", default=None, help="Ruta para exportar resultados row_scores en CSV/Parquet")
     p.add_argument("--export-format", choices=["csv", "parquet"], default="csv")
+    p.add_argument("--export-dir", default=None, help="Directorio de exportación Parquet particionada (rows/, names/, activations/)")
+    p.add_argument("--export-partition-by", action="append", choices=PARTITION_CHOICES, default=None, help=f"Columna de partición de --export-dir (repetible; por defecto {', '.join(DEFAULT_PARTITION_BY)})")
+    p.add_argument("--export-row-group-rows", type=int, default=DEFAULT_ROW_GROUP_ROWS, help="Filas por grupo de filas en --export-dir")
     p.add_argument("--concise-output", action="store_true", help="Muestra salida concisa con solo reglas destacadas")
     p.add_argument("--exclude-rule", action="append", default=[], help="Expr de regla a excluir (repetible)")
+    p.add_argument("--cache-dir", default=None, help="Directorio de caché Parquet de los CSV (se reutiliza si los archivos no cambiaron)")
+    p.add_argument("--workers", type=int, default=1, help="Archivos leídos en paralelo (>1 muestra tiempos por archivo)")
+    p.add_argument("--process-pool", action="store_true", help="Usa procesos en lugar de hilos para la lectura paralela")
+    p.add_argument("--rule-workers", type=int, default=1, help="Hilos para evaluar reglas por shards de filas")
+    p.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND, help="Motor de reglas (polars es opcional: pip install polars)")
+    p.add_argument("--backend-check", action="store_true", help="Compara regla a regla el motor de --backend con pandas (código de salida 1 si difieren)")
+    p.add_argument("--relational", action="store_true", help="Scoring relacional sobre la tabla base con uniones por claves (poliza_id, vehiculo_id, asegurado_id)")
+    p.add_argument("--base-table", default=DEFAULT_BASE_TABLE, help="Tabla base del modo relacional")
+    p.add_argument("--fuzzy-watchlist", action="store_true", help="Coincidencia aproximada (acentos, fonética, trigramas) de nombres contra la watchlist")
+    p.add_argument("--fuzzy-min-similarity", type=float, default=DEFAULT_MIN_SIMILARITY, help="Similitud mínima (0-1) para coincidencias aproximadas")
+    p.add_argument("--name-index", default=None, help="Directorio del índice persistente de nombres (se reutiliza si reglas, watchlist y CSV no cambiaron)")
+    p.add_argument("--query-file", default=None, help="Archivo con un nombre por línea para consulta por lotes")
+    p.add_argument("--query-output", default="results/query_results.jsonl", help="Salida JSONL de la consulta por lotes")
+    p.add_argument("--all-columns", action="store_true", help="Carga todas las columnas (sin proyección por reglas; implícito con --export)")
+    p.add_argument("--verbose", action="store_true", help="Muestra diagnósticos: reglas no aplicables por archivo y aciertos de la caché de evaluación (también con --profile)")
+    p.add_argument("--profile", action="store_true", help="Mide tiempo, filas y pico de memoria por fase y por regla e imprime el resumen")
+    p.add_argument("--profile-output", default=None, help="Guarda el perfil en JSON (.json) o Markdown (otra extensión); implica --profile")
+    p.add_argument("--profile-no-memory", action="store_true", help="Perfila solo tiempos (sin tracemalloc, menor sobrecarga)")
+    p.add_argument("--schema", default=None, help="Esquema de tipos por tabla (por defecto, schema.json del dataset si existe; lo genera data_loader.py)")
+    p.add_argument("--no-schema", action="store_true", help="Ignora el esquema y deja que pandas infiera los tipos")
+    p.add_argument("--compact", action="store_true", help="Compacta el frame en memoria (categorías, enteros pequeños, float32 sin pérdida) e informa la memoria por columna")
+    p.add_argument("--top", type=int, nargs="?", const=DEFAULT_TOP_K, default=None, help=f"Ranking de los K nombres (o registros) de mayor score (por defecto {DEFAULT_TOP_K})")
+    p.add_argument("--top-by", choices=["names", "rows"], default="names", help="Ranking por nombre (score total) o por registro")
+    p.add_argument("--top-level", action="append", default=[], help="Filtra el ranking por nivel de riesgo (repetible)")
+    p.add_argument("--top-source", action="append", default=[], help="Filtra el ranking por archivo de origen, p.ej. siniestros.csv (repetible)")
+    p.add_argument("--top-insurer", action="append", default=[], help=f"Filtra el ranking por aseguradora ({INSURER_COLUMN}, repetible)")
+    p.add_argument("--top-cursor", default=None, help="Cursor de la página siguiente (lo imprime el ranking anterior)")
+    p.add_argument("--top-output", default=None, help="Guarda la página del ranking en JSONL")
     return p.parse_args(argv)
 
 
-def main(argv: List[str]) -> int:
-    args = parse_args(argv)
-    df = load_unified(args.dataset_dir)
-    rules = parse_rules(args.rules)
-    # Excluir reglas si se solicitó
-    if getattr(args, 'exclude_rule', []):
-        exclude_set = set(args.exclude_rule)
-        rules = [r for r in rules if r.get('expr') not in exclude_set]
-    watchlist = load_watchlist(args.watchlist) if args.watchlist else {}
+def top_needs_rows(args: argparse.Namespace) -> bool:
+    """El ranking pedido necesita las filas puntuadas (no se puede responder solo con el índice de nombres)."""
+    return args.top is not None and (args.top_by == "rows" or bool(args.top_insurer))
+
+
+def build_fuzzy(args: argparse.Namespace, watchlist: Dict[str, Any]) -> FuzzyWatchlist:
+    if not (args.fuzzy_watchlist and watchlist):
+        return None
+    return FuzzyWatchlist(watchlist_score_table(watchlist), args.fuzzy_min_similarity)
+
+
+def schema_from_args(args: argparse.Namespace) -> SchemaRegistry:
+    """Esquema de `--schema` (o `schema.json` del dataset); vacío con `--no-schema`."""
+    if getattr(args, "no_schema", False):
+        return SchemaRegistry()
+    return SchemaRegistry.for_dataset(args.dataset_dir, getattr(args, "schema", None))
+
+
+def run_scoring(args: argparse.Namespace, rules: List[Dict[str, Any]],
+                profiler: ScoringProfiler = None) -> Tuple[Dict[str, Any], Dict[str, Any], FuzzyWatchlist]:
+    """Carga el dataset según los argumentos, puntúa e imprime el resumen. Devuelve (resultado, watchlist, índice aproximado)."""
+    # Proyección: solo columnas usadas por las reglas (+ nombres); la exportación conserva todo
+    project = not (args.all_columns or args.export or args.export_dir)
+    extra_columns = {INSURER_COLUMN} if getattr(args, "top_insurer", None) else set()
+    cache = DatasetCache(args.cache_dir) if args.cache_dir else None
+    schema = schema_from_args(args)
+    with measure(profiler, "load") as load_sample:
+        if args.relational:
+            rel = load_relational(args.dataset_dir, args.base_table, cache, schema)
+            needed = rule_columns(rules) | extra_columns
+            df = rel.build_frame(sorted(needed), [c for pair in NAME_COLUMNS_CANDIDATES for c in pair])
+        else:
+            df = load_unified(args.dataset_dir, rule_columns(rules) | extra_columns if project else None, cache,
+                              args.workers, args.process_pool, compact=args.compact, schema=schema)
+        if args.compact and args.relational:
+            df, report = compact_frame(df)
+        load_sample["rows"] = len(df)
+    if args.relational:
+        print(f"Modo relacional: {args.base_table} ({len(df)} filas) | tablas unidas: {', '.join(rel.reachable_tables()[1:])}")
+        unresolved = rel.unresolved(needed)
+        if unresolved:
+            print(f"Columnas no resolubles desde {args.base_table}: {', '.join(unresolved)}")
+    elif args.workers > 1:
+        print(f"Lectura paralela ({args.workers} workers):")
+        for line in df.attrs.get("load_timings", []):
+            print(line)
+    if cache is not None:
+        print(cache.summary())
+    if args.compact:
+        if not args.relational:
+            report = memory_report(df, df.attrs.get("read_memory", {}))
+        print(format_memory_report(report))
+    if not args.relational:
+        for expr, cols in qualified_columns_by_rule(rules, set(df.columns)).items():
+            print(f"[REQUIERE --relational] {expr} -> usa tabla.columna ({', '.join(cols)}); sin --relational no se activa")
+    verbose = getattr(args, "verbose", False) or profiler is not None
+    if verbose and project and not args.relational:
+        unavailable = rules_unavailable_by_file(rules, df.attrs.get("source_columns", {}))
+        for source, exprs in sorted(unavailable.items()):
+            print(f"Reglas no aplicables en {source}: {len(exprs)}/{len(rules)}")
+    with measure(profiler, "watchlist_load"):
+        watchlist = load_watchlist(args.watchlist) if args.watchlist else {}
+        fuzzy = build_fuzzy(args, watchlist)
     if watchlist:
         print(f"Watchlist cargada: {len(watchlist)} nombres")
-    result = compute_scores(df, rules, watchlist)
+    try:
+        result = compute_scores(df, rules, watchlist, workers=args.rule_workers, fuzzy=fuzzy, profiler=profiler,
+                                backend=args.backend)
+    except BackendUnavailable as e:
+        raise SystemExit(str(e))
+    if args.backend != DEFAULT_BACKEND:
+        print(f"Motor de reglas: {args.backend}")
 
     print(f"Reglas cargadas: {len(rules)} | Ignoradas: {len(result['ignored'])}")
+    if verbose:
+        cs = result["cache_stats"]
+        print(f"Caché de evaluación: {cs['hits']} aciertos / {cs['misses']} fallos")
     for ir in result["ignored"]:
         print(f"[IGNORADA] {ir['expr']} -> {ir['error']}")
 
@@ -372,9 +1085,117 @@ def main(argv: List[str]) -> int:
     print("Activaciones:")
     for act in result["activations"]:
         print(f" - {act['expr']} (+{act['score']}) count={act['count']}")
+    if fuzzy is not None:
+        matches = result["fuzzy_matches"]
+        print(f"Coincidencias aproximadas de watchlist: {len(matches)} nombres (similitud >= {args.fuzzy_min_similarity})")
+        for m in matches.head(FUZZY_REPORT_LIMIT).itertuples(index=False):
+            print(f" - {m.full_name} ~ {m.watch_name} ({m.method}, {m.similarity:.2f}) -> +{m.weighted_score}")
+    return result, watchlist, fuzzy
+
+
+def run_top(args: argparse.Namespace, result: Dict[str, Any] = None, index: NameIndex = None) -> Dict[str, Any]:
+    """Página del ranking pedido por `--top*` (desde el índice de nombres si no se puntuó el dataset)."""
+    filters = {"levels": args.top_level, "sources": args.top_source, "insurers": args.top_insurer,
+               "cursor": args.top_cursor}
+    try:
+        if args.top_by == "rows":
+            return top_rows(result, args.top, **filters)
+        return top_names(result, args.top, index=index if result is None else None, **filters)
+    except ValueError as e:
+        raise SystemExit(f"Ranking: {e}")
+
+
+def print_top(page: Dict[str, Any]) -> None:
+    label = "NOMBRES" if page["by"] == "names" else "REGISTROS"
+    print(f"\n=== TOP {len(page['items'])} {label} ({page['remaining']} elegibles) ===")
+    for item in page["items"]:
+        if page["by"] == "names":
+            print(f"{item['rank']:>6}. {item['full_name']} | {item['risk_score']:,} | {item['risk_level']}")
+        else:
+            who = f" | {item['full_name']}" if item.get("full_name") else ""
+            where = f"{item['source_file']} fila {item['row']} (pos. {item['pos']} en el frame)" if "row" in item else f"pos. {item['pos']} en el frame"
+            print(f"{item['rank']:>6}. {where}{who} | {item['risk_score']:,} | {item['risk_level']}")
+    if page["next_cursor"]:
+        print(f"Página siguiente: --top-cursor {page['next_cursor']}")
+
+
+def print_backend_check(check: Dict[str, Any]) -> None:
+    backend = check["backend"]
+    if check["ok"]:
+        print(f"\nParidad pandas/{backend}: OK (todas las reglas y scores coinciden)")
+        return
+    print(f"\nParidad pandas/{backend}: {len(check['rules'])} reglas y {check['score_rows']} scores de fila difieren")
+    for d in check["rules"]:
+        rows = "ignorada en un motor" if d["rows"] is None else f"{d['rows']} filas distintas"
+        print(f" - {d['expr']}: {rows} (pandas={d['pandas']}, {backend}={d[backend]})")
+
+
+def print_profile(metrics: Dict[str, Any], limit: int = PROFILE_REPORT_LIMIT) -> None:
+    print(f"\nPerfil ({metrics['total_seconds']:.2f} s, RSS máx. {metrics['max_rss_mb']} MB):")
+    for p in metrics["phases"]:
+        peak = f", pico {p['peak_mb']:.1f} MB" if p["peak_mb"] is not None else ""
+        rows = f", {p['rows']} filas" if p["rows"] is not None else ""
+        print(f" - {p['name']}: {p['seconds']:.3f} s{rows}{peak}")
+    print(f"Reglas más costosas (top {limit}):")
+    for r in metrics["rules"][:limit]:
+        peak = f", pico {r['peak_mb']:.1f} MB" if r["peak_mb"] is not None else ""
+        print(f" - {r['expr']}: {r['seconds']:.3f} s, {r['rows']} filas, {r['count']} activaciones{peak}")
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    profiler = None
+    if args.profile or args.profile_output:
+        profiler = ScoringProfiler(track_memory=not args.profile_no_memory).start()
+    try:
+        return _run(args, profiler)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+
+
+def _run(args: argparse.Namespace, profiler: ScoringProfiler = None) -> int:
+    with measure(profiler, "parse") as parse_sample:
+        rules = parse_rules(args.rules)
+        parse_sample["rows"] = len(rules)
+    for r in rules:
+        if r.get("error"):
+            print(f"[ERROR DE SINTAXIS] {r['expr']} -> {r['error']}")
+    # Excluir reglas si se solicitó
+    if getattr(args, 'exclude_rule', []):
+        exclude_set = set(args.exclude_rule)
+        rules = [r for r in rules if r.get('expr') not in exclude_set]
+    index = None
+    fingerprint = None
+    if args.name_index:
+        fingerprint = index_fingerprint(args, rules)
+        if not (args.export or args.export_dir or args.backend_check or top_needs_rows(args)):
+            index = NameIndex.load(args.name_index, fingerprint)
+    result = None
+    if index is not None:
+        print(f"Índice de nombres vigente: {len(index)} nombres ({args.name_index})")
+        watchlist = load_watchlist(args.watchlist) if args.watchlist else {}
+        fuzzy = build_fuzzy(args, watchlist)
+    else:
+        result, watchlist, fuzzy = run_scoring(args, rules, profiler)
+        if args.name_index or args.query_file:
+            with measure(profiler, "name_index", len(result["row_scores"])):
+                index = build_name_index(result, fingerprint)
+            if args.name_index:
+                index.save(args.name_index)
+                print(f"Índice de nombres guardado en {args.name_index} ({len(index)} nombres)")
+
+    if args.query_file:
+        with measure(profiler, "query_file") as query_sample:
+            records = query_names(index, read_query_file(args.query_file), watchlist, fuzzy)
+            query_sample["rows"] = len(records)
+        write_jsonl(args.query_output, records)
+        found = sum(1 for r in records if "error" not in r)
+        print(f"Consultas por lote: {len(records)} nombres, {found} encontrados -> {args.query_output}")
 
     if args.query_name:
-        qres = query_name(result, args.query_name, watchlist)
+        with measure(profiler, "query"):
+            qres = query_name(result, args.query_name, watchlist, index, fuzzy)
         print("\n=== PERFIL DE RIESGO ===")
         if "error" in qres:
             print(qres["error"])
@@ -416,6 +1237,8 @@ def main(argv: List[str]) -> int:
                         print(f" - Nombres cargados: {qres['watchlist_count']}")
                     print(f" - En watchlist: {estado}")
                     print(f" - Score watchlist: {int(wl.get('score', 0))}")
+                    if wl.get("matched_name"):
+                        print(f" - Coincidencia aproximada: {wl['matched_name']} ({wl['method']}, similitud {wl['similarity']:.2f})")
                     if wl.get("reason"):
                         print(f" - Motivo: {wl.get('reason')}")
                 if qres.get("records_breakdown"):
@@ -424,16 +1247,54 @@ def main(argv: List[str]) -> int:
                         print(f" - {src}: {cnt}")
                 print(f"\nReglas Activadas ({len(qres['rules'])}):")
                 for rule in qres['rules']:
-                    print(f"  • {rule['expr']} → +{rule['score']}")
+                    detail = f" ({rule['count']} registros)" if "count" in rule else ""
+                    print(f"  • {rule['expr']} → +{rule['score']}{detail}")
+
+    if args.top is not None:
+        with measure(profiler, "top"):
+            page = run_top(args, result, index)
+        print_top(page)
+        if args.top_output:
+            write_jsonl(args.top_output, page["items"])
+            print(f"Ranking guardado en {args.top_output}")
 
     if args.export:
-        row_scores = result["row_scores"]
-        if args.export_format == "csv":
-            row_scores.to_csv(args.export, index=False)
-        else:
-            row_scores.to_parquet(args.export, index=False)
+        with measure(profiler, "export", len(result["row_scores"])):
+            row_scores = scored_frame(result)
+            if args.export_format == "csv":
+                row_scores.to_csv(args.export, index=False)
+            else:
+                row_scores.to_parquet(args.export, index=False)
         print(f"Resultados exportados a {args.export}")
-    return 0
+
+    if args.export_dir:
+        with measure(profiler, "export", len(result["row_scores"])):
+            try:
+                summary = export_result(result, scored_frame(result), args.export_dir, args.export_partition_by,
+                                        args.export_row_group_rows)
+            except ValueError as e:
+                raise SystemExit(f"Exportación: {e}")
+        print(f"Dataset exportado a {args.export_dir} (particiones: {', '.join(summary['partition_by']) or 'ninguna'}): "
+              f"{summary['rows']} filas, {summary['names']} nombres, {summary['activations']} activaciones")
+
+    status = 0
+    if args.backend_check:
+        other = args.backend if args.backend != DEFAULT_BACKEND else "polars"
+        with measure(profiler, "backend_check", len(result["row_scores"])):
+            try:
+                check = compare_backends(result["frame"], rules, watchlist, other)
+            except BackendUnavailable as e:
+                raise SystemExit(str(e))
+        print_backend_check(check)
+        status = 0 if check["ok"] else 1
+
+    if profiler is not None:
+        metrics = profiler.metrics()
+        print_profile(metrics)
+        if args.profile_output:
+            save_profile(metrics, args.profile_output)
+            print(f"Perfil guardado en {args.profile_output}")
+    return status
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -0,0 +1,206 @@
+"""
+Backends de ejecución del motor de reglas.
+
+- `pandas` (referencia): `EvalCache` en `risk_scoring.py`, regla a regla con
+  Series de pandas.
+- `polars` (opcional, `pip install polars`): traduce los planes de todas las
+  reglas a expresiones de Polars y los ejecuta como una sola consulta lazy
+  (un `select` con una columna booleana por regla). Polars comparte
+  subexpresiones entre reglas y paraleliza sobre sus hilos.
+
+Cada backend devuelve una máscara NumPy por plan, con la semántica de la
+referencia: vistas numéricas como `pd.to_numeric(errors="coerce")`, vistas de
+texto como `astype(str)` (nulos numéricos/booleanos como "nan"), `duplicate()`
+con nulos iguales entre sí y columnas ausentes como "no se activa". Las columnas
+de fecha se comparan como texto con la vista de pandas (el formato de Polars
+difiere). Las ventanas temporales (`window_count`/`window_sum`) se calculan con
+`window_rules` y entran en la consulta como columnas. `compare_backends` en
+`risk_scoring.py` comprueba la paridad.
+"""
+import re
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+from compact_frame import text_view, widen
+from rule_compiler import And, Compare, Duplicate, FullNameIn, HighCardinality, InList, Node, NotNull, Or, Window
+from window_rules import collect_windows, frame_window_values
+
+BACKENDS = ["pandas", "polars"]
+DEFAULT_BACKEND = "pandas"
+FULL_NAME_FIELD = "__full_name"
+WINDOW_PREFIX = "__window__"
+DUPLICATE_PREFIX = "__dupkey__"
+
+
+class BackendUnavailable(RuntimeError):
+    """El backend pedido necesita una dependencia opcional que no está instalada."""
+
+
+def _import_polars():
+    try:
+        import polars as pl
+    except ImportError as e:
+        raise BackendUnavailable("El backend polars necesita el paquete opcional polars (pip install polars)") from e
+    return pl
+
+
+class PolarsBackend:
+    name = "polars"
+
+    def __init__(self):
+        self.pl = _import_polars()
+
+    def _column(self, series: pd.Series):
+        """Columna de Polars con los valores de la vista de pandas (`widen`)."""
+        pl = self.pl
+        series = widen(series)
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return pl.from_pandas(series)
+        if series.dtype == object:
+            kind = pd.api.types.infer_dtype(series, skipna=True)
+            if kind == "boolean":
+                return pl.from_pandas(series.astype("boolean"))
+            # Mixtos: texto, conservando nulos (la vista numérica parsea el texto como pandas)
+            return pl.Series(series.name, [None if pd.isna(v) else str(v) for v in series.to_numpy(dtype=object)],
+                             dtype=pl.String)
+        return pl.from_pandas(series, nan_to_null=True)
+
+    def _strings(self, name: str, values: pd.Series):
+        """Texto repetido (nombres, fechas como texto): se convierte cada valor distinto una vez y se expande."""
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        distinct = self.pl.Series(name, [None if pd.isna(v) else str(v) for v in uniques], dtype=self.pl.String)
+        return distinct.gather(codes)
+
+    def _frame(self, df: pd.DataFrame, columns: List[str], full_names: Callable[[], pd.Series] = None,
+               windows: List[Window] = (), duplicates: List[str] = ()):
+        data = {}
+        for col in columns:
+            data[col] = self._column(df[col]).rename(col)
+            if pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+                data["__text__" + col] = self._strings("__text__" + col, text_view(df[col]))
+        if full_names is not None:
+            data[FULL_NAME_FIELD] = self._strings(FULL_NAME_FIELD, full_names())
+        for col in duplicates:
+            series = widen(df[col])
+            if series.dtype == object:
+                # Mixtos: la clave de pandas (5 == 5.0 == True, nulos iguales), no su texto ("5" != "5.0")
+                codes, _ = pd.factorize(series, use_na_sentinel=False)
+                data[DUPLICATE_PREFIX + col] = self.pl.Series(codes)
+        for node in windows:
+            values = frame_window_values(df, node)
+            if values is not None:
+                data[WINDOW_PREFIX + node.window_key()] = self.pl.Series(values, nan_to_null=True)
+        return self.pl.DataFrame(data)
+
+    def _numeric(self, frame, col: str):
+        pl = self.pl
+        dtype = frame.schema[col]
+        c = pl.col(col)
+        if dtype == pl.String:
+            return c.str.strip_chars().cast(pl.Float64, strict=False)
+        if dtype.is_temporal():
+            return c.cast(pl.Int64).cast(pl.Float64)
+        return c.cast(pl.Float64)
+
+    def _text(self, frame, col: str):
+        pl = self.pl
+        dtype = frame.schema[col]
+        c = pl.col(col)
+        if dtype == pl.String:
+            return c
+        if dtype.is_temporal():
+            return pl.col("__text__" + col)
+        if dtype == pl.Boolean:
+            return pl.when(c.is_null()).then(pl.lit("nan")).when(c).then(pl.lit("True")).otherwise(pl.lit("False"))
+        return pl.when(c.is_null()).then(pl.lit("nan")).otherwise(c.cast(pl.String))
+
+    def _expr(self, frame, node: Node):
+        pl = self.pl
+        if isinstance(node, (And, Or)):
+            out = self._expr(frame, node.children[0])
+            for child in node.children[1:]:
+                out = (out & self._expr(frame, child)) if isinstance(node, And) else (out | self._expr(frame, child))
+            return out
+        if isinstance(node, FullNameIn):
+            if FULL_NAME_FIELD not in frame.columns:
+                return pl.lit(False)
+            return pl.col(FULL_NAME_FIELD).is_in([re.sub(r"\s+", " ", n.strip().upper()) for n in node.names])
+        if isinstance(node, Window):
+            name = WINDOW_PREFIX + node.window_key()
+            if name not in frame.columns:
+                return pl.lit(False)
+            c, value = pl.col(name), float(node.threshold)
+            return {">": c > value, ">=": c >= value, "<": c < value, "<=": c <= value}.get(node.op, c == value)
+        if node.column not in frame.columns:
+            return pl.lit(False)
+        c = pl.col(node.column)
+        if isinstance(node, Duplicate):
+            key = DUPLICATE_PREFIX + node.column
+            return (pl.col(key) if key in frame.columns else c).is_duplicated()
+        if isinstance(node, HighCardinality):
+            n = pl.len()
+            return pl.repeat((c.drop_nulls().n_unique() / n > 0.95) & (n > 100), n)
+        if isinstance(node, NotNull):
+            return c.is_not_null()
+        if isinstance(node, InList):
+            return self._text(frame, node.column).is_in(list(node.values))
+        if isinstance(node, Compare):
+            try:
+                value = float(node.value)
+            except ValueError:
+                if node.op == "==":
+                    return self._text(frame, node.column) == node.value
+                return pl.lit(False)
+            num = self._numeric(frame, node.column)
+            return {">": num > value, ">=": num >= value, "<": num < value, "<=": num <= value}.get(node.op, num == value)
+        raise TypeError(f"Nodo de plan no soportado: {type(node).__name__}")
+
+    def evaluate(self, df: pd.DataFrame, plans: List[Node], full_names: Callable[[], pd.Series] = None) -> List[Any]:
+        """Máscara booleana NumPy por plan, o la excepción si ese plan no se pudo traducir.
+
+        `full_names` devuelve los nombres completos ya normalizados; solo se llama si alguna regla usa `full_name in`.
+        """
+        columns = sorted(set().union(*(p.columns() for p in plans)) & set(df.columns)) if plans else []
+        needs_names = full_names is not None and any(_uses_full_name(p) for p in plans)
+        windows: Dict[str, Window] = {}
+        for plan in plans:
+            collect_windows(plan, windows)
+        duplicates = sorted(set().union(*(_duplicate_columns(p) for p in plans)) & set(df.columns)) if plans else []
+        frame = self._frame(df, columns, full_names if needs_names else None, list(windows.values()), duplicates)
+        exprs: Dict[str, Any] = {}
+        aliases: List[Any] = []
+        for plan in plans:
+            key = plan.canonical()
+            if key not in exprs:
+                try:
+                    exprs[key] = self._expr(frame, plan).fill_null(False).alias(f"r{len(exprs)}")
+                except Exception as e:  # noqa: BLE001
+                    aliases.append(e)
+                    continue
+            aliases.append(exprs[key].meta.output_name())
+        if not exprs:
+            return aliases
+        out = frame.lazy().select(list(exprs.values())).collect()
+        return [a if isinstance(a, Exception) else out[a].to_numpy() for a in aliases]
+
+
+def _duplicate_columns(node: Node) -> set:
+    if isinstance(node, Duplicate):
+        return {node.column}
+    return set().union(*(_duplicate_columns(c) for c in getattr(node, "children", ())))
+
+
+def _uses_full_name(node: Node) -> bool:
+    if isinstance(node, (And, Or)):
+        return any(_uses_full_name(c) for c in node.children)
+    return isinstance(node, FullNameIn)
+
+
+def get_backend(name: str = DEFAULT_BACKEND):
+    """Instancia del backend (`None` para la referencia pandas)."""
+    if name in (None, "", "pandas"):
+        return None
+    if name == "polars":
+        return PolarsBackend()
+    raise ValueError(f"Backend desconocido: {name} (disponibles: {', '.join(BACKENDS)})")
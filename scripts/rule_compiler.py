@@ -0,0 +1,372 @@
+"""
+Compilador de reglas de `rules_engine.md`.
+
+Convierte la expresión textual de cada regla en un plan tipado (AST) en una
+sola pasada de tokenizado + parseo descendente recursivo. El plan se construye
+una vez al cargar las reglas y se reutiliza en cada evaluación.
+
+Gramática (de menor a mayor precedencia):
+    expr      := and_expr ( ("||" | "OR") and_expr )*
+    and_expr  := primary ( ("AND" | "&&") primary )*
+    primary   := "(" expr ")" | call | predicate
+    call      := FUNC "(" IDENT ")"
+               | WFUNC "(" IDENT "," IDENT "," NUMBER [ "," IDENT ] ")" OP NUMBER
+    predicate := IDENT OP literal
+               | IDENT "in" "[" [ literal ( "," literal )* ] "]"
+               | IDENT "is" "not" "null"
+    literal   := STRING | NUMBER | IDENT
+
+Las columnas pueden calificarse con su tabla (`vehiculos.anio_small`) para el
+modo relacional.
+
+Funciones de ventana temporal (`WFUNC`): `window_count(clave, fecha, días)` y
+`window_sum(clave, fecha, días, columna)` cuentan o suman, por cada fila, las
+filas con la misma clave y fecha en los `días` anteriores (incluida ella), y se
+comparan con un umbral: `window_count(asegurado_id, fecha_siniestro, 90) >= 3`.
+"""
+import re
+from dataclasses import dataclass
+from typing import FrozenSet, List, Tuple
+
+COMPARISON_OPS = ("==", ">=", "<=", ">", "<")
+FUNCTIONS = ("duplicate", "high_cardinality")
+WINDOW_FUNCTIONS = ("window_count", "window_sum")
+FULL_NAME_COLUMN = "full_name"
+
+TOKEN_SPEC = [
+    ("WS", r"\s+"),
+    ("STRING", r"\"[^\"]*\"|'[^']*'"),
+    ("NUMBER", r"-?\d+(?:\.\d+)?(?!\w)"),
+    ("OR", r"\|\|"),
+    ("AND_SYM", r"&&"),
+    ("OP", r"==|>=|<=|>|<"),
+    ("LPAREN", r"\("),
+    ("RPAREN", r"\)"),
+    ("LBRACK", r"\["),
+    ("RBRACK", r"\]"),
+    ("COMMA", r","),
+    ("IDENT", r"\w+(?:\.\w+)*"),
+]
+TOKEN_REGEX = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in TOKEN_SPEC))
+
+
+class RuleSyntaxError(ValueError):
+    """Error de sintaxis en una expresión de regla."""
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str
+    value: str
+    pos: int
+
+
+# --- Nodos del plan ---
+
+@dataclass(frozen=True)
+class Node:
+    def columns(self) -> FrozenSet[str]:
+        return frozenset()
+
+    def canonical(self) -> str:
+        raise NotImplementedError
+
+    def can_fire(self, available: FrozenSet[str]) -> bool:
+        """Indica si la regla puede activarse con las columnas disponibles de un archivo."""
+        return self.columns() <= available
+
+
+@dataclass(frozen=True)
+class Compare(Node):
+    column: str
+    op: str
+    value: str
+
+    def columns(self) -> FrozenSet[str]:
+        return frozenset([self.column])
+
+    def canonical(self) -> str:
+        return f"{self.column} {self.op} {self.value!r}"
+
+
+@dataclass(frozen=True)
+class InList(Node):
+    column: str
+    values: Tuple[str, ...]
+
+    def columns(self) -> FrozenSet[str]:
+        return frozenset([self.column])
+
+    def canonical(self) -> str:
+        return f"{self.column} in [{', '.join(repr(v) for v in self.values)}]"
+
+
+@dataclass(frozen=True)
+class FullNameIn(Node):
+    names: Tuple[str, ...]
+
+    def canonical(self) -> str:
+        return f"{FULL_NAME_COLUMN} in [{', '.join(repr(v) for v in self.names)}]"
+
+    def can_fire(self, available: FrozenSet[str]) -> bool:
+        return FULL_NAME_COLUMN in available
+
+
+@dataclass(frozen=True)
+class NotNull(Node):
+    column: str
+
+    def columns(self) -> FrozenSet[str]:
+        return frozenset([self.column])
+
+    def canonical(self) -> str:
+        return f"{self.column} is not null"
+
+
+@dataclass(frozen=True)
+class Duplicate(Node):
+    column: str
+
+    def columns(self) -> FrozenSet[str]:
+        return frozenset([self.column])
+
+    def canonical(self) -> str:
+        return f"duplicate({self.column})"
+
+
+@dataclass(frozen=True)
+class HighCardinality(Node):
+    column: str
+
+    def columns(self) -> FrozenSet[str]:
+        return frozenset([self.column])
+
+    def canonical(self) -> str:
+        return f"high_cardinality({self.column})"
+
+
+@dataclass(frozen=True)
+class Window(Node):
+    """Conteo/suma por clave en una ventana de `days` días hacia atrás, comparado con `threshold`."""
+    func: str
+    key: str
+    date: str
+    days: int
+    value: str
+    op: str
+    threshold: str
+
+    def columns(self) -> FrozenSet[str]:
+        return frozenset(c for c in (self.key, self.date, self.value) if c)
+
+    def window_key(self) -> str:
+        """Expresión de la ventana sin el umbral (reglas con distinto umbral comparten los valores)."""
+        value = f", {self.value}" if self.value else ""
+        return f"{self.func}({self.key}, {self.date}, {self.days}{value})"
+
+    def canonical(self) -> str:
+        return f"{self.window_key()} {self.op} {self.threshold!r}"
+
+
+@dataclass(frozen=True)
+class And(Node):
+    children: Tuple[Node, ...]
+
+    def columns(self) -> FrozenSet[str]:
+        return frozenset().union(*(c.columns() for c in self.children))
+
+    def can_fire(self, available: FrozenSet[str]) -> bool:
+        return all(c.can_fire(available) for c in self.children)
+
+    def canonical(self) -> str:
+        # Orden estable de operandos: AND/|| son conmutativos
+        return "(" + " AND ".join(sorted(c.canonical() for c in self.children)) + ")"
+
+
+@dataclass(frozen=True)
+class Or(Node):
+    children: Tuple[Node, ...]
+
+    def columns(self) -> FrozenSet[str]:
+        return frozenset().union(*(c.columns() for c in self.children))
+
+    def can_fire(self, available: FrozenSet[str]) -> bool:
+        return any(c.can_fire(available) for c in self.children)
+
+    def canonical(self) -> str:
+        return "(" + " || ".join(sorted(c.canonical() for c in self.children)) + ")"
+
+
+# --- Tokenizador ---
+
+def tokenize(expr: str) -> List[Token]:
+    tokens: List[Token] = []
+    pos = 0
+    while pos < len(expr):
+        m = TOKEN_REGEX.match(expr, pos)
+        if not m:
+            raise RuleSyntaxError(f"Carácter no válido {expr[pos]!r} en posición {pos}")
+        kind = m.lastgroup
+        value = m.group()
+        if kind == "STRING":
+            value = value[1:-1]
+        elif kind == "AND_SYM":
+            kind = "AND"
+        elif kind == "IDENT" and value.upper() in ("AND", "OR"):
+            kind = value.upper() if value.upper() == "AND" else "OR"
+        if kind != "WS":
+            tokens.append(Token(kind, value, m.start()))
+        pos = m.end()
+    tokens.append(Token("EOF", "", len(expr)))
+    return tokens
+
+
+# --- Parser ---
+
+class _Parser:
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.tokens = tokenize(expr)
+        self.index = 0
+
+    def peek(self, offset: int = 0) -> Token:
+        return self.tokens[min(self.index + offset, len(self.tokens) - 1)]
+
+    def advance(self) -> Token:
+        tok = self.tokens[self.index]
+        self.index += 1
+        return tok
+
+    def error(self, tok: Token, expected: str) -> RuleSyntaxError:
+        found = repr(tok.value) if tok.kind != "EOF" else "fin de expresión"
+        return RuleSyntaxError(f"Se esperaba {expected} en posición {tok.pos}, se encontró {found}")
+
+    def expect(self, kind: str, expected: str) -> Token:
+        tok = self.peek()
+        if tok.kind != kind:
+            raise self.error(tok, expected)
+        return self.advance()
+
+    def expect_keyword(self, word: str) -> Token:
+        tok = self.peek()
+        if tok.kind != "IDENT" or tok.value.lower() != word:
+            raise self.error(tok, f"'{word}'")
+        return self.advance()
+
+    def parse(self) -> Node:
+        node = self.parse_or()
+        if self.peek().kind != "EOF":
+            raise self.error(self.peek(), "operador lógico o fin de expresión")
+        return node
+
+    def parse_or(self) -> Node:
+        children = [self.parse_and()]
+        while self.peek().kind == "OR":
+            self.advance()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(tuple(_flatten(children, Or)))
+
+    def parse_and(self) -> Node:
+        children = [self.parse_primary()]
+        while self.peek().kind == "AND":
+            self.advance()
+            children.append(self.parse_primary())
+        return children[0] if len(children) == 1 else And(tuple(_flatten(children, And)))
+
+    def parse_primary(self) -> Node:
+        tok = self.peek()
+        if tok.kind == "LPAREN":
+            self.advance()
+            node = self.parse_or()
+            self.expect("RPAREN", "')'")
+            return node
+        if tok.kind == "IDENT" and self.peek(1).kind == "LPAREN":
+            return self.parse_call()
+        if tok.kind == "IDENT":
+            return self.parse_predicate()
+        raise self.error(tok, "columna, función o '('")
+
+    def parse_call(self) -> Node:
+        name_tok = self.advance()
+        func = name_tok.value
+        if func in WINDOW_FUNCTIONS:
+            return self.parse_window(func)
+        if func not in FUNCTIONS:
+            raise RuleSyntaxError(f"Función desconocida '{func}' en posición {name_tok.pos}")
+        self.expect("LPAREN", "'('")
+        col = self.expect("IDENT", "nombre de columna").value
+        self.expect("RPAREN", "')'")
+        if func == "duplicate":
+            return Duplicate(col)
+        return HighCardinality(col)
+
+    def parse_window(self, func: str) -> Node:
+        self.expect("LPAREN", "'('")
+        key = self.expect("IDENT", "columna de clave").value
+        self.expect("COMMA", "','")
+        date = self.expect("IDENT", "columna de fecha").value
+        self.expect("COMMA", "','")
+        days_tok = self.expect("NUMBER", "ventana en días")
+        if not days_tok.value.isdigit() or int(days_tok.value) <= 0:
+            raise RuleSyntaxError(f"La ventana debe ser un número entero de días > 0 en posición {days_tok.pos}")
+        value = ""
+        if func == "window_sum":
+            self.expect("COMMA", "','")
+            value = self.expect("IDENT", "columna a sumar").value
+        self.expect("RPAREN", "')'")
+        op = self.expect("OP", "operador de comparación").value
+        threshold = self.expect("NUMBER", "umbral numérico").value
+        return Window(func, key, date, int(days_tok.value), value, op, threshold)
+
+    def parse_predicate(self) -> Node:
+        col = self.advance().value
+        tok = self.peek()
+        if tok.kind == "OP":
+            op = self.advance().value
+            return Compare(col, op, self.parse_literal())
+        if tok.kind == "IDENT" and tok.value.lower() == "in":
+            self.advance()
+            values = self.parse_list()
+            if col == FULL_NAME_COLUMN:
+                return FullNameIn(values)
+            return InList(col, values)
+        if tok.kind == "IDENT" and tok.value.lower() == "is":
+            self.advance()
+            self.expect_keyword("not")
+            self.expect_keyword("null")
+            return NotNull(col)
+        raise self.error(tok, "operador de comparación, 'in' o 'is not null'")
+
+    def parse_list(self) -> Tuple[str, ...]:
+        self.expect("LBRACK", "'['")
+        values: List[str] = []
+        if self.peek().kind != "RBRACK":
+            values.append(self.parse_literal())
+            while self.peek().kind == "COMMA":
+                self.advance()
+                values.append(self.parse_literal())
+        self.expect("RBRACK", "']'")
+        return tuple(values)
+
+    def parse_literal(self) -> str:
+        tok = self.peek()
+        if tok.kind in ("STRING", "NUMBER", "IDENT"):
+            return self.advance().value
+        raise self.error(tok, "valor literal")
+
+
+def _flatten(children: List[Node], cls: type) -> List[Node]:
+    out: List[Node] = []
+    for child in children:
+        if isinstance(child, cls):
+            out.extend(child.children)
+        else:
+            out.append(child)
+    return out
+
+
+def compile_expr(expr: str) -> Node:
+    """Compila una expresión de regla a su plan. Lanza RuleSyntaxError si es inválida."""
+    if not expr or not expr.strip():
+        raise RuleSyntaxError("Expresión vacía")
+    return _Parser(expr).parse()
@@ -0,0 +1,128 @@
+"""
+Registro persistente del esquema inferido de cada tabla del dataset.
+
+`data_loader.py` infiere los tipos de cada CSV al perfilarlo y los guarda en
+`schema.json` (por defecto dentro del directorio del dataset). Los cargadores
+(`load_unified`, `load_relational`, `unify_datasets`, el scoring en streaming)
+leen después cada CSV con esos tipos explícitos (`dtype`) y convierten las
+fechas con su formato, en lugar de volver a inferir en cada carga.
+
+Solo se fijan tipos equivalentes a los que inferiría pandas (enteros sin
+faltantes, float, bool, texto); las columnas mixtas se siguen infiriendo. Si
+los datos dejan de encajar con el esquema (p.ej. texto en una columna int), la
+tabla se lee con inferencia y se marca como desactualizada.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+SCHEMA_FILE_NAME = "schema.json"
+SCHEMA_VERSION = 1
+
+
+def table_name(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def table_schema(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Esquema de una tabla a partir de su perfil (`data_loader.profile_csv`)."""
+    columns = {}
+    for c in profile["columns_detail"]:
+        columns[c["name"]] = {
+            "type": c["dtype"],
+            "dtype": c.get("read_dtype"),
+            "date_format": c.get("date_format"),
+            "is_id": bool(c["is_id"]),
+        }
+    return {"file": profile["file_name"], "rows": profile["rows"], "columns": columns}
+
+
+class SchemaRegistry:
+    """Esquemas por tabla (nombre de archivo sin extensión)."""
+
+    def __init__(self, path: str = None, tables: Dict[str, Dict[str, Any]] = None):
+        self.path = path
+        self.tables: Dict[str, Dict[str, Any]] = tables or {}
+        self.stale: Dict[str, str] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "SchemaRegistry":
+        """Registro guardado en `path` (vacío si no existe o no se puede leer)."""
+        if not path or not os.path.isfile(path):
+            return cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(path)
+        if data.get("version") != SCHEMA_VERSION:
+            return cls(path)
+        return cls(path, data.get("tables", {}))
+
+    @classmethod
+    def for_dataset(cls, dataset_dir: str, path: str = None) -> "SchemaRegistry":
+        return cls.load(path or os.path.join(dataset_dir, SCHEMA_FILE_NAME))
+
+    def __bool__(self) -> bool:
+        return bool(self.tables)
+
+    def update(self, profile: Dict[str, Any]) -> None:
+        self.tables[table_name(profile["file_name"])] = table_schema(profile)
+
+    def save(self, path: str = None) -> str:
+        path = path or self.path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": SCHEMA_VERSION, "tables": self.tables}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+        self.path = path
+        return path
+
+    def signature(self) -> str:
+        """Huella del contenido (distingue entradas de caché leídas con distintos esquemas)."""
+        payload = json.dumps(self.tables, sort_keys=True).encode("utf-8")
+        return hashlib.sha1(payload).hexdigest()[:12]
+
+    def cache_variant(self, variant: str) -> str:
+        return f"{variant}:schema-{self.signature()}" if self.tables else variant
+
+    def columns(self, path: str) -> Dict[str, Dict[str, Any]]:
+        return self.tables.get(table_name(path), {}).get("columns", {})
+
+    def dtypes(self, path: str) -> Dict[str, str]:
+        """`dtype` explícito por columna para `pd.read_csv` (fechas como texto, se convierten después)."""
+        return {col: spec["dtype"] for col, spec in self.columns(path).items() if spec.get("dtype")}
+
+    def parse_dates(self, path: str, df: pd.DataFrame) -> pd.DataFrame:
+        """Convierte a datetime las columnas de fecha con formato conocido (si alguna no encaja, queda como texto)."""
+        for col, spec in self.columns(path).items():
+            fmt = spec.get("date_format")
+            if spec.get("type") != "date" or not fmt or col not in df.columns:
+                continue
+            try:
+                df[col] = pd.to_datetime(df[col], format=fmt)
+            except (ValueError, TypeError):
+                self.stale[table_name(path)] = f"{col}: fechas fuera del formato {fmt}"
+        return df
+
+    def read(self, read: Callable[..., pd.DataFrame], path: str, **kwargs) -> pd.DataFrame:
+        """`read(path, dtype=..., **kwargs)` con los tipos y fechas del esquema; si no encajan, se infiere."""
+        dtypes = self.dtypes(path)
+        if not dtypes:
+            return self.parse_dates(path, read(path, **kwargs))
+        try:
+            df = read(path, dtype=dtypes, **kwargs)
+        except Exception as e:  # noqa: BLE001
+            self.stale[table_name(path)] = str(e)
+            return read(path, **kwargs)
+        return self.parse_dates(path, df)
+
+    def stale_report(self) -> List[str]:
+        return [f"  - {name}: {reason}" for name, reason in sorted(self.stale.items())]
+
@@ -0,0 +1,158 @@
+"""
+Perfilado opcional del motor de scoring por fase y por regla.
+
+`ScoringProfiler` registra, para cada fase (carga, parseo, reglas, watchlist,
+niveles, agregación, exportación...) y para cada regla, el tiempo de pared, las
+filas procesadas y el pico de memoria asignada por encima de la existente al
+empezar (`tracemalloc`, que también registra las asignaciones de NumPy/pandas).
+
+Sin profiler (`None`) las funciones de `risk_scoring` no miden nada; `measure`
+devuelve entonces un contexto vacío.
+"""
+import contextlib
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List
+
+
+class ScoringProfiler:
+    """Tiempo, filas y pico de memoria por fase y por regla (`start()` activa `tracemalloc` si no lo estaba)."""
+
+    def __init__(self, track_memory: bool = True):
+        self.track_memory = track_memory
+        self.phases: List[Dict[str, Any]] = []
+        self.rules: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stack: List[Dict[str, int]] = []
+        self._started_tracing = False
+        self._start = time.perf_counter()
+
+    def start(self) -> "ScoringProfiler":
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def stop(self) -> None:
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def _measure(self, exclusive: bool) -> Iterator[Dict[str, Any]]:
+        # El pico de tracemalloc es global: las mediciones anidadas lo reinician y devuelven su
+        # máximo a la medición exterior; las concurrentes (shards en hilos) no miden memoria.
+        sample: Dict[str, Any] = {}
+        frame = None
+        with self._lock:
+            if exclusive and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                if self._stack:
+                    self._stack[-1]["carry"] = max(self._stack[-1]["carry"], peak)
+                tracemalloc.reset_peak()
+                frame = {"base": current, "carry": 0}
+                self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield sample
+        finally:
+            sample["seconds"] = time.perf_counter() - start
+            sample["peak_mb"] = None
+            if frame is not None:
+                with self._lock:
+                    peak = max(frame["carry"], tracemalloc.get_traced_memory()[1])
+                    self._stack.pop()
+                    if self._stack:
+                        self._stack[-1]["carry"] = max(self._stack[-1]["carry"], peak)
+                    sample["peak_mb"] = round(max(peak - frame["base"], 0) / 1_048_576, 3)
+
+    @contextlib.contextmanager
+    def phase(self, name: str, rows: int = None) -> Iterator[Dict[str, Any]]:
+        """Mide una fase; `rows` puede fijarse al entrar o después (`sample["rows"] = n`)."""
+        with self._measure(exclusive=True) as sample:
+            sample["rows"] = rows
+            yield sample
+        record = {"name": name, "seconds": round(sample["seconds"], 6), "rows": sample["rows"],
+                  "peak_mb": sample["peak_mb"]}
+        with self._lock:
+            self.phases.append(record)
+
+    @contextlib.contextmanager
+    def rule(self, expr: str, rows: int, exclusive: bool = True) -> Iterator[Dict[str, Any]]:
+        """Mide la evaluación de una regla; las mediciones por shard se acumulan por expresión."""
+        with self._measure(exclusive=exclusive) as sample:
+            yield sample
+        with self._lock:
+            record = self.rules.setdefault(expr, {"expr": expr, "seconds": 0.0, "rows": 0, "peak_mb": None,
+                                                  "count": 0, "evaluations": 0})
+            record["seconds"] = round(record["seconds"] + sample["seconds"], 6)
+            record["rows"] += rows
+            record["count"] += int(sample.get("count", 0))
+            record["evaluations"] += 1
+            if sample["peak_mb"] is not None:
+                record["peak_mb"] = max(record["peak_mb"] or 0.0, sample["peak_mb"])
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas en formato serializable (JSON)."""
+        return {
+            "total_seconds": round(time.perf_counter() - self._start, 6),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "memory_tracking": self.track_memory,
+            "phases": list(self.phases),
+            "rules": sorted(self.rules.values(), key=lambda r: -r["seconds"]),
+        }
+
+
+def measure(profiler: ScoringProfiler, name: str, rows: int = None):
+    """`profiler.phase(...)` o un contexto vacío si no se está perfilando."""
+    if profiler is None:
+        return contextlib.nullcontext({})
+    return profiler.phase(name, rows)
+
+
+def measure_rule(profiler: ScoringProfiler, expr: str, rows: int, exclusive: bool = True):
+    """`profiler.rule(...)` o un contexto vacío si no se está perfilando."""
+    if profiler is None:
+        return contextlib.nullcontext({})
+    return profiler.rule(expr, rows, exclusive)
+
+
+def _fmt(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.4f}" if value < 10 else f"{value:.1f}"
+    return str(value)
+
+
+def build_profile_report(metrics: Dict[str, Any]) -> str:
+    lines = ["# Perfil de scoring", ""]
+    lines.append(f"- Tiempo total: {metrics['total_seconds']:.3f} s")
+    lines.append(f"- RSS máximo del proceso: {metrics['max_rss_mb']} MB")
+    if not metrics.get("memory_tracking"):
+        lines.append("- Memoria por fase: desactivada")
+    lines += ["", "## Fases", "", "| fase | segundos | filas | pico MB |", "|------|----------|-------|---------|"]
+    for p in metrics["phases"]:
+        lines.append(f"| {p['name']} | {_fmt(p['seconds'])} | {_fmt(p['rows'])} | {_fmt(p['peak_mb'])} |")
+    lines += ["", "## Reglas (por tiempo)", "", "| regla | segundos | filas | activaciones | pico MB |",
+              "|-------|----------|-------|--------------|---------|"]
+    for r in metrics["rules"]:
+        expr = r["expr"].replace("|", "\\|")
+        lines.append(f"| `{expr}` | {_fmt(r['seconds'])} | {_fmt(r['rows'])} | {r['count']} | {_fmt(r['peak_mb'])} |")
+    return "\n".join(lines) + "\n"
+
+
+def save_profile(metrics: Dict[str, Any], path: str) -> None:
+    """Guarda el perfil en JSON o Markdown según la extensión (`.json` / otra)."""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
+        else:
+            f.write(build_profile_report(metrics))
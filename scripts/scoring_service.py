@@ -0,0 +1,394 @@
+"""
+Servicio local residente de scoring (HTTP sobre TCP o socket Unix, con asyncio).
+
+Carga el dataset una sola vez y mantiene en memoria las máscaras de cada regla,
+el score por fila y el índice de nombres. Un vigilante revisa periódicamente
+`rules_engine.md` y `watchlist.csv`:
+- si cambian las reglas, solo se evalúan las expresiones nuevas (las máscaras
+  de expresiones ya vistas se reutilizan; un cambio de score no reevalúa nada);
+- si cambia la watchlist, solo se recalcula el score de watchlist por fila.
+En ambos casos se rearma el total por fila, el agregado por nombre y el índice,
+y el nuevo estado reemplaza al anterior de forma atómica mientras se siguen
+atendiendo consultas.
+
+Rutas:
+- GET  /health                       estado del servicio
+- GET  /name?q=<nombre>              perfil de riesgo de un nombre
+- POST /names  {"names": [...]}      consulta por lotes
+- GET  /record?pos=<n>               registro por posición en el frame unificado
+- GET  /record?source=<csv>&row=<n>  registro por archivo y fila dentro del archivo
+- POST /reload                       fuerza la revisión de reglas y watchlist
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from activation_store import ActivationStore
+from compact_frame import format_memory_report, memory_report
+from dataset_cache import DatasetCache, file_fingerprint
+from name_index import build_name_index
+from risk_scoring import (
+    build_full_name_series,
+    bucket_score,
+    compile_rule,
+    evaluate_rules,
+    find_name_columns,
+    load_unified,
+    load_watchlist,
+    name_totals,
+    normalize_names,
+    parse_rules,
+    query_name,
+    query_names,
+    score_watchlist,
+)
+
+DEFAULT_PORT = 8765
+DEFAULT_POLL_INTERVAL = 1.0
+MAX_BODY_BYTES = 10 << 20
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def _fingerprint(path: str) -> Tuple[int, int]:
+    if not path or not os.path.isfile(path):
+        return None
+    fp = file_fingerprint(path)
+    return fp["size"], fp["mtime_ns"]
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, (np.generic,)):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+class ScoringState:
+    """Dataset cargado, máscaras por expresión canónica y la instantánea vigente de scores."""
+
+    def __init__(self, df: pd.DataFrame, rules_path: str, watchlist_path: str = None):
+        self.df = df
+        self.rules_path = rules_path
+        self.watchlist_path = watchlist_path
+        name_cols = find_name_columns(df)
+        self.has_names = bool(name_cols[0])
+        self.full_name_series = build_full_name_series(df, name_cols).fillna("")
+        self.full_name_series.index = df.index
+        self.norm_names = normalize_names(self.full_name_series) if self.has_names else None
+        sources = df["__source_file"] if "__source_file" in df.columns else pd.Series("", index=df.index)
+        # Los archivos se concatenan contiguos: primera posición de cada uno en el frame unificado
+        first = sources.drop_duplicates()
+        self.source_offsets = dict(zip(first.tolist(), sources.index.get_indexer(first.index).tolist()))
+        self.source_sizes = sources.value_counts().to_dict()
+        self.mask_cache: Dict[str, np.ndarray] = {}
+        self.mask_errors: Dict[str, str] = {}
+        self.rules: List[Dict[str, Any]] = []
+        self.watchlist: Dict[str, Any] = {}
+        self.watchlist_scores = np.zeros(len(df), dtype=np.int64)
+        self.rules_fp = None
+        self.watchlist_fp = None
+        self.snapshot: Dict[str, Any] = None
+        self.loaded_at = time.time()
+        self._lock = threading.Lock()
+
+    def changed(self) -> bool:
+        return _fingerprint(self.rules_path) != self.rules_fp or _fingerprint(self.watchlist_path) != self.watchlist_fp
+
+    def _rule_key(self, rule: Dict[str, Any]) -> str:
+        if rule.get("error"):
+            return None
+        try:
+            return compile_rule(rule).canonical()
+        except Exception:  # noqa: BLE001
+            return None
+
+    def _refresh_rules(self) -> Tuple[int, int]:
+        self.rules = parse_rules(self.rules_path)
+        keys = [self._rule_key(r) for r in self.rules]
+        pending = {k: r for k, r in zip(keys, self.rules) if k is not None and k not in self.mask_cache and k not in self.mask_errors}
+        if pending:
+            scratch = np.zeros(len(self.df), dtype=np.int64)
+            evaluated = evaluate_rules(self.df, list(pending.values()), self.full_name_series, scratch, keep_masks=True)
+            errors = {ir["expr"]: ir["error"] for ir in evaluated["ignored"]}
+            for (key, rule), mask in zip(pending.items(), evaluated["masks"]):
+                if mask is None:
+                    self.mask_errors[key] = errors.get(rule["expr"], "")
+                else:
+                    self.mask_cache[key] = mask.to_numpy(dtype=bool, na_value=False)
+        live = {k for k in keys if k is not None}
+        for key in list(self.mask_cache):
+            if key not in live:
+                del self.mask_cache[key]
+        for key in list(self.mask_errors):
+            if key not in live:
+                del self.mask_errors[key]
+        return len(pending), len(live) - len(pending)
+
+    def _refresh_watchlist(self) -> None:
+        self.watchlist = load_watchlist(self.watchlist_path) if self.watchlist_path else {}
+        if self.watchlist and self.has_names:
+            self.watchlist_scores = score_watchlist(self.full_name_series, self.watchlist).to_numpy(dtype=np.int64)
+        else:
+            self.watchlist_scores = np.zeros(len(self.df), dtype=np.int64)
+
+    def _build_snapshot(self) -> Dict[str, Any]:
+        total = np.zeros(len(self.df), dtype=np.int64)
+        store = ActivationStore(len(self.df), self.rules)
+        activations: List[Dict[str, Any]] = []
+        ignored: List[Dict[str, Any]] = []
+        for i, rule in enumerate(self.rules):
+            key = self._rule_key(rule)
+            mask = self.mask_cache.get(key) if key is not None else None
+            if mask is None:
+                ignored.append({"expr": rule["expr"], "error": rule.get("error") or self.mask_errors.get(key, "")})
+                continue
+            count = int(mask.sum())
+            if count:
+                total += mask * rule["score"]
+                store.add(i, mask, count=count)
+                activations.append({"expr": rule["expr"], "score": rule["score"], "count": count})
+        wl_count = int((self.watchlist_scores > 0).sum())
+        if wl_count:
+            total += self.watchlist_scores
+            activations.append({"expr": "watchlist_match", "score": "variable", "count": wl_count})
+            store.add(store.add_entry("watchlist_match", "variable"), self.watchlist_scores > 0, count=wl_count)
+        store.freeze()
+        rows = pd.DataFrame({"__risk_score": total}, index=self.df.index)
+        if "__source_file" in self.df.columns:
+            rows["__source_file"] = self.df["__source_file"]
+        if self.has_names:
+            rows["__full_name"] = self.norm_names
+            agg = name_totals(rows)
+            agg["risk_level"] = agg["risk_score"].apply(bucket_score)
+        else:
+            agg = pd.DataFrame(columns=["full_name", "risk_score", "risk_level"])
+        index = build_name_index({"row_scores": rows, "name_scores": agg, "activations": activations,
+                                  "activation_store": store})
+        return {
+            "rules": list(self.rules),
+            "store": store,
+            "total": total,
+            "watchlist": self.watchlist,
+            "watchlist_scores": self.watchlist_scores,
+            "activations": activations,
+            "ignored": ignored,
+            "index": index,
+            "built_at": time.time(),
+        }
+
+    def refresh(self, force: bool = False) -> Dict[str, Any]:
+        """Recalcula lo que afectan los cambios en reglas/watchlist y publica una nueva instantánea."""
+        with self._lock:
+            start = time.perf_counter()
+            rules_fp, watchlist_fp = _fingerprint(self.rules_path), _fingerprint(self.watchlist_path)
+            rules_changed = force or self.snapshot is None or rules_fp != self.rules_fp
+            watchlist_changed = force or self.snapshot is None or watchlist_fp != self.watchlist_fp
+            if not (rules_changed or watchlist_changed):
+                return {"changed": False}
+            evaluated, reused = 0, 0
+            if rules_changed:
+                self.rules_fp = rules_fp
+                evaluated, reused = self._refresh_rules()
+            if watchlist_changed:
+                self.watchlist_fp = watchlist_fp
+                self._refresh_watchlist()
+            self.snapshot = self._build_snapshot()
+            return {
+                "changed": True,
+                "rules_reloaded": rules_changed,
+                "rules_evaluated": evaluated,
+                "rules_reused": reused,
+                "watchlist_reloaded": watchlist_changed,
+                "seconds": round(time.perf_counter() - start, 4),
+            }
+
+    def record(self, pos: int) -> Dict[str, Any]:
+        snap = self.snapshot
+        if pos < 0 or pos >= len(self.df):
+            return {"error": "No"}
+        row = self.df.iloc[pos]
+        score = int(snap["total"][pos])
+        fired = [r for r in snap["store"].row_rules(pos) if r["expr"] != "watchlist_match"]
+        wl_score = int(snap["watchlist_scores"][pos])
+        if wl_score > 0:
+            fired.append({"expr": "watchlist_match", "score": wl_score})
+        return {
+            "pos": pos,
+            "source_file": _json_value(row.get("__source_file")),
+            "full_name": self.norm_names.iloc[pos] if self.has_names else "",
+            "risk_score": score,
+            "risk_level": bucket_score(score),
+            "rules": fired,
+            "record": {str(k): _json_value(v) for k, v in row.items() if k != "__source_file" and not pd.isna(v)},
+        }
+
+
+class ScoringService:
+    def __init__(self, state: ScoringState, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.state = state
+        self.poll_interval = poll_interval
+
+    async def _refresh(self, force: bool = False) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        summary = await loop.run_in_executor(None, self.state.refresh, force)
+        if summary.get("changed"):
+            print(
+                f"Recarga en {summary['seconds']} s: "
+                f"reglas {'recargadas' if summary['rules_reloaded'] else 'sin cambios'} "
+                f"({summary['rules_evaluated']} evaluadas, {summary['rules_reused']} reutilizadas), "
+                f"watchlist {'recargada' if summary['watchlist_reloaded'] else 'sin cambios'}",
+                flush=True,
+            )
+        return summary
+
+    async def watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if self.state.changed():
+                    await self._refresh()
+            except Exception as e:  # noqa: BLE001
+                # Un archivo a medio guardar no debe tumbar el servicio: se reintenta en el próximo ciclo
+                print(f"[ERROR DE RECARGA] {e}", flush=True)
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, Any]:
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        snap = self.state.snapshot
+        if url.path == "/health":
+            return 200, {
+                "status": "ok",
+                "rows": len(self.state.df),
+                "names": len(snap["index"]),
+                "rules": len(snap["rules"]),
+                "ignored": len(snap["ignored"]),
+                "watchlist": len(snap["watchlist"]),
+                "activations": snap["activations"],
+                "loaded_at": self.state.loaded_at,
+                "built_at": snap["built_at"],
+            }
+        if url.path == "/name":
+            if "q" not in params:
+                return 400, {"error": "Falta el parámetro q"}
+            res = query_name(None, params["q"], snap["watchlist"], snap["index"])
+            return (404 if "error" in res else 200), res
+        if url.path == "/names":
+            if method != "POST":
+                return 405, {"error": "Usar POST"}
+            payload = json.loads(body.decode("utf-8") or "{}")
+            names = payload.get("names", []) if isinstance(payload, dict) else payload
+            return 200, query_names(snap["index"], [str(n) for n in names], snap["watchlist"])
+        if url.path == "/record":
+            try:
+                if "pos" in params:
+                    pos = int(params["pos"])
+                else:
+                    source, row = params["source"], int(params["row"])
+                    if source not in self.state.source_offsets or not 0 <= row < self.state.source_sizes[source]:
+                        return 404, {"error": "No"}
+                    pos = self.state.source_offsets[source] + row
+            except (KeyError, ValueError):
+                return 400, {"error": "Usar pos=<n> o source=<csv>&row=<n>"}
+            res = self.state.record(pos)
+            return (404 if "error" in res else 200), res
+        if url.path == "/reload":
+            if method != "POST":
+                return 405, {"error": "Usar POST"}
+            return 200, await self._refresh(force=params.get("force") == "1")
+        return 404, {"error": f"Ruta desconocida: {url.path}"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            headers: Dict[str, str] = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            length = min(int(headers.get("content-length", 0) or 0), MAX_BODY_BYTES)
+            body = await reader.readexactly(length) if length else b""
+            parts = request_line.split(" ")
+            if len(parts) < 2:
+                status, payload = 400, {"error": "Solicitud inválida"}
+            else:
+                status, payload = await self.dispatch(parts[0].upper(), parts[1], body)
+        except (ValueError, json.JSONDecodeError) as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:  # noqa: BLE001
+            status, payload = 500, {"error": str(e)}
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        try:
+            writer.write(head.encode("latin-1") + data)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int, socket_path: str = None) -> None:
+        await self._refresh(force=True)
+        if socket_path:
+            server = await asyncio.start_unix_server(self.handle, path=socket_path)
+            where = f"unix:{socket_path}"
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            where = f"http://{host}:{port}"
+        print(f"Servicio de scoring escuchando en {where} ({len(self.state.df)} filas)", flush=True)
+        watcher = asyncio.create_task(self.watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Servicio local de scoring con recarga en caliente de reglas y watchlist")
+    p.add_argument("--dataset-dir", default="dataset", help="Directorio de CSVs")
+    p.add_argument("--rules", default="rules_engine.md", help="Archivo markdown de reglas")
+    p.add_argument("--watchlist", default=None, help="Archivo CSV watchlist (full_name, watchlist_score, reason)")
+    p.add_argument("--host", default="127.0.0.1", help="Dirección de escucha HTTP")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT, help="Puerto HTTP")
+    p.add_argument("--socket", default=None, help="Ruta de socket Unix (en lugar de TCP)")
+    p.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="Segundos entre revisiones de reglas y watchlist")
+    p.add_argument("--cache-dir", default=None, help="Directorio de caché Parquet de los CSV")
+    p.add_argument("--workers", type=int, default=1, help="Archivos leídos en paralelo al iniciar")
+    p.add_argument("--compact", action="store_true", help="Mantiene el dataset residente en formato compacto (categorías, enteros pequeños)")
+    return p.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    cache = DatasetCache(args.cache_dir) if args.cache_dir else None
+    # Se cargan todas las columnas: las reglas editadas pueden referenciar columnas nuevas
+    df = load_unified(args.dataset_dir, None, cache, args.workers, compact=args.compact)
+    if cache is not None:
+        print(cache.summary())
+    if args.compact:
+        print(format_memory_report(memory_report(df, df.attrs.get("read_memory", {}))))
+    service = ScoringService(ScoringState(df, args.rules, args.watchlist), args.poll_interval)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        print("Servicio detenido")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main(sys.argv[1:]))
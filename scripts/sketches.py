@@ -0,0 +1,128 @@
+"""
+Resúmenes aproximados y combinables para perfilar archivos en streaming.
+
+- `hash_values` / `hash_rows`: hash de 64 bits estable entre bloques (5 y 5.0
+  coinciden aunque un bloque se lea como int y otro como float).
+- `DistinctSketch`: valores distintos exactos hasta `exact_limit` hashes y,
+  a partir de ahí, estimación HyperLogLog (error típico 1.04 / sqrt(2^precision)).
+  Dos sketches se combinan con `merge` (p.ej. perfiles por shard).
+- `Reservoir`: muestra uniforme de `k` filas de un flujo de longitud desconocida.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+NULL_HASH = np.uint64(0x9E3779B97F4A7C15)
+ROW_PRIME = np.uint64(1099511628211)
+
+
+def hash_values(series: pd.Series) -> np.ndarray:
+    """Hash uint64 por valor; numéricos como float64 y el resto por su texto."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        hashed = pd.util.hash_array(values)
+        hashed[np.isnan(values)] = NULL_HASH
+        return hashed
+    mask = series.isna().to_numpy()
+    hashed = pd.util.hash_array(series.astype(str).to_numpy(dtype=object))
+    hashed[mask] = NULL_HASH
+    return hashed
+
+
+def hash_rows(df: pd.DataFrame) -> np.ndarray:
+    """Hash uint64 por fila combinando los hashes de columna en orden."""
+    out = np.zeros(len(df), dtype=np.uint64)
+    for col in df.columns:
+        out = (out ^ hash_values(df[col])) * ROW_PRIME
+    return out
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Longitud en bits de enteros uint64 (frexp es exacto por mitades de 32 bits)."""
+    hi = (values >> np.uint64(32)).astype(np.float64)
+    lo = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+class DistinctSketch:
+    """Conteo de distintos: exacto hasta `exact_limit`, HyperLogLog después."""
+
+    def __init__(self, precision: int = 14, exact_limit: int = 100_000):
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+        self.exact: Optional[np.ndarray] = np.empty(0, dtype=np.uint64)
+
+    @property
+    def is_exact(self) -> bool:
+        return self.exact is not None
+
+    def update(self, hashes: np.ndarray) -> None:
+        if not len(hashes):
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        if self.exact is not None:
+            self.exact = np.union1d(self.exact, hashes)
+            if len(self.exact) > self.exact_limit:
+                self.exact = None
+        p = self.precision
+        idx = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        rho = ((64 - p) - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rho)
+
+    def merge(self, other: "DistinctSketch") -> "DistinctSketch":
+        if other.precision != self.precision:
+            raise ValueError("No se pueden combinar sketches con distinta precisión")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        if self.exact is not None and other.exact is not None:
+            self.exact = np.union1d(self.exact, other.exact)
+            if len(self.exact) > self.exact_limit:
+                self.exact = None
+        else:
+            self.exact = None
+        return self
+
+    def estimate(self) -> int:
+        if self.exact is not None:
+            return int(len(self.exact))
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            raw = m * np.log(m / zeros)
+        return int(round(raw))
+
+
+class Reservoir:
+    """Muestra aleatoria uniforme de `k` filas (algoritmo R vectorizado por bloque)."""
+
+    def __init__(self, k: int = 5, seed: int = 0):
+        self.k = k
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+        self.slots: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+
+    def update(self, df: pd.DataFrame) -> None:
+        n = len(df)
+        if not n or not self.k:
+            return
+        pos = np.arange(self.seen, self.seen + n)
+        self.seen += n
+        # La fila i ocupa la ranura j ~ U[0, i] si j < k (las k primeras llenan las ranuras en orden)
+        slots = np.where(pos < self.k, pos, self.rng.integers(0, pos + 1))
+        keep = np.flatnonzero(slots < self.k)
+        if not len(keep):
+            return
+        # Dentro del bloque, la última fila que cae en una ranura es la que queda
+        chosen = pd.DataFrame({"slot": slots[keep], "row": keep}).drop_duplicates("slot", keep="last")
+        rows = chosen["row"].to_numpy()
+        records = df.iloc[rows].to_dict(orient="records")
+        for slot, position, record in zip(chosen["slot"].tolist(), pos[rows].tolist(), records):
+            self.slots[slot] = (position, record)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Filas de la muestra en el orden en que aparecen en el archivo."""
+        return [record for _, record in sorted(self.slots.values(), key=lambda item: item[0])]
@@ -0,0 +1,254 @@
+"""
+Scoring fuera de memoria: procesa los CSV por bloques con memoria acotada.
+
+Dos pasadas sobre los archivos:
+1. Se leen por bloques solo las columnas de `duplicate()` / `high_cardinality()`
+   y se acumulan conteos por clave (memoria proporcional a claves distintas).
+2. Se puntúa cada bloque con esos conteos globales y el resultado por fila se
+   escribe en Parquet por grupos de filas. El agregado por nombre se mantiene en
+   memoria o, con `--spill-dir`, se reparte en particiones por hash en disco y se
+   reduce partición a partición al final.
+"""
+import argparse
+import codecs
+import os
+import shutil
+import sys
+import zlib
+from typing import Any, Dict, Iterator, List, Set
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset_files import is_parquet, iter_parquet_chunks, list_data_files
+from global_stats import NULL_KEY, GlobalStats, global_columns, key_strings
+from risk_scoring import (
+    bucket_score,
+    compute_scores,
+    is_name_column,
+    load_watchlist,
+    normalize_name,
+    parse_rules,
+    read_csv_header,
+    rule_columns,
+    schema_from_args,
+)
+from schema_registry import SchemaRegistry
+
+DEFAULT_CHUNKSIZE = 100_000
+DEFAULT_SPILL_PARTITIONS = 64
+ROW_SCHEMA = pa.schema([
+    ("__source_file", pa.string()),
+    ("__row", pa.int64()),
+    ("__full_name", pa.string()),
+    ("__risk_score", pa.int64()),
+    ("__risk_level", pa.string()),
+])
+
+
+def detect_encoding(path: str, block_size: int = 1 << 20) -> str:
+    """Valida UTF-8 de forma incremental (sin cargar el archivo) o cae a ISO-8859-1."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                decoder.decode(block)
+            decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "ISO-8859-1"
+    return "utf-8"
+
+
+def iter_chunks(path: str, usecols: List[str], chunksize: int, encoding: str,
+                schema: SchemaRegistry = None) -> Iterator[pd.DataFrame]:
+    if not usecols:
+        usecols = None
+    if is_parquet(path):
+        yield from iter_parquet_chunks(path, usecols, chunksize)
+        return
+    dtype = schema.dtypes(path) if schema else None
+    reader = pd.read_csv(path, encoding=encoding, usecols=usecols, chunksize=chunksize, on_bad_lines='skip',
+                         dtype=dtype or None)
+    try:
+        for chunk in reader:
+            yield schema.parse_dates(path, chunk) if schema else chunk
+    except ValueError as e:
+        if not dtype:
+            raise
+        # A mitad del flujo no se puede volver a inferir sin repetir los bloques ya procesados
+        raise SystemExit(f"{os.path.basename(path)} no encaja con el esquema ({e}); "
+                         "regenerarlo con data_loader.py o usar --no-schema")
+
+
+class NameAggregator:
+    """Suma de score por nombre, en memoria o con particiones en disco."""
+
+    def __init__(self, spill_dir: str = None, partitions: int = DEFAULT_SPILL_PARTITIONS):
+        self.spill_dir = spill_dir
+        self.partitions = partitions
+        self.totals = pd.Series(dtype="int64")
+        if spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            os.makedirs(spill_dir)
+
+    def add(self, names: pd.Series, scores: pd.Series) -> None:
+        mask = names != ""
+        partial = scores[mask].groupby(names[mask]).sum()
+        if partial.empty:
+            return
+        if not self.spill_dir:
+            self.totals = self.totals.add(partial, fill_value=0).astype("int64")
+            return
+        part_ids = [zlib.crc32(n.encode("utf-8")) % self.partitions for n in partial.index]
+        frame = partial.rename("risk_score").rename_axis("full_name").reset_index()
+        for part, group in frame.groupby(pd.Series(part_ids, index=frame.index)):
+            path = os.path.join(self.spill_dir, f"part_{part:04d}.csv")
+            group.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+    def result(self) -> pd.DataFrame:
+        if not self.spill_dir:
+            out = self.totals.rename("risk_score").rename_axis("full_name").reset_index()
+        else:
+            parts = []
+            for entry in sorted(os.listdir(self.spill_dir)):
+                part = pd.read_csv(os.path.join(self.spill_dir, entry), keep_default_na=False)
+                parts.append(part.groupby("full_name", as_index=False)["risk_score"].sum())
+            out = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["full_name", "risk_score"])
+        out["risk_level"] = out["risk_score"].apply(bucket_score)
+        return out
+
+
+def collect_global_stats(sources: List[str], encodings: Dict[str, str], columns: Set[str], chunksize: int,
+                         schema: SchemaRegistry = None) -> GlobalStats:
+    """Primera pasada: conteos por clave de las columnas globales y total de filas."""
+    stats = GlobalStats({c: {} for c in columns}, 0)
+    empty = pd.Series([], dtype=object)
+    for path in sources:
+        header = read_csv_header(path)
+        usecols = [c for c in header if c in columns] or header[:1]
+        for chunk in iter_chunks(path, usecols, chunksize, encodings[path], schema):
+            stats.total_rows += len(chunk)
+            for col in columns:
+                keys = key_strings(chunk[col]) if col in chunk.columns else pd.Series([NULL_KEY] * len(chunk))
+                stats.update(col, empty, keys)
+    return stats
+
+
+def stream_scores(dataset_dir: str, rules: List[Dict[str, Any]], watchlist: Dict[str, Any], output: str,
+                  chunksize: int = DEFAULT_CHUNKSIZE, spill_dir: str = None,
+                  schema: SchemaRegistry = None) -> Dict[str, Any]:
+    files = list_data_files(dataset_dir)
+    sources = [path for _, path in files]
+    if schema is None:
+        schema = SchemaRegistry.for_dataset(dataset_dir)
+    if not sources:
+        raise SystemExit("No se encontraron CSVs válidos en dataset.")
+    encodings = {path: None if is_parquet(path) else detect_encoding(path) for path in sources}
+    dup_cols, hc_cols = global_columns(rules)
+    stats = collect_global_stats(sources, encodings, dup_cols | hc_cols, chunksize, schema)
+
+    needed = rule_columns(rules)
+    headers = {path: read_csv_header(path) for path in sources}
+    present = set().union(*(set(h) for h in headers.values()))
+    # Columnas del "frame unificado" virtual (solo las que existen en algún archivo): los bloques se alinean a ellas
+    all_cols = sorted(c for c in present if c in needed or is_name_column(c))
+    counts = [0] * len(rules)
+    watchlist_count = 0
+    ignored: Dict[str, str] = {}
+    names = NameAggregator(spill_dir)
+    rows_written = 0
+    out_dir = os.path.dirname(output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    # Las partes de una tabla troceada siguen la numeración de filas de la anterior
+    row_offsets: Dict[str, int] = {}
+    with pq.ParquetWriter(output, ROW_SCHEMA) as writer:
+        for source, path in files:
+            header = headers[path]
+            usecols = [c for c in header if c in needed or is_name_column(c)] or header[:1]
+            row_offset = row_offsets.get(source, 0)
+            for chunk in iter_chunks(path, usecols, chunksize, encodings[path], schema):
+                chunk = chunk.reindex(columns=all_cols)
+                chunk.index = pd.RangeIndex(row_offset, row_offset + len(chunk))
+                chunk["__source_file"] = source
+                res = compute_scores(chunk, rules, watchlist, global_stats=stats, return_masks=True, explain=False)
+                for i, mask in enumerate(res["rule_masks"]):
+                    if mask is not None:
+                        counts[i] += int(mask.sum())
+                for ir in res["ignored"]:
+                    ignored[ir["expr"]] = ir["error"]
+                watchlist_count += int((res["watchlist_scores"] > 0).sum())
+                scored = res["row_scores"]
+                full_names = scored["__full_name"] if "__full_name" in scored.columns else pd.Series("", index=scored.index)
+                out = pd.DataFrame({
+                    "__source_file": source,
+                    "__row": chunk.index.to_numpy(),
+                    "__full_name": full_names.to_numpy(),
+                    "__risk_score": scored["__risk_score"].astype("int64").to_numpy(),
+                    "__risk_level": scored["__risk_level"].to_numpy(),
+                })
+                writer.write_table(pa.Table.from_pandas(out, schema=ROW_SCHEMA, preserve_index=False))
+                names.add(full_names, scored["__risk_score"].astype("int64"))
+                rows_written += len(out)
+                row_offset += len(chunk)
+            row_offsets[source] = row_offset
+
+    activations = [{"expr": r["expr"], "score": r["score"], "count": n} for r, n in zip(rules, counts) if n > 0]
+    if watchlist_count > 0:
+        activations.append({"expr": "watchlist_match", "score": "variable", "count": watchlist_count})
+    return {
+        "rows": rows_written,
+        "name_scores": names.result(),
+        "activations": activations,
+        "ignored": [{"expr": e, "error": err} for e, err in ignored.items()],
+    }
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Scoring por bloques con memoria acotada (salida Parquet)")
+    p.add_argument("--dataset-dir", default="dataset", help="Directorio de CSVs")
+    p.add_argument("--rules", default="rules_engine.md", help="Archivo markdown de reglas")
+    p.add_argument("--watchlist", default=None, help="Archivo CSV watchlist (full_name, watchlist_score, reason)")
+    p.add_argument("--output", default="results/risk_rows.parquet", help="Parquet de salida con scores por fila")
+    p.add_argument("--names-output", default=None, help="Parquet de salida con scores por nombre (opcional)")
+    p.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Filas por bloque")
+    p.add_argument("--spill-dir", default=None, help="Directorio temporal para agregar nombres en disco")
+    p.add_argument("--query-name", default=None, help="Nombre completo a consultar (opcional)")
+    p.add_argument("--schema", default=None, help="Esquema de tipos por tabla (por defecto, schema.json del dataset si existe)")
+    p.add_argument("--no-schema", action="store_true", help="Ignora el esquema y deja que pandas infiera los tipos")
+    return p.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    rules = parse_rules(args.rules)
+    for r in rules:
+        if r.get("error"):
+            print(f"[ERROR DE SINTAXIS] {r['expr']} -> {r['error']}")
+    watchlist = load_watchlist(args.watchlist) if args.watchlist else {}
+    result = stream_scores(args.dataset_dir, rules, watchlist, args.output, args.chunksize, args.spill_dir,
+                           schema_from_args(args))
+    print(f"Filas puntuadas: {result['rows']} -> {args.output}")
+    for ir in result["ignored"]:
+        print(f"[IGNORADA] {ir['expr']} -> {ir['error']}")
+    print("Activaciones:")
+    for act in result["activations"]:
+        print(f" - {act['expr']} (+{act['score']}) count={act['count']}")
+    names = result["name_scores"]
+    if args.names_output:
+        names.to_parquet(args.names_output, index=False)
+        print(f"Scores por nombre exportados a {args.names_output}")
+    if args.query_name:
+        match = names[names["full_name"] == normalize_name(args.query_name)]
+        if match.empty:
+            print("No")
+        else:
+            print(f"Nombre: {args.query_name}")
+            print(f"Score Total: {int(match.iloc[0]['risk_score']):,}")
+            print(f"Nivel de Riesgo: {match.iloc[0]['risk_level']}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,17 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Los scripts se importan entre sí por nombre de módulo
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+from rule_compiler import compile_expr  # noqa: E402
+
+
+def make_rules(*rules):
+    """Reglas como las de `parse_rules`: cada una es `expr` (score 1) o `(expr, score)`."""
+    out = []
+    for rule in rules:
+        expr, score = (rule, 1) if isinstance(rule, str) else rule
+        out.append({"expr": expr, "score": score, "desc": "", "plan": compile_expr(expr)})
+    return out
@@ -0,0 +1,54 @@
+import pandas as pd
+
+from conftest import make_rules
+from dataset_files import list_data_files
+from risk_scoring import compute_scores, load_relational, load_unified
+from schema_registry import SchemaRegistry
+from streaming_scoring import stream_scores
+
+SINIESTROS = pd.DataFrame({
+    "Nombre": ["Ana", "Luis", "Ana", "Eva", "Luis"],
+    "Apellido": ["G", "P", "G", "R", "P"],
+    "asegurado_id": [1, 2, 1, 3, 2],
+    "importe": [100.0, 5000.0, 7000.0, 20.0, 3500.0],
+})
+
+
+def write_dataset(root, fmt):
+    """Layout de `generate_synthetic_data.py --shard-rows 2`: `siniestros` troceada, `aseguradoras` sin trocear."""
+    (root / "siniestros").mkdir(parents=True)
+    for i, start in enumerate(range(0, len(SINIESTROS), 2)):
+        part = SINIESTROS.iloc[start:start + 2]
+        path = root / "siniestros" / f"part-{i:05d}.{fmt}"
+        part.to_parquet(path, index=False) if fmt == "parquet" else part.to_csv(path, index=False)
+    pd.DataFrame({"aseguradora_id": [1], "nombre": ["X"]}).to_csv(root / "aseguradoras.csv", index=False)
+    (root / "notas.txt").write_text("no es una tabla")
+
+
+def test_sharded_tables_are_read_as_one_source(tmp_path):
+    rules = make_rules(("importe > 3000", 5), ("duplicate(asegurado_id)", 2))
+    expected = compute_scores(SINIESTROS.assign(__source_file="siniestros.csv"), rules)["name_scores"]
+    for fmt in ("csv", "parquet"):
+        root = tmp_path / fmt
+        write_dataset(root, fmt)
+        files = list_data_files(str(root))
+        assert [name for name, _ in files] == ["aseguradoras.csv"] + [f"siniestros.{fmt}"] * 3
+        df = load_unified(str(root), schema=SchemaRegistry())
+        sin = df[df["__source_file"] == f"siniestros.{fmt}"].reset_index(drop=True)
+        assert sin["importe"].tolist() == SINIESTROS["importe"].tolist()
+        res = compute_scores(df, rules)["name_scores"]
+        pd.testing.assert_frame_equal(res.reset_index(drop=True), expected.reset_index(drop=True))
+        tables = load_relational(str(root), base="siniestros", schema=SchemaRegistry()).tables
+        assert sorted(tables) == ["aseguradoras", "siniestros"] and len(tables["siniestros"]) == len(SINIESTROS)
+
+
+def test_streaming_numbers_rows_across_parts(tmp_path):
+    write_dataset(tmp_path / "data", "parquet")
+    rules = make_rules(("importe > 3000", 5), ("duplicate(asegurado_id)", 2))
+    out = tmp_path / "rows.parquet"
+    res = stream_scores(str(tmp_path / "data"), rules, {}, str(out), chunksize=1, schema=SchemaRegistry())
+    rows = pd.read_parquet(out)
+    sin = rows[rows["__source_file"] == "siniestros.parquet"]
+    assert sin["__row"].tolist() == list(range(len(SINIESTROS)))
+    assert sin["__risk_score"].tolist() == [2, 7, 7, 0, 7]
+    assert res["name_scores"].set_index("full_name")["risk_score"].to_dict() == {"ANA G": 9, "LUIS P": 14, "EVA R": 0}
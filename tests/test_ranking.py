@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from conftest import make_rules
+from name_index import build_name_index
+from ranking import top_names, top_rows
+from risk_scoring import compute_scores
+
+
+def scored_result(n=120, seed=7):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "__source_file": np.where(rng.random(n) < 0.5, "a.csv", "b.csv"),
+        "Nombre": rng.choice(["Ana", "Luis", "Eva", "Juan", "Sara"], n),
+        "Apellido": rng.choice(["G", "P", "R"], n),
+        "importe": rng.integers(0, 100, n),
+        "aseguradora_id": rng.integers(1, 4, n),
+    })
+    # Scores con muchos empates: 0, 10 o 30 por fila
+    return compute_scores(df, make_rules(("importe > 50", 10), ("importe > 80", 20)))
+
+
+def all_pages(fetch, k):
+    items, cursor = [], None
+    while True:
+        page = fetch(k=k, cursor=cursor)
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def expected_names(result, mask=None):
+    names = result["name_scores"] if mask is None else result["name_scores"][mask]
+    return names.sort_values(["risk_score", "full_name"], ascending=[False, True])["full_name"].tolist()
+
+
+def expected_rows(result, mask):
+    rows = result["row_scores"].assign(pos=np.arange(len(result["row_scores"])))[mask]
+    return rows.sort_values(["__risk_score", "pos"], ascending=[False, True], kind="stable")["pos"].tolist()
+
+
+def test_cursor_pages_have_no_repeats_or_gaps():
+    result = scored_result()
+    index = build_name_index(result)
+    for k in (1, 2, 4, 1000):
+        names = all_pages(lambda **kw: top_names(result, **kw), k)
+        assert [it["full_name"] for it in names] == expected_names(result)
+        assert [it["rank"] for it in names] == list(range(1, len(names) + 1))
+        from_index = all_pages(lambda **kw: top_names(index=index, **kw), k)
+        assert [(it["full_name"], it["risk_score"]) for it in from_index] == [(it["full_name"], it["risk_score"]) for it in names]
+        rows = all_pages(lambda **kw: top_rows(result, **kw), k)
+        assert [it["pos"] for it in rows] == expected_rows(result, np.ones(len(result["row_scores"]), dtype=bool))
+    # Los datos tienen empates de score, así que lo anterior comprueba el desempate por nombre
+    names = top_names(result, k=1000)["items"]
+    scores = [it["risk_score"] for it in names]
+    assert len(set(scores)) < len(scores)
+
+
+def test_level_source_and_insurer_filters():
+    result = scored_result()
+    rows, frame, names = result["row_scores"], result["frame"], result["name_scores"]
+    level = names.sort_values("risk_score")["risk_level"].iloc[-1]
+    # Nivel (sin distinguir mayúsculas)
+    page = top_names(result, k=1000, levels=[level.lower()])
+    assert [it["full_name"] for it in page["items"]] == expected_names(result, names["risk_level"] == level)
+    row_level = rows["__risk_level"].iloc[int(np.argmax(rows["__risk_score"]))]
+    page = all_pages(lambda **kw: top_rows(result, levels=[row_level], **kw), 3)
+    assert [it["pos"] for it in page] == expected_rows(result, (rows["__risk_level"] == row_level).to_numpy())
+    # Origen: nombres con algún registro del archivo (el score sigue siendo el total), también desde el índice
+    in_b = set(rows.loc[rows["__source_file"] == "b.csv", "__full_name"])
+    page = top_names(result, k=1000, sources=["b.csv"])
+    assert [it["full_name"] for it in page["items"]] == expected_names(result, names["full_name"].isin(in_b))
+    from_index = top_names(index=build_name_index(result), k=1000, sources=["b.csv"])
+    assert [it["full_name"] for it in from_index["items"]] == [it["full_name"] for it in page["items"]]
+    page = top_rows(result, k=1000, sources=["b.csv"])
+    assert {it["source_file"] for it in page["items"]} == {"b.csv"}
+    assert [it["pos"] for it in page["items"]] == expected_rows(result, (rows["__source_file"] == "b.csv").to_numpy())
+    # Aseguradora: el texto "2" coincide con el valor numérico 2; combinable con el nivel
+    insurer = (frame["aseguradora_id"] == 2).to_numpy()
+    with_2 = set(rows.loc[insurer, "__full_name"])
+    page = all_pages(lambda **kw: top_names(result, insurers=["2"], **kw), 2)
+    assert [it["full_name"] for it in page] == expected_names(result, names["full_name"].isin(with_2))
+    page = all_pages(lambda **kw: top_rows(result, insurers=["2"], levels=[row_level], **kw), 2)
+    assert [it["pos"] for it in page] == expected_rows(result, insurer & (rows["__risk_level"] == row_level).to_numpy())
+    assert page and all(it["row"] >= 0 for it in page)
@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from conftest import make_rules
+from result_export import HIVE_NULL, export_result
+from risk_scoring import compute_scores, scored_frame
+
+
+def scored(n=500, seed=3):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "__source_file": np.where(rng.random(n) < 0.3, "a b.csv", "c.csv"),
+        "Nombre": rng.choice(["Ana", "Luis", "Eva"], n),
+        "Apellido": rng.choice(["G", "P"], n),
+        "importe": rng.integers(0, 100, n).astype(float),
+        "fecha_siniestro": rng.choice(["2022-03-01", "2023-07-15", None], n),
+        "codigo": rng.choice([1, "X", None], n).astype(object),
+    })
+    result = compute_scores(df, make_rules(("importe > 50", 10), ("importe > 80", 20)))
+    return result, scored_frame(result)
+
+
+def test_partition_layout_and_row_group_statistics(tmp_path):
+    result, frame = scored()
+    out = str(tmp_path / "export")
+    summary = export_result(result, frame, out, ["risk_level", "source_file"], row_group_rows=64)
+    rows = frame.rename(columns={"__risk_score": "risk_score", "__risk_level": "risk_level",
+                                 "__full_name": "full_name", "__source_file": "source_file"})
+    expected_dirs = {f"risk_level={lvl}/source_file={src.replace(' ', '%20')}"
+                     for lvl, src in rows[["risk_level", "source_file"]].drop_duplicates().itertuples(index=False)}
+    found = {os.path.relpath(root, os.path.join(out, "rows")).replace(os.sep, "/")
+             for root, _, files in os.walk(os.path.join(out, "rows")) if "part-0.parquet" in files}
+    assert found == expected_dirs and summary["files"] == len(expected_dirs)
+
+    for part in expected_dirs:
+        level, source = (p.split("=", 1)[1].replace("%20", " ") for p in part.split("/"))
+        expected = rows[(rows["risk_level"] == level) & (rows["source_file"] == source)]
+        meta = pq.ParquetFile(os.path.join(out, "rows", part, "part-0.parquet")).metadata
+        # Columnas de partición solo en la ruta; grupos de 64 filas en el orden del frame, con min/max
+        assert "risk_level" not in meta.schema.names and "source_file" not in meta.schema.names
+        assert meta.num_rows == len(expected) and meta.num_row_groups == -(-len(expected) // 64)
+        col = meta.schema.names.index("risk_score")
+        for g in range(meta.num_row_groups):
+            stats = meta.row_group(g).column(col).statistics
+            chunk = expected["risk_score"].iloc[g * 64:(g + 1) * 64]
+            assert stats.has_min_max and (stats.min, stats.max) == (chunk.min(), chunk.max())
+
+    back = ds.dataset(os.path.join(out, "rows"), format="parquet", partitioning="hive").to_table().to_pandas()
+    assert len(back) == len(rows)
+    assert back["risk_score"].sum() == rows["risk_score"].sum()
+    # Columna mixta (números y texto) exportada como texto
+    assert set(back["codigo"].dropna()) == {"1", "X"}
+    names = ds.dataset(os.path.join(out, "names"), format="parquet", partitioning="hive").to_table().to_pandas()
+    assert sorted(names["full_name"]) == sorted(result["name_scores"]["full_name"])
+
+
+def test_claim_year_partition_keeps_rows_without_date(tmp_path):
+    result, frame = scored()
+    out = str(tmp_path / "export")
+    export_result(result, frame, out, ["claim_year"])
+    assert sorted(os.listdir(os.path.join(out, "rows"))) == sorted(["claim_year=2022", "claim_year=2023", f"claim_year={HIVE_NULL}"])
+    missing = pq.read_metadata(os.path.join(out, "rows", f"claim_year={HIVE_NULL}", "part-0.parquet")).num_rows
+    assert missing == int(frame["fecha_siniestro"].isna().sum())
@@ -0,0 +1,104 @@
+import pandas as pd
+
+from conftest import make_rules
+from incremental_scoring import incremental_dataset, incremental_scores
+from risk_scoring import compute_scores, load_unified, qualified_columns_by_rule, rule_columns, rules_unavailable_by_file
+from schema_registry import SchemaRegistry
+
+
+def test_qualified_columns_are_reported_apart_from_missing_columns():
+    rules = make_rules("vehiculos.anio_small > 2020", 'importe > 10 AND polizas.clase == "RC"', "anio_small < 2015")
+    sources = {"siniestros.csv": ["importe"], "vehiculos.csv": ["anio_small"]}
+    assert qualified_columns_by_rule(rules, {"importe", "anio_small"}) == {
+        "vehiculos.anio_small > 2020": ["vehiculos.anio_small"],
+        'importe > 10 AND polizas.clase == "RC"': ["polizas.clase"],
+    }
+    assert rules_unavailable_by_file(rules, sources) == {"siniestros.csv": ["anio_small < 2015"], "vehiculos.csv": []}
+    # Una columna con punto que sí existe en el frame no necesita el modo relacional
+    assert qualified_columns_by_rule(make_rules("a.b > 1"), {"a.b"}) == {}
+
+
+def test_rows_without_name_do_not_form_a_name_in_any_path(tmp_path):
+    df = pd.DataFrame({
+        "__source_file": ["a.csv"] * 3 + ["b.csv"] * 2,
+        "Nombre": ["Ana", "Ana", "Luis", None, None],
+        "Apellido": ["Gomez", "Gomez", "Perez", None, None],
+        "importe": [10, 20, 30, 40, 50],
+    })
+    rules = make_rules("importe > 15")
+    full = compute_scores(df, rules)["name_scores"].set_index("full_name")["risk_score"].to_dict()
+    assert full == {"ANA GOMEZ": 1, "LUIS PEREZ": 1}
+    incremental = incremental_scores(df, rules, {}, str(tmp_path))["name_scores"]
+    assert incremental.set_index("full_name")["risk_score"].to_dict() == full
+
+
+def test_incremental_reports_window_rules_as_ignored(tmp_path):
+    df = pd.DataFrame({
+        "__source_file": ["a.csv"] * 4,
+        "Nombre": ["Ana", "Ana", "Luis", "Luis"],
+        "Apellido": ["G", "G", "P", "P"],
+        "cliente": [1, 1, 2, 3],
+        "fecha": pd.to_datetime(["2024-01-01", "2024-01-05", "2024-01-01", "2024-01-02"]),
+    })
+    rules = make_rules(("window_count(cliente, fecha, 10) >= 2", 5))
+    full = compute_scores(df, rules)
+    assert full["name_scores"].set_index("full_name")["risk_score"].to_dict() == {"ANA G": 5, "LUIS P": 0}
+    first = incremental_scores(df, rules, {}, str(tmp_path))
+    assert [ir["expr"] for ir in first["ignored"]] == ["window_count(cliente, fecha, 10) >= 2"]
+    assert "dataset completo" in first["ignored"][0]["error"]
+    # Sin cambios no se re-puntúa nada, pero la regla sigue reportada como ignorada
+    again = incremental_scores(df, rules, {}, str(tmp_path))
+    assert again["summary"]["rescored"] == 0
+    assert again["ignored"] == first["ignored"]
+
+
+def write_csv(path, rows):
+    pd.DataFrame(rows, columns=["Nombre", "Apellido", "asegurado_id", "importe"]).to_csv(path, index=False)
+
+
+def assert_matches_full_scoring(result, dataset_dir, rules):
+    df = load_unified(str(dataset_dir), rule_columns(rules), schema=SchemaRegistry())
+    ref = compute_scores(df, rules)
+    scores = lambda names: names.set_index("full_name")["risk_score"].sort_index().to_dict()
+    assert scores(result["name_scores"]) == scores(ref["name_scores"])
+    assert [(a["expr"], a["count"]) for a in result["activations"]] == [(a["expr"], a["count"]) for a in ref["activations"]]
+    assert result["rows"]["__risk_score"].tolist() == ref["row_scores"]["__risk_score"].tolist()
+
+
+def test_incremental_dataset_reads_only_changes(tmp_path):
+    data, state = tmp_path / "data", str(tmp_path / "state")
+    data.mkdir()
+    rules = make_rules(("importe > 100", 5), ("duplicate(asegurado_id)", 10), ("duplicate(asegurado_id) AND importe > 50", 3))
+    write_csv(data / "a.csv", [["Ana", "G", 1, 120], ["Luis", "P", 2, 80], ["Eva", "R", 3, 60]])
+    write_csv(data / "b.csv", [["Ana", "G", 4, 90], ["Juan", "S", 5, 200]])
+    first = incremental_dataset(str(data), rules, {}, state, schema=SchemaRegistry())
+    assert first["summary"]["mode"] == "full"
+    assert_matches_full_scoring(first, data, rules)
+
+    # Alta al final de a.csv: solo se lee la cola; la fila de b.csv con asegurado 4 pasa a duplicada y se relee
+    with open(data / "a.csv", "a", encoding="utf-8") as f:
+        f.write("Luis,P,4,70\nEva,R,6,300\n")
+    appended = incremental_dataset(str(data), rules, {}, state, schema=SchemaRegistry())
+    assert appended["summary"] == {"mode": "incremental", "read": 2, "new": 2, "modified": 0, "deleted": 0, "rescored": 3}
+    assert_matches_full_scoring(appended, data, rules)
+
+    # Edición en b.csv: se relee entero y se compara fila a fila
+    write_csv(data / "b.csv", [["Ana", "G", 4, 90], ["Juan", "S", 5, 20000]])
+    edited = incremental_dataset(str(data), rules, {}, state, schema=SchemaRegistry())
+    assert edited["summary"]["read"] == 2 and edited["summary"]["modified"] == 1
+    assert_matches_full_scoring(edited, data, rules)
+
+    # Baja de la fila con asegurado 4 en a.csv: la de b.csv (sin cambios, no leída) deja de estar duplicada
+    write_csv(data / "a.csv", [["Ana", "G", 1, 120], ["Luis", "P", 2, 80], ["Eva", "R", 3, 60], ["Eva", "R", 6, 300]])
+    deleted = incremental_dataset(str(data), rules, {}, state, schema=SchemaRegistry())
+    assert deleted["summary"]["read"] == 4 and deleted["summary"]["deleted"] == 1
+    assert_matches_full_scoring(deleted, data, rules)
+
+    # Archivo eliminado y ejecución sin cambios
+    (data / "b.csv").unlink()
+    removed = incremental_dataset(str(data), rules, {}, state, schema=SchemaRegistry())
+    assert removed["summary"]["read"] == 0 and removed["summary"]["deleted"] == 2
+    assert_matches_full_scoring(removed, data, rules)
+    unchanged = incremental_dataset(str(data), rules, {}, state, schema=SchemaRegistry())
+    assert unchanged["summary"]["read"] == 0 and unchanged["summary"]["rescored"] == 0
+    assert_matches_full_scoring(unchanged, data, rules)
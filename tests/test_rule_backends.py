@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("polars")
+
+from conftest import ROOT, make_rules
+from risk_scoring import compare_backends, compute_scores, load_unified, load_watchlist, parse_rules
+
+SYNTHETIC_RULES = [
+    ("duplicate(mixto)", 5),
+    ("duplicate(importe)", 3),
+    ("duplicate(texto)", 2),
+    ("high_cardinality(ref)", 1),
+    ("high_cardinality(texto)", 1),
+    ("importe > 100", 4),
+    ("importe <= 50 || texto == \"b\"", 2),
+    ("mixto >= 5 AND texto in [\"a\", \"c\"]", 3),
+    ("mixto == \"x\"", 1),
+    ("activo == True", 2),
+    ("texto is not null", 1),
+    ("fecha == \"2023-01-05\"", 1),
+    ("full_name in [\"ANA GOMEZ\", \"luis  perez\"]", 7),
+    ("no_existe > 1", 9),
+    ("duplicate(no_existe) || importe > 190", 2),
+    ("window_count(cliente, fecha, 30) >= 2", 6),
+    ("window_sum(cliente, fecha, 60, importe) > 250", 4),
+    ("window_count(no_existe, fecha, 30) >= 1", 9),
+]
+
+
+def synthetic_frame(n=240, seed=0):
+    rng = np.random.default_rng(seed)
+    mixed = np.array([5, 5.0, "5", None, "x", 7, 7.0, np.nan, True, 1], dtype=object)
+    df = pd.DataFrame({
+        "mixto": pd.Series(mixed[rng.integers(0, len(mixed), n)], dtype=object),
+        "importe": np.where(rng.random(n) < 0.1, np.nan, rng.integers(0, 200, n).astype(float)),
+        "texto": pd.Series(np.array(["a", "b", "c", None], dtype=object)[rng.integers(0, 4, n)], dtype=object),
+        "ref": np.arange(n),
+        "activo": pd.Series(np.array([True, False, None], dtype=object)[rng.integers(0, 3, n)], dtype=object),
+        "fecha": pd.to_datetime("2023-01-01") + pd.to_timedelta(rng.integers(0, 120, n), "D"),
+        "cliente": rng.integers(0, 15, n).astype(float),
+        "Nombre": np.array(["Ana", "Luis", "ana", None], dtype=object)[rng.integers(0, 4, n)],
+        "Apellido": np.array(["Gomez", "Perez", " gomez"], dtype=object)[rng.integers(0, 3, n)],
+    })
+    df.loc[rng.random(n) < 0.1, "fecha"] = pd.NaT
+    df.loc[rng.random(n) < 0.1, "cliente"] = np.nan
+    return df
+
+
+def assert_parity(check):
+    assert check["rules"] == []
+    assert check["score_rows"] == 0
+    assert check["ok"]
+
+
+def test_synthetic_frame_parity():
+    df = synthetic_frame()
+    assert_parity(compare_backends(df, make_rules(*SYNTHETIC_RULES), backend="polars"))
+
+
+def test_mixed_numbers_are_duplicates():
+    df = pd.DataFrame({"mixto": pd.Series([5, 5.0, "5", "x"], dtype=object)})
+    rules = make_rules("duplicate(mixto)")
+    check = compare_backends(df, rules, backend="polars")
+    assert_parity(check)
+    assert compute_scores(df, rules, return_masks=True)["rule_masks"][0].tolist() == [True, True, False, False]
+    # Por shards, los conteos globales usan la misma clave (`global_stats.key_strings`)
+    sharded = compute_scores(df, rules, return_masks=True, workers=2)["rule_masks"][0]
+    assert sharded.tolist() == [True, True, False, False]
+
+
+def test_dataset_final_parity():
+    dataset = os.path.join(ROOT, "dataset_final")
+    rules = parse_rules(os.path.join(ROOT, "rules_engine.md"))
+    df = load_unified(dataset)
+    watchlist = load_watchlist(os.path.join(ROOT, "watchlist.csv"))
+    assert_parity(compare_backends(df, rules, watchlist, "polars"))
@@ -0,0 +1,87 @@
+import pytest
+
+from rule_compiler import (
+    And,
+    Compare,
+    Duplicate,
+    FullNameIn,
+    HighCardinality,
+    InList,
+    NotNull,
+    Or,
+    RuleSyntaxError,
+    compile_expr,
+    tokenize,
+)
+
+
+def test_and_binds_tighter_than_or():
+    plan = compile_expr('a > 1 AND b == "x" || c < 2')
+    assert plan == Or((And((Compare("a", ">", "1"), Compare("b", "==", "x"))), Compare("c", "<", "2")))
+    plan = compile_expr('c < 2 || a > 1 && b == "x"')
+    assert plan == Or((Compare("c", "<", "2"), And((Compare("a", ">", "1"), Compare("b", "==", "x")))))
+
+
+def test_parentheses_override_precedence():
+    plan = compile_expr("(a > 1 || b > 2) AND c > 3")
+    assert plan == And((Or((Compare("a", ">", "1"), Compare("b", ">", "2"))), Compare("c", ">", "3")))
+
+
+def test_nested_operators_are_flattened():
+    plan = compile_expr("a > 1 AND (b > 2 AND c > 3) OR d > 4 || e > 5")
+    assert isinstance(plan, Or) and len(plan.children) == 3
+    assert plan.children[0] == And((Compare("a", ">", "1"), Compare("b", ">", "2"), Compare("c", ">", "3")))
+
+
+def test_quoted_literals_keep_commas_brackets_and_parentheses():
+    plan = compile_expr('Make in ["Rolls, Royce", \'a]b\', "(x)", 5, Ford]')
+    assert plan == InList("Make", ("Rolls, Royce", "a]b", "(x)", "5", "Ford"))
+    assert compile_expr('PolicyType == "Sport - Collision || AND"') == Compare("PolicyType", "==", "Sport - Collision || AND")
+    assert compile_expr("lugar in []") == InList("lugar", ())
+
+
+def test_node_types():
+    assert compile_expr("duplicate(PolicyNumber)") == Duplicate("PolicyNumber")
+    assert compile_expr("high_cardinality(PolicyNumber)") == HighCardinality("PolicyNumber")
+    assert compile_expr("PoliceReportFiled IS NOT NULL") == NotNull("PoliceReportFiled")
+    assert compile_expr('full_name in ["JUAN PEREZ"]') == FullNameIn(("JUAN PEREZ",))
+    assert compile_expr("vehiculos.anio_small < -2.5") == Compare("vehiculos.anio_small", "<", "-2.5")
+
+
+def test_canonical_is_stable_under_operand_reordering():
+    a = compile_expr('x > 1 AND y == "b" AND z in [1, 2]')
+    b = compile_expr('z in [1, 2] && y == "b" AND x > 1')
+    assert a.canonical() == b.canonical()
+    assert compile_expr("x > 1 || y > 2").canonical() == compile_expr("y > 2 OR x > 1").canonical()
+    assert compile_expr("(x > 1 || y > 2) AND z > 3").canonical() == compile_expr("z > 3 AND (y > 2 || x > 1)").canonical()
+
+
+def test_canonical_distinguishes_different_rules():
+    assert compile_expr("x > 1 AND y > 2").canonical() != compile_expr("x > 1 || y > 2").canonical()
+    assert compile_expr('x == "1"').canonical() != compile_expr("x > 1").canonical()
+    assert compile_expr("x in [1, 2]").canonical() != compile_expr("x in [2, 1]").canonical()
+
+
+@pytest.mark.parametrize("expr, message", [
+    ("", "Expresión vacía"),
+    ("   ", "Expresión vacía"),
+    ("Age > ", "Se esperaba valor literal en posición 6, se encontró fin de expresión"),
+    ("Age > 5 AND", "Se esperaba columna, función o '(' en posición 11, se encontró fin de expresión"),
+    ("(Age > 5", "Se esperaba ')' en posición 8, se encontró fin de expresión"),
+    ("Age > 5)", "Se esperaba operador lógico o fin de expresión en posición 7, se encontró ')'"),
+    ("Age ~ 5", "Carácter no válido '~' en posición 4"),
+    ("Age 5", "Se esperaba operador de comparación, 'in' o 'is not null' en posición 4, se encontró '5'"),
+    ("Make in [\"a\" \"b\"]", "Se esperaba ']' en posición 13, se encontró 'b'"),
+    ("unknown(col)", "Función desconocida 'unknown' en posición 0"),
+    ("x is null", "Se esperaba 'not' en posición 5, se encontró 'null'"),
+])
+def test_syntax_errors(expr, message):
+    with pytest.raises(RuleSyntaxError) as err:
+        compile_expr(expr)
+    assert str(err.value) == message
+
+
+def test_tokenizer_keywords_are_case_insensitive():
+    kinds = [t.kind for t in tokenize("a > 1 and b < 2 or c == 3 && d || e")]
+    assert kinds.count("AND") == 2 and kinds.count("OR") == 2
+    assert kinds[-1] == "EOF"
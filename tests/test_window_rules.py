@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_rules
+from risk_scoring import compute_scores
+from rule_compiler import RuleSyntaxError, Window, compile_expr
+from window_rules import window_values
+
+WINDOW_RULES = [
+    ("window_count(cliente, fecha, 10) >= 3", 5),
+    ("window_count(cliente, fecha, 1) >= 2", 1),
+    ("window_sum(cliente, fecha, 30, importe) > 400", 3),
+    ("window_count(cliente, fecha, 10) >= 2 AND importe > 50", 2),
+    ("window_count(cliente, fecha, 10) > 4 || window_sum(cliente, fecha, 5, importe) >= 300", 4),
+]
+
+
+def random_frame(n=400, seed=1):
+    rng = np.random.default_rng(seed)
+    amounts = pd.Series(rng.integers(0, 200, n).astype(float), dtype=object)
+    amounts[rng.random(n) < 0.1] = "n/d"
+    amounts[rng.random(n) < 0.1] = None
+    df = pd.DataFrame({
+        # Pocas claves y pocos días: muchas filas con la misma clave y el mismo día
+        "cliente": rng.integers(0, 12, n).astype(float),
+        "fecha": pd.to_datetime("2024-01-01") + pd.to_timedelta(rng.integers(0, 60, n), "D"),
+        "importe": amounts,
+    })
+    df.loc[rng.random(n) < 0.08, "cliente"] = np.nan
+    df.loc[rng.random(n) < 0.08, "fecha"] = pd.NaT
+    return df
+
+
+def brute_force(df, days, value=None):
+    out = np.full(len(df), np.nan)
+    amounts = pd.to_numeric(df[value], errors="coerce").fillna(0).to_numpy() if value else None
+    for i in range(len(df)):
+        key, date = df["cliente"].iloc[i], df["fecha"].iloc[i]
+        if pd.isna(key) or pd.isna(date):
+            continue
+        same = ((df["cliente"] == key) & (df["fecha"] <= date) & (df["fecha"] >= date - pd.Timedelta(days=days))).to_numpy()
+        out[i] = amounts[same].sum() if value else same.sum()
+    return out
+
+
+@pytest.mark.parametrize("days", [0, 1, 7, 30])
+def test_window_values_match_brute_force(days):
+    df = random_frame()
+    counts = window_values(df["cliente"], df["fecha"], days)
+    np.testing.assert_array_equal(counts, brute_force(df, days))
+    sums = window_values(df["cliente"], df["fecha"], days, df["importe"])
+    np.testing.assert_allclose(sums, brute_force(df, days, "importe"), equal_nan=True)
+
+
+def test_window_bounds_are_inclusive_and_keys_do_not_mix():
+    df = pd.DataFrame({
+        "cliente": [1, 1, 1, 1, 2, 2, None],
+        "fecha": pd.to_datetime(["2024-01-01", "2024-01-11", "2024-01-11", "2024-01-12", "2024-01-11", None, "2024-01-11"]),
+        "importe": [10, 20, "x", 40, 1000, 5, 7],
+    })
+    counts = window_values(df["cliente"], df["fecha"], 10)
+    np.testing.assert_array_equal(counts, [1, 3, 3, 3, 1, np.nan, np.nan])
+    sums = window_values(df["cliente"], df["fecha"], 10, df["importe"])
+    np.testing.assert_array_equal(sums, [10, 30, 30, 60, 1000, np.nan, np.nan])
+
+
+def test_string_dates_and_keys():
+    df = random_frame()
+    keys = df["cliente"].map(lambda v: None if pd.isna(v) else f"C{int(v)}")
+    dates = df["fecha"].dt.strftime("%Y-%m-%d")
+    np.testing.assert_array_equal(window_values(keys, dates, 7), window_values(df["cliente"], df["fecha"], 7))
+
+
+def test_parse_window_functions():
+    plan = compile_expr("window_sum(asegurado_id, fecha_siniestro, 90, importe_estimada) > 1000")
+    assert plan == Window("window_sum", "asegurado_id", "fecha_siniestro", 90, "importe_estimada", ">", "1000")
+    assert plan.columns() == {"asegurado_id", "fecha_siniestro", "importe_estimada"}
+    for expr in ("window_count(a, b, 0) > 1", "window_count(a, b, 1.5) > 1", "window_sum(a, b, 3) > 1",
+                 "window_count(a, b, 3)"):
+        with pytest.raises(RuleSyntaxError):
+            compile_expr(expr)
+
+
+def _masks(result):
+    return [m.to_numpy(dtype=bool) for m in result["rule_masks"]]
+
+
+def test_serial_sharded_and_polars_masks_match():
+    df = random_frame()
+    rules = make_rules(*WINDOW_RULES)
+    serial = compute_scores(df, rules, return_masks=True)
+    assert not serial["ignored"]
+    assert any(m.any() for m in _masks(serial))
+    sharded = compute_scores(df, rules, return_masks=True, workers=3)
+    for a, b in zip(_masks(serial), _masks(sharded)):
+        np.testing.assert_array_equal(a, b)
+    np.testing.assert_array_equal(serial["row_scores"]["__risk_score"], sharded["row_scores"]["__risk_score"])
+    pytest.importorskip("polars")
+    polars = compute_scores(df, rules, return_masks=True, backend="polars")
+    for a, b in zip(_masks(serial), _masks(polars)):
+        np.testing.assert_array_equal(a, b)
+    np.testing.assert_array_equal(serial["row_scores"]["__risk_score"], polars["row_scores"]["__risk_score"])